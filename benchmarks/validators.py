@@ -0,0 +1,128 @@
+"""
+Benchmark of utils.security's validators against the per-pattern loops they replaced.
+
+The legacy implementations below are the previous validate_sql and
+check_python_code: one re.search per pattern, each a full pass over the
+input. Both versions are run over large generated inputs, clean ones (the
+common case, where every pattern has to be ruled out) and ones with a
+violation near the end, and must agree on the result. check_python_code
+memoizes its verdicts (see utils.code_analysis), so the cache is cleared
+before every timed run to measure the analysis rather than cache hits.
+
+Usage:
+    python benchmarks/validators.py [--size CHARS] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils import code_analysis
+from utils.security import check_python_code, validate_sql
+
+
+def legacy_validate_sql(sql_statement):
+    dangerous_patterns = [
+        r'--',
+        r'/\*.*\*/',
+        r'\bDROP\b',
+        r'\bDELETE\b.*FROM',
+        r'UNION.*SELECT',
+        r'SELECT.*INTO.*OUTFILE',
+        r'EXEC.*xp_',
+        r'OR\s+\d+=\d+',
+        r'OR\s+\d+=\s*\d+',
+    ]
+    for pattern in dangerous_patterns:
+        if re.search(pattern, sql_statement, re.IGNORECASE):
+            return False, f"SQL statement contains potentially dangerous pattern: {pattern}"
+    return True, "SQL statement appears valid"
+
+
+def legacy_check_python_code(code):
+    forbidden_imports = [
+        'os', 'subprocess', 'sys', 'shutil', 'importlib',
+        'pickle', 'marshal', 'builtins', 'ctypes', 'socket'
+    ]
+    for module in forbidden_imports:
+        if re.search(rf'\b(import|from)\s+{module}\b', code):
+            return f"Error: Importing module '{module}' is not allowed for security reasons"
+    dangerous_patterns = [
+        r'__import__\(', r'eval\(', r'exec\(', r'compile\(', r'open\(', r'file\(',
+        r'globals\(', r'locals\(', r'getattr\(', r'setattr\(', r'delattr\(',
+        r'\b__class__\b', r'\b__bases__\b', r'\b__subclasses__\b', r'\b__mro__\b',
+        r'\bmro\b', r'\b__globals__\b', r'\b__builtins__\b',
+    ]
+    for pattern in dangerous_patterns:
+        if re.search(pattern, code):
+            return f"Error: Code contains potentially dangerous pattern: {pattern}"
+    return None
+
+
+def generate_sql(size, rng):
+    columns = ["id", "name", "amount", "created_at", "status", "customer_id"]
+    parts = ["SELECT o.id, c.name, SUM(o.amount) AS total FROM orders o JOIN customers c ON c.id = o.customer_id WHERE "]
+    while sum(map(len, parts)) < size:
+        parts.append(f"o.{rng.choice(columns)} {rng.choice(['=', '<', '>', '<>'])} {rng.randint(0, 10**6)} "
+                     f"{rng.choice(['AND', 'OR'])} ")
+    parts.append("TRUE GROUP BY o.id, c.name ORDER BY total DESC")
+    return "".join(parts)
+
+
+def generate_code(size, rng):
+    lines = ["import math", "import statistics", ""]
+    index = 0
+    while sum(map(len, lines)) < size:
+        lines.extend([
+            f"def helper_{index}(values):",
+            f"    total = sum(v * {rng.randint(1, 99)} for v in values)",
+            f"    return math.sqrt(total) / max(len(values), 1)",
+            f"print(helper_{index}([{', '.join(str(rng.randint(0, 999)) for _ in range(8))}]))",
+            "",
+        ])
+        index += 1
+    return "\n".join(lines)
+
+
+def fresh(function):
+    """check_python_code without its verdict cache."""
+    def call(text):
+        code_analysis.clear_cache()
+        return function(text)
+    return call
+
+
+def bench(label, new, legacy, inputs, repeat):
+    for text in inputs:
+        assert new(text) == legacy(text), f"{label}: results differ"
+    new_time = min(timeit.repeat(lambda: [new(text) for text in inputs], number=1, repeat=repeat))
+    legacy_time = min(timeit.repeat(lambda: [legacy(text) for text in inputs], number=1, repeat=repeat))
+    print(f"{label:<28} legacy {legacy_time * 1000:9.2f} ms   new {new_time * 1000:9.2f} ms   "
+          f"speedup {legacy_time / new_time:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=200_000, help="characters per generated input")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, the best is reported")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    sql = [generate_sql(args.size, rng) for _ in range(3)]
+    code = [generate_code(args.size, rng) for _ in range(3)]
+    bench("validate_sql (clean)", validate_sql, legacy_validate_sql, sql, args.repeat)
+    bench("validate_sql (violation)", validate_sql, legacy_validate_sql,
+          [text + " UNION SELECT password FROM users" for text in sql], args.repeat)
+    bench("check_python_code (clean)", fresh(check_python_code), legacy_check_python_code, code, args.repeat)
+    bench("check_python_code (violation)", fresh(check_python_code), legacy_check_python_code,
+          [text + "\nprint(().__class__.__mro__)\n" for text in code], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
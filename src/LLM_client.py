@@ -0,0 +1,145 @@
+"""
+Common interface of the LLM clients and the HTTP transport they share.
+
+All provider clients (the OpenAI SDK for OpenRouter, the streaming requests,
+and Ollama) send their requests through one pooled httpx transport per
+process, so concurrent requests from the web and Slack front ends reuse
+open keep-alive connections (HTTP/2 when the h2 package is installed)
+instead of each paying for TCP and TLS setup. Async clients get their own
+pooled transport per event loop, since async connections cannot be shared
+between loops.
+"""
+
+import asyncio
+import threading
+import weakref
+from abc import ABC, abstractmethod
+
+import httpx
+
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_transport = None
+_transport_lock = threading.Lock()
+_async_transports = weakref.WeakKeyDictionary()
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=Config.LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_transport():
+    """Return the process-wide pooled transport for synchronous clients."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            http2 = _http2_available()
+            logger.info(f"Creating shared LLM HTTP transport (http2={http2}, "
+                        f"max_connections={Config.LLM_HTTP_MAX_CONNECTIONS})")
+            _transport = httpx.HTTPTransport(http2=http2, limits=_limits(), retries=1)
+        return _transport
+
+
+def get_async_transport():
+    """Return the pooled transport for async clients on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _transport_lock:
+        transport = _async_transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(http2=_http2_available(), limits=_limits(), retries=1)
+            _async_transports[loop] = transport
+        return transport
+
+
+def http_client(**kwargs):
+    """
+    An httpx.Client on the shared transport.
+
+    Clients are cheap; the connections live in the transport. Do not close
+    them (or use them as context managers), as that closes the shared pool.
+    """
+    return httpx.Client(transport=get_transport(), timeout=Config.LLM_HTTP_TIMEOUT, **kwargs)
+
+
+def async_http_client(**kwargs):
+    """An httpx.AsyncClient on the running loop's shared transport. Do not close it."""
+    return httpx.AsyncClient(transport=get_async_transport(), timeout=Config.LLM_HTTP_TIMEOUT, **kwargs)
+
+
+class LLMClient(ABC):
+    """
+    A chat model provider.
+
+    call_llm and call_llm_stream append the assistant message to the
+    conversation history they are given, like the module level functions
+    of the provider clients. The a-prefixed coroutines are the async
+    variants; acall_llm_stream is an async generator.
+    """
+
+    name = None
+    model = None
+
+    @abstractmethod
+    def call_llm(self, conversation_history, tools):
+        """Return the assistant's reply message."""
+
+    @abstractmethod
+    def call_llm_stream(self, conversation_history, tools=None):
+        """Yield LLM_stream events, ending with MessageDone."""
+
+    @abstractmethod
+    def complete(self, messages):
+        """Return the text of a reply to messages, without tools and without modifying messages."""
+
+    @abstractmethod
+    async def acall_llm(self, conversation_history, tools):
+        """Async variant of call_llm."""
+
+    @abstractmethod
+    def acall_llm_stream(self, conversation_history, tools=None):
+        """Return an async iterator of LLM_stream events, ending with MessageDone."""
+
+    @abstractmethod
+    async def acomplete(self, messages):
+        """Async variant of complete."""
+
+
+def get_llm_client(provider=None):
+    """
+    Return the client for a provider.
+
+    Args:
+        provider: "openrouter" or "ollama"; defaults to the configured provider,
+            behind the failover and hedging router when LLM_FAILOVER or
+            LLM_HEDGE_AFTER is set
+
+    Returns:
+        An LLMClient
+    """
+    if provider is None:
+        if Config.LLM_FAILOVER or Config.LLM_HEDGE_AFTER:
+            from LLM_router import get_router
+            return get_router()
+        provider = "openrouter" if Config.USE_OPEN_ROUTER else "ollama"
+    if provider == "openrouter":
+        import LLM_client_openrouter
+        return LLM_client_openrouter.CLIENT
+    if provider == "ollama":
+        import LLM_client_ollama
+        return LLM_client_ollama.CLIENT
+    raise ValueError(f"Unknown LLM provider: {provider}")
@@ -1,7 +1,12 @@
+import asyncio
+import threading
 import time
+import weakref
 
 import ollama
 
+from LLM_client import LLMClient, get_async_transport, get_transport
+from LLM_stream import ContentDelta, MessageDone, UsageDelta
 from utils import get_logger, Config
 
 # Initialize logger
@@ -15,6 +20,37 @@ logger.info(f"Using Ollama host: {ollama_host}")
 OLLAMA_MODEL_NAME = Config.OLLAMA_MODEL
 logger.info(f"Using Ollama model: {OLLAMA_MODEL_NAME}")
 
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the Ollama client, which sends its requests over the shared HTTP transport."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ollama.Client(host=ollama_host, transport=get_transport())
+        return _client
+
+
+def get_async_client():
+    """Return the async Ollama client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = ollama.AsyncClient(host=ollama_host, transport=get_async_transport())
+    return _async_clients[loop]
+
+
+def _response_message(response):
+    # Extract the assistant's reply from the response
+    if hasattr(response, 'message'):
+        return response.message
+    error_msg = f"Error: Unexpected response format from Ollama API"
+    logger.error(error_msg)
+    return error_msg
+
+
 def call_llm(conversation_history, tools, model_name=None):
     """
     Calls the Ollama API with the given conversation history using the ollama library.
@@ -36,9 +72,7 @@ def call_llm(conversation_history, tools, model_name=None):
     start_time = time.time()
     
     try:
-        client = ollama.Client(host=ollama_host)
-
-        response = client.chat(
+        response = get_client().chat(
             model=model_name,
             messages=conversation_history,
             tools=tools,
@@ -52,13 +86,7 @@ def call_llm(conversation_history, tools, model_name=None):
         duration = end_time - start_time
         logger.info(f"Ollama call completed in {duration:.2f} seconds")
         
-        # Extract the assistant's reply from the response
-        if hasattr(response, 'message'):
-            return response.message
-        else:
-            error_msg = f"Error: Unexpected response format from Ollama API"
-            logger.error(error_msg)
-            return error_msg
+        return _response_message(response)
 
     except ollama.ResponseError as e:
         error_msg = f"Error calling Ollama API: {e}. Please ensure Ollama is running and the model '{model_name}' is available."
@@ -68,3 +96,169 @@ def call_llm(conversation_history, tools, model_name=None):
         error_msg = f"An unexpected error occurred while calling Ollama: {e}"
         logger.error(error_msg, exc_info=True)
         return error_msg
+
+
+async def acall_llm(conversation_history, tools, model_name=None):
+    """Async variant of call_llm."""
+    if model_name is None:
+        model_name = OLLAMA_MODEL_NAME
+
+    logger.info(f"Calling Ollama (async) with {len(conversation_history)} messages and {len(tools)} tools")
+
+    start_time = time.time()
+
+    try:
+        response = await get_async_client().chat(model=model_name, messages=conversation_history, tools=tools)
+        conversation_history.append(response.message.dict())
+        logger.info(f"Ollama call completed in {time.time() - start_time:.2f} seconds")
+        return _response_message(response)
+
+    except ollama.ResponseError as e:
+        error_msg = f"Error calling Ollama API: {e}. Please ensure Ollama is running and the model '{model_name}' is available."
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"An unexpected error occurred while calling Ollama: {e}"
+        logger.error(error_msg, exc_info=True)
+        return error_msg
+
+
+def complete(messages, model_name=None):
+    """
+    Plain text completion without tools, for internal tasks like summarization.
+
+    Unlike call_llm, the messages list is not modified and errors are raised.
+
+    Args:
+        messages: A list of message dictionaries
+        model_name: Optional model name override
+
+    Returns:
+        The text of the model's reply
+    """
+    if model_name is None:
+        model_name = OLLAMA_MODEL_NAME
+
+    logger.info(f"Calling Ollama for a completion with {len(messages)} messages")
+    response = get_client().chat(model=model_name, messages=messages)
+    return response.message.content or ""
+
+
+async def acomplete(messages, model_name=None):
+    """Async variant of complete."""
+    if model_name is None:
+        model_name = OLLAMA_MODEL_NAME
+
+    logger.info(f"Calling Ollama (async) for a completion with {len(messages)} messages")
+    response = await get_async_client().chat(model=model_name, messages=messages)
+    return response.message.content or ""
+
+
+class _StreamState:
+    """Collects the streamed chunks of one reply."""
+
+    def __init__(self, conversation_history):
+        self.conversation_history = conversation_history
+        self.start_time = time.time()
+        self.content = ""
+        self.tool_calls = []
+
+    def add(self, chunk):
+        """Yield the delta events of one chunk."""
+        if chunk.message.content:
+            self.content += chunk.message.content
+            yield ContentDelta(chunk.message.content)
+        if chunk.message.tool_calls:
+            self.tool_calls.extend(chunk.message.tool_calls)
+        if chunk.done:
+            prompt_tokens = chunk.prompt_eval_count or 0
+            completion_tokens = chunk.eval_count or 0
+            yield UsageDelta(prompt_tokens, completion_tokens, prompt_tokens + completion_tokens)
+
+    def finish(self):
+        message = ollama.Message(role="assistant", content=self.content, tool_calls=self.tool_calls or None)
+        self.conversation_history.append(message.dict())
+
+        duration = time.time() - self.start_time
+        logger.info(f"Ollama streaming call completed in {duration:.2f} seconds")
+        return MessageDone(message)
+
+
+def call_llm_stream(conversation_history, tools, model_name=None):
+    """
+    Calls the Ollama API with streaming enabled.
+
+    Args:
+        conversation_history: A list of message dictionaries
+        tools: List of tool definitions
+        model_name: Optional model name override
+
+    Yields:
+        A ContentDelta for every content chunk as it arrives, a UsageDelta with the
+        final chunk, then a MessageDone with the assembled ollama.Message, which is
+        also appended to conversation_history
+    """
+    if model_name is None:
+        model_name = OLLAMA_MODEL_NAME
+
+    logger.info(f"Calling Ollama with streaming for {len(conversation_history)} messages and {len(tools)} tools")
+
+    state = _StreamState(conversation_history)
+
+    try:
+        for chunk in get_client().chat(model=model_name, messages=conversation_history, tools=tools, stream=True):
+            yield from state.add(chunk)
+        yield state.finish()
+    except ollama.ResponseError as e:
+        error_msg = f"Error calling Ollama API: {e}. Please ensure Ollama is running and the model '{model_name}' is available."
+        logger.error(error_msg)
+        raise
+
+
+async def acall_llm_stream(conversation_history, tools, model_name=None):
+    """Async variant of call_llm_stream."""
+    if model_name is None:
+        model_name = OLLAMA_MODEL_NAME
+
+    logger.info(f"Calling Ollama (async) with streaming for {len(conversation_history)} messages and {len(tools)} tools")
+
+    state = _StreamState(conversation_history)
+
+    try:
+        stream = await get_async_client().chat(model=model_name, messages=conversation_history, tools=tools, stream=True)
+        async for chunk in stream:
+            for delta in state.add(chunk):
+                yield delta
+        yield state.finish()
+    except ollama.ResponseError as e:
+        error_msg = f"Error calling Ollama API: {e}. Please ensure Ollama is running and the model '{model_name}' is available."
+        logger.error(error_msg)
+        raise
+
+
+class OllamaClient(LLMClient):
+    """LLMClient for Ollama."""
+
+    name = "ollama"
+    model = OLLAMA_MODEL_NAME
+
+    def call_llm(self, conversation_history, tools):
+        return call_llm(conversation_history, tools)
+
+    def call_llm_stream(self, conversation_history, tools=None):
+        return call_llm_stream(conversation_history, tools or [])
+
+    def complete(self, messages):
+        return complete(messages)
+
+    async def acall_llm(self, conversation_history, tools):
+        return await acall_llm(conversation_history, tools)
+
+    def acall_llm_stream(self, conversation_history, tools=None):
+        return acall_llm_stream(conversation_history, tools or [])
+
+    async def acomplete(self, messages):
+        return await acomplete(messages)
+
+
+CLIENT = OllamaClient()
@@ -1,80 +1,143 @@
+import asyncio
 import json
 import time
+import weakref
 
-import requests
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletionMessage
 
+from LLM_client import LLMClient, async_http_client, http_client
+from LLM_stream import ContentDelta, MessageAssembler, MessageDone, ToolCallDelta, UsageDelta
+from prompt_cache import record_usage
 from utils import get_logger, Config
+from utils.sse import SSEDecoder
 
 # Initialize logger
 logger = get_logger(__name__)
 
+BASE_URL = "https://openrouter.ai/api/v1"
+
 # Get API key from config
 api_key = Config.OPENROUTER_API_KEY
 if not api_key:
     logger.error("OPENROUTER_API_KEY is not set in environment variables")
 
-# Initialize OpenAI client
+# HTTP client on the shared, pooled transport, used for streaming requests
+_http = http_client()
+
+# Initialize OpenAI client on the same connection pool
 client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+    base_url=BASE_URL,
     api_key=api_key,
+    http_client=_http,
 )
 
+# Async clients, one per event loop
+_async_clients = weakref.WeakKeyDictionary()
+
 # Get model from config or use default
 MODEL = Config.DEFAULT_LLM_MODEL
 logger.info(f"Using LLM model: {MODEL}")
 
+# Marks the end of a stream in _parse_events
+_DONE = object()
+
+
+def _async_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        http = async_http_client()
+        _async_clients[loop] = (AsyncOpenAI(base_url=BASE_URL, api_key=api_key, http_client=http), http)
+    return _async_clients[loop]
+
+
+def _record_completion_usage(completion):
+    if completion.usage:
+        details = completion.usage.prompt_tokens_details
+        record_usage(completion.usage.prompt_tokens, details.cached_tokens if details else 0)
+
 
 def call_llm(conversation_history, tools):
     """
     Call the LLM API with the given conversation history and tools.
-    
+
     Args:
         conversation_history: List of message dictionaries
         tools: List of tool definitions
-        
+
     Returns:
         The LLM's response message
     """
     logger.info(f"Calling LLM with {len(conversation_history)} messages and {len(tools)} tools")
-    
+
     start_time = time.time()
-    
+
     request = {
         "model": MODEL,
         "tools": tools,
         "messages": conversation_history
     }
-    
+
     try:
         completion = client.chat.completions.create(**request)
         conversation_history.append(completion.choices[0].message.dict())
-        
+        _record_completion_usage(completion)
+
         end_time = time.time()
         duration = end_time - start_time
         logger.info(f"LLM call completed in {duration:.2f} seconds")
-        
+
+        return completion.choices[0].message
+    except Exception as e:
+        logger.error(f"Error calling LLM: {e}", exc_info=True)
+        raise
+
+
+async def acall_llm(conversation_history, tools):
+    """Async variant of call_llm."""
+    logger.info(f"Calling LLM (async) with {len(conversation_history)} messages and {len(tools)} tools")
+
+    start_time = time.time()
+    async_client, _ = _async_client()
+
+    try:
+        completion = await async_client.chat.completions.create(
+            model=MODEL, tools=tools, messages=conversation_history)
+        conversation_history.append(completion.choices[0].message.dict())
+        _record_completion_usage(completion)
+        logger.info(f"LLM call completed in {time.time() - start_time:.2f} seconds")
         return completion.choices[0].message
     except Exception as e:
         logger.error(f"Error calling LLM: {e}", exc_info=True)
         raise
 
 
-def call_llm_stream(conversation_history):
+def complete(messages):
     """
-    Call the LLM API with streaming enabled.
-    
+    Plain text completion without tools, for internal tasks like summarization.
+
+    Unlike call_llm, the messages list is not modified.
+
     Args:
-        conversation_history: List of message dictionaries
-        
+        messages: List of message dictionaries
+
     Returns:
-        The full response as a string
+        The text of the model's reply
     """
-    logger.info(f"Calling LLM with streaming for {len(conversation_history)} messages")
-    
-    start_time = time.time()
-    
-    url = "https://openrouter.ai/api/v1/chat/completions"
+    logger.info(f"Calling LLM for a completion with {len(messages)} messages")
+    completion = client.chat.completions.create(model=MODEL, messages=messages)
+    return completion.choices[0].message.content or ""
+
+
+async def acomplete(messages):
+    """Async variant of complete."""
+    logger.info(f"Calling LLM (async) for a completion with {len(messages)} messages")
+    async_client, _ = _async_client()
+    completion = await async_client.chat.completions.create(model=MODEL, messages=messages)
+    return completion.choices[0].message.content or ""
+
+
+def _stream_request(conversation_history, tools):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -82,45 +145,203 @@ def call_llm_stream(conversation_history):
     payload = {
         "model": MODEL,
         "messages": conversation_history,
-        "stream": True
+        "stream": True,
+        "usage": {"include": True}
     }
-    
-    buffer = ""
-    full_response = ""
-    
-    try:
-        with requests.post(url, headers=headers, json=payload, stream=True) as r:
-            for chunk in r.iter_content(chunk_size=1024, decode_unicode=True):
-                buffer += chunk
-                while True:
-                    try:
-                        # Find the next complete SSE line
-                        line_end = buffer.find('\n')
-                        if line_end == -1:
-                            break
-                        line = buffer[:line_end].strip()
-                        buffer = buffer[line_end + 1:]
-                        if line.startswith('data: '):
-                            data = line[6:]
-                            if data == '[DONE]':
-                                break
-                            try:
-                                data_obj = json.loads(data)
-                                content = data_obj["choices"][0]["delta"].get("content")
-                                if content:
-                                    logger.debug(f"Received content chunk: {content}")
-                                    full_response += content
-                            except json.JSONDecodeError:
-                                pass
-                    except Exception as e:
-                        logger.error(f"Error processing stream chunk: {e}")
-                        break
-        
-        end_time = time.time()
-        duration = end_time - start_time
+    if tools:
+        payload["tools"] = tools
+    return f"{BASE_URL}/chat/completions", headers, payload
+
+
+def _final_events(decoder):
+    """The event left unterminated when the body ended without a blank line, if any."""
+    event = decoder.flush()
+    return [] if event is None else [event]
+
+
+def _parse_events(events):
+    """Yield the deltas of the decoded events, and _DONE when the stream ends."""
+    for event in events:
+        if event.data == '[DONE]':
+            yield _DONE
+            return
+        try:
+            data_obj = json.loads(event.data)
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed stream event: {event.data[:200]}")
+            continue
+        if "error" in data_obj:
+            raise RuntimeError(f"LLM stream error: {data_obj['error']}")
+        yield from _parse_chunk(data_obj)
+
+
+def stream_deltas(conversation_history, tools=None):
+    """
+    Stream a chat completion as typed delta events.
+
+    The response body is decoded incrementally and events are yielded as
+    soon as they are parsed, so callers can consume them lazily.
+
+    Args:
+        conversation_history: List of message dictionaries
+        tools: Optional list of tool definitions
+
+    Yields:
+        ContentDelta, ToolCallDelta and UsageDelta events
+    """
+    url, headers, payload = _stream_request(conversation_history, tools)
+
+    with _http.stream("POST", url, headers=headers, json=payload) as r:
+        r.raise_for_status()
+        decoder = SSEDecoder()
+        for chunk in r.iter_bytes():
+            for delta in _parse_events(decoder.feed(chunk)):
+                if delta is _DONE:
+                    return
+                yield delta
+        # The provider closed the stream without [DONE]
+        for delta in _parse_events(_final_events(decoder)):
+            if delta is not _DONE:
+                yield delta
+
+
+async def astream_deltas(conversation_history, tools=None):
+    """Async variant of stream_deltas."""
+    url, headers, payload = _stream_request(conversation_history, tools)
+    _, http = _async_client()
+
+    async with http.stream("POST", url, headers=headers, json=payload) as r:
+        r.raise_for_status()
+        decoder = SSEDecoder()
+        async for chunk in r.aiter_bytes():
+            for delta in _parse_events(decoder.feed(chunk)):
+                if delta is _DONE:
+                    return
+                yield delta
+        for delta in _parse_events(_final_events(decoder)):
+            if delta is not _DONE:
+                yield delta
+
+
+def _parse_chunk(data_obj):
+    """Convert one chat.completion.chunk object into delta events."""
+    for choice in data_obj.get("choices") or []:
+        delta = choice.get("delta") or {}
+        if delta.get("content"):
+            yield ContentDelta(delta["content"])
+        for tool_call in delta.get("tool_calls") or []:
+            function = tool_call.get("function") or {}
+            yield ToolCallDelta(
+                index=tool_call.get("index", 0),
+                id=tool_call.get("id"),
+                name=function.get("name") or "",
+                arguments=function.get("arguments") or "",
+            )
+
+    usage = data_obj.get("usage")
+    if usage:
+        yield UsageDelta(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0),
+            details={k: v for k, v in usage.items() if k.endswith("_details") or k == "cost"},
+        )
+
+
+class _StreamTracker:
+    """Assembles streamed deltas into the final message and logs timings."""
+
+    def __init__(self, conversation_history):
+        self.conversation_history = conversation_history
+        self.assembler = MessageAssembler()
+        self.start_time = time.time()
+        self.first_token_time = None
+
+    def add(self, delta):
+        if self.first_token_time is None and delta.type in ("content", "tool_call"):
+            self.first_token_time = time.time()
+            logger.info(f"First token after {self.first_token_time - self.start_time:.2f} seconds")
+        self.assembler.add(delta)
+
+    def finish(self):
+        duration = time.time() - self.start_time
         logger.info(f"LLM streaming call completed in {duration:.2f} seconds")
-        
-        return full_response
+        usage = self.assembler.usage
+        if usage:
+            logger.info(f"Token usage: {usage.prompt_tokens} prompt, "
+                        f"{usage.completion_tokens} completion")
+            details = usage.details.get("prompt_tokens_details") or {}
+            record_usage(usage.prompt_tokens, details.get("cached_tokens", 0))
+
+        message = ChatCompletionMessage.model_validate(self.assembler.message())
+        self.conversation_history.append(message.dict())
+        return MessageDone(message)
+
+
+def call_llm_stream(conversation_history, tools=None):
+    """
+    Call the LLM API with streaming enabled.
+
+    Args:
+        conversation_history: List of message dictionaries
+        tools: Optional list of tool definitions
+
+    Yields:
+        Every ContentDelta, ToolCallDelta and UsageDelta as it arrives, then a
+        MessageDone with the assembled ChatCompletionMessage, which is also
+        appended to conversation_history
+    """
+    logger.info(f"Calling LLM with streaming for {len(conversation_history)} messages")
+    tracker = _StreamTracker(conversation_history)
+
+    try:
+        for delta in stream_deltas(conversation_history, tools):
+            tracker.add(delta)
+            yield delta
+        yield tracker.finish()
+    except Exception as e:
+        logger.error(f"Error in streaming LLM call: {e}", exc_info=True)
+        raise
+
+
+async def acall_llm_stream(conversation_history, tools=None):
+    """Async variant of call_llm_stream."""
+    logger.info(f"Calling LLM (async) with streaming for {len(conversation_history)} messages")
+    tracker = _StreamTracker(conversation_history)
+
+    try:
+        async for delta in astream_deltas(conversation_history, tools):
+            tracker.add(delta)
+            yield delta
+        yield tracker.finish()
     except Exception as e:
         logger.error(f"Error in streaming LLM call: {e}", exc_info=True)
         raise
+
+
+class OpenRouterClient(LLMClient):
+    """LLMClient for OpenRouter."""
+
+    name = "openrouter"
+    model = MODEL
+
+    def call_llm(self, conversation_history, tools):
+        return call_llm(conversation_history, tools)
+
+    def call_llm_stream(self, conversation_history, tools=None):
+        return call_llm_stream(conversation_history, tools)
+
+    def complete(self, messages):
+        return complete(messages)
+
+    async def acall_llm(self, conversation_history, tools):
+        return await acall_llm(conversation_history, tools)
+
+    def acall_llm_stream(self, conversation_history, tools=None):
+        return acall_llm_stream(conversation_history, tools)
+
+    async def acomplete(self, messages):
+        return await acomplete(messages)
+
+
+CLIENT = OpenRouterClient()
@@ -0,0 +1,421 @@
+"""
+Provider routing for LLM calls: failover, circuit breaking and hedging.
+
+LLMRouter is an LLMClient that sends each call to the first healthy provider
+of its list (the configured one first), and to the next one if that call
+fails. Latency and errors are tracked per provider and model, and a circuit
+breaker stops sending calls to a provider after repeated failures until a
+probe call succeeds again, so a failing provider costs one timeout rather
+than one per request.
+
+With hedging enabled, a call to a remote provider that has not answered
+after LLM_HEDGE_AFTER seconds is also sent to the local Ollama model, and
+whichever reply arrives first is used. Both run on a pool of
+LLM_HEDGE_WORKERS threads with a copy of the caller's context, so the
+request deadline (see utils.deadline) reaches them; the caller's thread only
+waits for the first reply. Streaming calls fail over only
+before their first event and are not hedged, since events already shown to
+the user cannot be taken back.
+
+Each attempt works on a copy of the conversation history; only the winning
+provider's reply is appended to the caller's history.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from LLM_client import LLMClient
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderError(Exception):
+    """An LLM provider failed to answer, or no provider is available."""
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class ProviderStats:
+    """
+    Latency and outcome of the recent calls to one provider and model, with its circuit breaker.
+
+    The breaker opens after failure_threshold consecutive failures. Once
+    reset_timeout seconds have passed, one probe call is let through
+    (half open); its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, key, window=100, failure_threshold=5, reset_timeout=30.0):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        """Whether a call may be sent to this provider now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+                logger.info(f"Circuit for {self.key} half open, probing")
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, latency, ok):
+        """Record the outcome of one call."""
+        with self._lock:
+            self._calls.append((latency, ok))
+            self._probing = False
+            if ok:
+                if self._state != CLOSED:
+                    logger.info(f"Circuit for {self.key} closed")
+                self._state = CLOSED
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuit for {self.key} opened after "
+                                   f"{self._consecutive_failures} consecutive failure(s)")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a call without recording an outcome, e.g. when it was cancelled."""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def snapshot(self):
+        """Dict with the call count, p50/p95 latency of successful calls in seconds, error rate and breaker state."""
+        with self._lock:
+            calls = list(self._calls)
+            state = self._state
+        latencies = [latency for latency, ok in calls if ok]
+        errors = sum(1 for _, ok in calls if not ok)
+        return {
+            "calls": len(calls),
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "error_rate": errors / len(calls) if calls else 0.0,
+            "state": state,
+        }
+
+
+class LLMRouter(LLMClient):
+    """
+    An LLMClient that routes each call over a list of provider clients.
+    """
+
+    name = "router"
+
+    def __init__(self, clients, hedge_after=None, hedge_provider="ollama", failure_threshold=None,
+                 reset_timeout=None, window=100, executor=None):
+        """
+        Args:
+            clients: LLMClients in order of preference
+            hedge_after: Seconds after which a call is also sent to hedge_provider;
+                None or 0 disables hedging (defaults to Config.LLM_HEDGE_AFTER)
+            hedge_provider: Name of the client used for hedged calls
+            failure_threshold: Consecutive failures that open a provider's circuit
+                (defaults to Config.LLM_BREAKER_FAILURES)
+            reset_timeout: Seconds an open circuit waits before a probe call
+                (defaults to Config.LLM_BREAKER_RESET_TIMEOUT)
+            window: Number of recent calls per provider the statistics cover
+            executor: Executor for hedged calls (default: a private pool of
+                Config.LLM_HEDGE_WORKERS threads)
+        """
+        self.clients = list(clients)
+        self.hedge_after = Config.LLM_HEDGE_AFTER if hedge_after is None else hedge_after
+        self.hedge_provider = hedge_provider
+        failure_threshold = Config.LLM_BREAKER_FAILURES if failure_threshold is None else failure_threshold
+        reset_timeout = Config.LLM_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self._stats = {
+            client.name: ProviderStats(f"{client.name}:{client.model}", window, failure_threshold, reset_timeout)
+            for client in self.clients
+        }
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.clients[0].model
+
+    def stats(self):
+        """Latency, error rate and breaker state per "provider:model"."""
+        return {stats.key: stats.snapshot() for stats in self._stats.values()}
+
+    def _allow(self, client):
+        return self._stats[client.name].allow()
+
+    def _hedge_for(self, client, tried):
+        """The client to hedge a call to client with, or None."""
+        if not self.hedge_after or client.name == self.hedge_provider:
+            return None
+        return next((c for c in self.clients if c.name == self.hedge_provider and c not in tried), None)
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=Config.LLM_HEDGE_WORKERS,
+                                                    thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def _no_provider(self, errors):
+        if not errors:
+            return ProviderError("No LLM provider available: all circuits are open")
+        return ProviderError("All LLM providers failed: " + "; ".join(errors))
+
+    def _record(self, client, start, ok):
+        self._stats[client.name].record(time.monotonic() - start, ok)
+
+    # Synchronous calls
+
+    def _attempt(self, client, call):
+        start = time.monotonic()
+        try:
+            result = call(client)
+        except Exception:
+            self._record(client, start, False)
+            raise
+        self._record(client, start, True)
+        return result
+
+    def _submit(self, client, call):
+        # Each attempt gets its own copy: a context cannot be entered by two threads at once
+        context = contextvars.copy_context()
+        return self._get_executor().submit(context.run, self._attempt, client, call)
+
+    def _hedged(self, call, primary, hedge, tried):
+        futures = {self._submit(primary, call): primary}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        primary_failed = bool(done) and next(iter(done)).exception() is not None
+        if (not done or primary_failed) and self._allow(hedge):
+            logger.info(f"{primary.name} failed or has not answered after {self.hedge_after}s, "
+                        f"hedging with {hedge.name}")
+            futures[self._submit(hedge, call)] = hedge
+        tried.extend(futures.values())
+
+        errors = []
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        errors.append(f"{futures[future].name}: {e}")
+            raise ProviderError("; ".join(errors))
+        finally:
+            # A running call cannot be interrupted, but one still queued need not take a thread
+            for future in pending:
+                future.cancel()
+
+    def _run(self, call):
+        """Call the providers in order until one succeeds, hedging slow calls if enabled."""
+        errors = []
+        tried = []
+        for client in self.clients:
+            if client in tried or not self._allow(client):
+                continue
+            hedge = self._hedge_for(client, tried)
+            try:
+                if hedge:
+                    return self._hedged(call, client, hedge, tried)
+                tried.append(client)
+                return self._attempt(client, call)
+            except Exception as e:
+                logger.warning(f"LLM call to {client.name} failed, failing over: {e}")
+                errors.append(f"{client.name}: {e}")
+        raise self._no_provider(errors)
+
+    def call_llm(self, conversation_history, tools):
+        def call(client):
+            attempt = list(conversation_history)
+            message = client.call_llm(attempt, tools)
+            # The Ollama client returns errors as strings
+            if isinstance(message, str):
+                raise ProviderError(message)
+            return message, attempt[len(conversation_history):]
+
+        message, added = self._run(call)
+        conversation_history.extend(added)
+        return message
+
+    def complete(self, messages):
+        return self._run(lambda client: client.complete(messages))
+
+    def call_llm_stream(self, conversation_history, tools=None):
+        errors = []
+        for client in self.clients:
+            if not self._allow(client):
+                continue
+            attempt = list(conversation_history)
+            start = time.monotonic()
+            started = False
+            error = None
+            try:
+                for event in client.call_llm_stream(attempt, tools):
+                    started = True
+                    yield event
+            except Exception as e:
+                error = e
+                if started:
+                    raise
+            finally:
+                self._record(client, start, error is None)
+            if error is not None:
+                logger.warning(f"LLM stream from {client.name} failed, failing over: {error}")
+                errors.append(f"{client.name}: {error}")
+                continue
+            conversation_history.extend(attempt[len(conversation_history):])
+            return
+        raise self._no_provider(errors)
+
+    # Async calls
+
+    async def _aattempt(self, client, call):
+        start = time.monotonic()
+        try:
+            result = await call(client)
+        except asyncio.CancelledError:
+            # The losing side of a hedged call
+            self._stats[client.name].release()
+            raise
+        except Exception:
+            self._record(client, start, False)
+            raise
+        self._record(client, start, True)
+        return result
+
+    async def _ahedged(self, call, primary, hedge, tried):
+        tasks = {asyncio.ensure_future(self._aattempt(primary, call)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+        primary_failed = bool(done) and next(iter(done)).exception() is not None
+        if (not done or primary_failed) and self._allow(hedge):
+            logger.info(f"{primary.name} failed or has not answered after {self.hedge_after}s, "
+                        f"hedging with {hedge.name}")
+            tasks[asyncio.ensure_future(self._aattempt(hedge, call))] = hedge
+        tried.extend(tasks.values())
+
+        errors = []
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        errors.append(f"{tasks[task].name}: {e}")
+            raise ProviderError("; ".join(errors))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _arun(self, call):
+        errors = []
+        tried = []
+        for client in self.clients:
+            if client in tried or not self._allow(client):
+                continue
+            hedge = self._hedge_for(client, tried)
+            try:
+                if hedge:
+                    return await self._ahedged(call, client, hedge, tried)
+                tried.append(client)
+                return await self._aattempt(client, call)
+            except Exception as e:
+                logger.warning(f"LLM call to {client.name} failed, failing over: {e}")
+                errors.append(f"{client.name}: {e}")
+        raise self._no_provider(errors)
+
+    async def acall_llm(self, conversation_history, tools):
+        async def call(client):
+            attempt = list(conversation_history)
+            message = await client.acall_llm(attempt, tools)
+            if isinstance(message, str):
+                raise ProviderError(message)
+            return message, attempt[len(conversation_history):]
+
+        message, added = await self._arun(call)
+        conversation_history.extend(added)
+        return message
+
+    async def acomplete(self, messages):
+        return await self._arun(lambda client: client.acomplete(messages))
+
+    async def acall_llm_stream(self, conversation_history, tools=None):
+        errors = []
+        for client in self.clients:
+            if not self._allow(client):
+                continue
+            attempt = list(conversation_history)
+            start = time.monotonic()
+            started = False
+            error = None
+            try:
+                async for event in client.acall_llm_stream(attempt, tools):
+                    started = True
+                    yield event
+            except Exception as e:
+                error = e
+                if started:
+                    raise
+            finally:
+                self._record(client, start, error is None)
+            if error is not None:
+                logger.warning(f"LLM stream from {client.name} failed, failing over: {error}")
+                errors.append(f"{client.name}: {error}")
+                continue
+            conversation_history.extend(attempt[len(conversation_history):])
+            return
+        raise self._no_provider(errors)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide router over the configured provider and its fallback."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            from LLM_client import get_llm_client
+            primary = "openrouter" if Config.USE_OPEN_ROUTER else "ollama"
+            providers = [primary] + [p for p in ("openrouter", "ollama") if p != primary and Config.LLM_FAILOVER]
+            if Config.LLM_HEDGE_AFTER and "ollama" not in providers:
+                providers.append("ollama")
+            _router = LLMRouter([get_llm_client(provider) for provider in providers])
+            logger.info(f"LLM routing over {providers} (hedge after: {_router.hedge_after or 'off'})")
+        return _router
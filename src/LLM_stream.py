@@ -0,0 +1,81 @@
+"""
+Typed events produced by the streaming LLM clients.
+
+Streaming clients yield these lazily as the model generates: content and
+tool call fragments as they arrive, token usage when the provider reports
+it, and finally the assembled assistant message.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Optional
+
+
+@dataclass(frozen=True)
+class ContentDelta:
+    """A fragment of the assistant's text reply."""
+    type: ClassVar[str] = "content"
+    content: str
+
+
+@dataclass(frozen=True)
+class ToolCallDelta:
+    """
+    A fragment of a tool call. Fragments with the same index belong to the
+    same call; name and arguments are concatenated in arrival order.
+    """
+    type: ClassVar[str] = "tool_call"
+    index: int
+    id: Optional[str] = None
+    name: str = ""
+    arguments: str = ""
+
+
+@dataclass(frozen=True)
+class UsageDelta:
+    """Token usage reported by the provider, usually with the last chunk."""
+    type: ClassVar[str] = "usage"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    details: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class MessageDone:
+    """The complete assistant message, assembled from all preceding deltas."""
+    type: ClassVar[str] = "message"
+    message: Any
+
+
+class MessageAssembler:
+    """Accumulates content and tool call deltas into an assistant message dict."""
+
+    def __init__(self):
+        self._content = []
+        self._tool_calls = {}
+        self.usage = None
+
+    def add(self, delta):
+        """Fold one delta event into the message being assembled."""
+        if isinstance(delta, ContentDelta):
+            self._content.append(delta.content)
+        elif isinstance(delta, ToolCallDelta):
+            tool_call = self._tool_calls.setdefault(delta.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            })
+            if delta.id:
+                tool_call["id"] = delta.id
+            tool_call["function"]["name"] += delta.name
+            tool_call["function"]["arguments"] += delta.arguments
+        elif isinstance(delta, UsageDelta):
+            self.usage = delta
+
+    def message(self):
+        """The assembled message, in the OpenAI chat message format."""
+        return {
+            "role": "assistant",
+            "content": "".join(self._content) or None,
+            "tool_calls": [self._tool_calls[index] for index in sorted(self._tool_calls)] or None,
+        }
@@ -0,0 +1,233 @@
+"""
+Shared agent loop: LLM -> tools -> LLM, until the model gives a final answer.
+
+The web API, the Slack bot and the REPL all run a turn through run(), which
+yields events as the turn progresses so each front end can present them in
+its own way. The loop works with any assistant module that provides
+call_llm(conversation_history) and get_tool_response(conn, tool_calls);
+call_llm_stream and render_tool_responses are used when available, and
+SQL_INTENTS (a tools.sql_intents.SQLIntentCache) lets repeated requests skip
+the first LLM call.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, ClassVar, List
+
+from LLM_stream import ContentDelta
+from utils import get_logger, Config
+from utils.deadline import remaining
+
+# Initialize logger
+logger = get_logger(__name__)
+
+RENDER_MODES = ("auto", "local", "llm")
+
+FOLLOW_UP_PROMPT = """Use the tool results above to respond. If you need more information, call another tool. Otherwise give the response in a very short and mobile friendly way. Think about displaying it in a chat app - use newlines as needed. Don't mention the tools or that you are reformatting. Just give the response."""
+
+
+@dataclass(frozen=True)
+class ToolCallsEvent:
+    """The model requested tool calls; they are about to run."""
+    type: ClassVar[str] = "tool_calls"
+    step: int
+    tool_calls: List[Any]
+
+
+@dataclass(frozen=True)
+class ToolResultsEvent:
+    """Tool messages answering the preceding tool calls, in the same order."""
+    type: ClassVar[str] = "tool_results"
+    step: int
+    tool_responses: List[dict]
+
+
+@dataclass(frozen=True)
+class FinalEvent:
+    """
+    The final reply of the turn.
+
+    reason is "answer" when the model replied with content (which was also
+    streamed as ContentDelta events in streaming mode), "rendered" when the
+    tool results were rendered locally, and "budget" when the step or time
+    budget ran out.
+    """
+    type: ClassVar[str] = "final"
+    content: str
+    steps: int
+    reason: str
+
+
+def render_results(assistant, render_mode, tool_responses, fallback=False):
+    """
+    Render tool results for the user without another LLM call.
+
+    Args:
+        assistant: The assistant module
+        render_mode: "auto", "local" or "llm"
+        tool_responses: Tool messages to render
+        fallback: Return the raw results instead of None when they cannot be rendered
+
+    Returns:
+        The rendered text, or None if the LLM should present the results
+    """
+    rendered = None
+    if render_mode != "llm" or fallback:
+        render = getattr(assistant, "render_tool_responses", None)
+        rendered = render(tool_responses) if render else None
+    if rendered is None and (render_mode == "local" or fallback):
+        rendered = "\n\n".join(str(tool_response["content"]) for tool_response in tool_responses)
+    return rendered
+
+
+def _call_llm(assistant, conversation_history, stream):
+    """Yield ContentDelta events if streaming, then return the assistant message."""
+    if stream and hasattr(assistant, "call_llm_stream"):
+        message = None
+        for event in assistant.call_llm_stream(conversation_history):
+            if event.type == "content":
+                yield event
+            elif event.type == "message":
+                message = event.message
+        return message
+
+    message = assistant.call_llm(conversation_history=conversation_history)
+    if stream and message.content:
+        yield ContentDelta(message.content)
+    return message
+
+
+def run(assistant, conn, conversation_history, render_mode=None, max_steps=None,
+        time_budget=None, stream=False):
+    """
+    Run one turn of the conversation, whose user message is already in the history.
+
+    Each step calls the LLM and, if it requested tools, runs them (concurrently
+    where the assistant's dispatcher allows). The loop ends as soon as the
+    model replies without tool calls, when the tool results can be rendered
+    locally (unless render_mode is "llm"), or when max_steps LLM calls or
+    time_budget seconds are used up. The LLM clients append assistant
+    messages to the history; tool results and locally rendered replies are
+    appended here.
+
+    Args:
+        assistant: The assistant module
+        conn: Database connection for the tools
+        conversation_history: The conversation, ending with the user's message
+        render_mode: "auto", "local" or "llm" (defaults to Config.RENDER_MODE)
+        max_steps: Maximum number of LLM calls (defaults to Config.AGENT_MAX_STEPS)
+        time_budget: Seconds after which no further LLM call is started
+            (defaults to Config.AGENT_TIME_BUDGET, and never past the
+            request's deadline)
+        stream: Yield the reply's content as ContentDelta events while it is generated
+
+    Yields:
+        ContentDelta (streaming only), ToolCallsEvent and ToolResultsEvent,
+        and finally one FinalEvent
+    """
+    render_mode = render_mode or Config.RENDER_MODE
+    max_steps = max_steps or Config.AGENT_MAX_STEPS
+    time_budget = Config.AGENT_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + min(time_budget, remaining(time_budget))
+
+    intents = getattr(assistant, "SQL_INTENTS", None)
+    request, standalone = _user_request(conversation_history)
+    first_step = 1
+    # Like learning, replaying is limited to requests that don't depend on earlier turns
+    if intents is not None and request and standalone:
+        replayed, final = yield from _replay_intent(assistant, intents, conn, conversation_history, request,
+                                                    render_mode, max_steps)
+        if final is not None:
+            yield final
+            return
+        if replayed:
+            first_step = 2
+
+    for step in range(first_step, max_steps + 1):
+        message = yield from _call_llm(assistant, conversation_history, stream)
+
+        if not message.tool_calls:
+            if not message.content:
+                logger.warning("Assistant did not provide content or request a tool")
+            logger.info(f"Agent loop finished after {step} step(s)")
+            yield FinalEvent(message.content or "", step, "answer")
+            return
+
+        logger.info(f"Step {step}: assistant is using tools: {len(message.tool_calls)} tool call(s)")
+        yield ToolCallsEvent(step, message.tool_calls)
+
+        tool_responses = assistant.get_tool_response(conn, message.tool_calls)
+        conversation_history.extend(tool_responses)
+        yield ToolResultsEvent(step, tool_responses)
+
+        if step == 1 and standalone and intents is not None:
+            intents.learn(conn, request, message.tool_calls, tool_responses)
+
+        out_of_budget = step == max_steps or time.monotonic() >= deadline
+        final = _finish_step(assistant, render_mode, conversation_history, tool_responses, step, out_of_budget)
+        if final is not None:
+            yield final
+            return
+
+
+def _user_request(conversation_history):
+    """The text of the turn's user message, and whether it opens the conversation."""
+    if not conversation_history or conversation_history[-1].get("role") != "user":
+        return None, False
+    standalone = not any(message.get("role") == "user" for message in conversation_history[:-1])
+    content = conversation_history[-1].get("content")
+    return (content if isinstance(content, str) else None), standalone
+
+
+def _finish_step(assistant, render_mode, conversation_history, tool_responses, step, out_of_budget):
+    """
+    End the turn with locally rendered results, or ask the LLM to follow up.
+
+    Returns:
+        The FinalEvent, or None if the loop should call the LLM again
+    """
+    rendered = render_results(assistant, render_mode, tool_responses, fallback=out_of_budget)
+    if rendered is not None:
+        if out_of_budget:
+            logger.warning(f"Agent loop stopped at step {step}: step or time budget used up")
+        conversation_history.append({"role": "assistant", "content": rendered})
+        return FinalEvent(rendered, step, "budget" if out_of_budget else "rendered")
+
+    conversation_history.append({"role": "user", "content": FOLLOW_UP_PROMPT})
+    return None
+
+
+def _replay_intent(assistant, intents, conn, conversation_history, request, render_mode, max_steps):
+    """
+    Run the SQL saved for the request in place of the first LLM call.
+
+    Nothing is added to the history unless the saved SQL succeeds; otherwise
+    it is forgotten and the caller falls back to the LLM.
+
+    Yields:
+        ToolCallsEvent and ToolResultsEvent of the replayed call
+
+    Returns:
+        Whether saved SQL was run, and the FinalEvent if its results were
+        rendered locally
+    """
+    try:
+        message = intents.replay(conn, request)
+    except Exception as e:
+        logger.warning(f"SQL intent lookup failed: {e}")
+        return False, None
+    if message is None:
+        return False, None
+
+    tool_responses = assistant.get_tool_response(conn, message.tool_calls)
+    if not intents.succeeded(tool_responses):
+        logger.warning("Saved SQL for the request failed, falling back to the LLM")
+        intents.forget(conn, request)
+        return False, None
+
+    logger.info("Step 1: answered from saved SQL without calling the LLM")
+    conversation_history.append(message.dict())
+    yield ToolCallsEvent(1, message.tool_calls)
+    conversation_history.extend(tool_responses)
+    yield ToolResultsEvent(1, tool_responses)
+    return True, _finish_step(assistant, render_mode, conversation_history, tool_responses, 1, max_steps == 1)
@@ -1,43 +1,49 @@
-import json
 import pprint
 import time
 from datetime import datetime
 
 #<TOOL_IMPORT>
-import LLM_client_ollama
-import LLM_client_openrouter
+from LLM_client import get_llm_client
+from context_window import ContextWindow
+from prompt_cache import system_message
+from response_cache import ResponseCache
+from tools import ascii_art_generator, eval, renderers, self_aware, sql_postgres
+from tools.dispatcher import ToolDispatcher
+from tools.registry import PromptFragment, ToolRegistry, file_mtime
+from tools.sql_intents import get_intent_cache
 from utils import Config
-from tools import ascii_art_generator, eval, self_aware, sql_postgres
 
 
-def system_prompt(conn):
-    tools_system_prompts = ""
-    current_tool_mapping = TOOL_MAPPING(conn)
-    for tool_name in current_tool_mapping:
-        tool_data = current_tool_mapping[tool_name]
-        tools_system_prompts += tool_data['system_prompt']
+# Keeps the messages sent with each call within the model's token budget
+CONTEXT = ContextWindow()
+
 
-    return {
-        "role":
-        "system",
-        "content":
-        f"""
+SYSTEM_PROMPT_HEADER = """
 You are a helpful AI assistant.
-The current date and time are: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 You have access to tools that you can run to help you respond to the user's requests.
 Description and instructions for each tool follow: \n
-""" + tools_system_prompts
-    }
+"""
+
+
+def system_prompt(conn):
+    # Stable text first so the provider can reuse its cached prompt prefix,
+    # the current time last since it changes with every request
+    stable = SYSTEM_PROMPT_HEADER + REGISTRY.system_prompt(conn)
+    volatile = f"""
+The current date and time are: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+"""
+    return system_message(stable, volatile)
 
 
 def call_llm(conversation_history):
     pprint.pp(conversation_history)
     start_time = time.time()
 
-    if (Config.USE_OPEN_ROUTER):
-        response = LLM_client_openrouter.call_llm(conversation_history, TOOLS)
-    else:
-        response = LLM_client_ollama.call_llm(conversation_history, TOOLS)
+    messages = CONTEXT.build(conversation_history)
+    sent = len(messages)
+    response = RESPONSE_CACHE.call_llm(get_llm_client(), messages, TOOLS)
+    # The clients append their reply to the messages they were given
+    conversation_history.extend(messages[sent:])
 
     end_time = time.time()
     duration = end_time - start_time
@@ -47,68 +53,30 @@ def call_llm(conversation_history):
     return response
 
 
-def get_tool_response(conn, tool_calls):
-    tool_responses = []
-    current_tool_mapping = TOOL_MAPPING(conn)
+def call_llm_stream(conversation_history):
+    start_time = time.time()
 
-    for tool_call in tool_calls:
-        tool_name = tool_call.function.name
-        tool_args = {}
-        try:
-            tool_args = json.loads(tool_call.function.arguments)
-        except Exception:
-            tool_args = tool_call.function.arguments
+    messages = CONTEXT.build(conversation_history)
+    sent = len(messages)
+    for event in RESPONSE_CACHE.call_llm_stream(get_llm_client(), messages, TOOLS):
+        yield event
+    conversation_history.extend(messages[sent:])
 
-        if tool_name in current_tool_mapping:
-            tool_function = current_tool_mapping[tool_name]['function']
-            try:
-                tool_result = tool_function(**tool_args)
-            except Exception as e:
-                tool_result = f"Error executing tool {tool_name}: {e}"
-        else:
-            tool_result = f"Error: Tool '{tool_name}' not found in current mapping."
+    duration = time.time() - start_time
+    print(f"LLM streaming call duration: {duration:.2f} seconds")
 
-        if hasattr(tool_call, 'id'):
-            tool_responses.append({
-                "role": "tool",
-                "tool_call_id":
-                tool_call.id,  # Original was commented, keeping as is
-                "name": tool_name,
-                "content": str(tool_result),
-            })
-        else:
-            tool_responses.append({
-                "role": "tool",
-                "name": tool_name,
-                "content": str(tool_result),
-            })
 
-    return tool_responses
+def get_tool_response(conn, tool_calls):
+    return DISPATCHER.dispatch(conn, tool_calls)
 
 
-def TOOL_MAPPING(conn):
-    current_code_for_prompt = self_aware.get_current_assistant_code(__file__)
+def render_tool_responses(tool_responses):
+    """Render tool results for the user, or None if the LLM has to reformat them."""
+    return REGISTRY.render(tool_responses)
 
-    return {
-        #<TOOL_MAPPING>,
-        "ascii_art_generator": {
-            "function":
-            ascii_art_generator.ascii_art_generator,
-            "system_prompt":
-            """Tool: ascii_art_generator
-Description: This tool generates ASCII art graphs from SQL query data. It can take data retrieved from SQL queries and produce simple ASCII representations of that data.
-Instructions:
-- Use this tool to create ASCII art graphs from data returned by SQL queries.
-- The input data should be in a format suitable for creating graphs (e.g., numerical values).
-- The output will be a string formatted as ASCII art.
-- Ensure that the generated ASCII art is visually understandable and properly represents the data.
-"""
-        },
-        "postgres_sql_run": {
-            "function":
-            sql_postgres.run_sql(conn),
-            "system_prompt":
-            f"""
+
+def postgres_sql_run_prompt(conn):
+    return f"""
 Tool: postgres_sql_run
 Description: Runs SQL against an Postgres database.
 Instructions:
@@ -124,17 +92,15 @@ Instructions:
 - Provide only the final, executable SQL code. No hypothetical examples.
 - If the schema seems insufficient for the user's request, include `CREATE TABLE` statements first, then the necessary DML.
 - The existing Postgres SQL Schema is: \n{sql_postgres.get_schema(conn)}\n
-""",
-        },
-        "self-code-update": {
-            "function":
-            self_aware.add_tool(__file__),
-            "system_prompt":
-            """
+"""
+
+
+def self_code_update_prompt(conn):
+    current_code_for_prompt = self_aware.get_current_assistant_code(__file__)
+    return """
 Tool: self-code-update
 Description: Allows you to update your own underlying Python code by adding new tools. The updated code will be saved to a new file with an incremented version number (e.g., if current is assistant_v2.py, new will be assistant_v3.py).
-Your current code in file """ + __file__ +
-            """  (from the file this instance is running from) is:
+Your current code in file """ + __file__ + """  (from the file this instance is running from) is:
 ```python""" + current_code_for_prompt + """
 ```
 - To use this tool:
@@ -142,13 +108,66 @@ Your current code in file """ + __file__ +
   2. Carefully construct the complete new Python code. Ensure it's valid Python.
   3. Call the `self-code-update` tool, passing the system_prompt, tool_schema and tool_code parameters.
 - Be extremely careful. Ensure the new code is functional and maintains necessary existing structures unless a change in structure is the specific goal. Bugs in the new code can render you inoperable until manually fixed.
-""",
-        },
-        "python_code_executor": {
-            "function":
-            eval.execute_python_code,
-            "system_prompt":
-            """
+"""
+
+
+TOOL_MAPPING = {
+    #<TOOL_MAPPING>,
+    "ascii_art_generator": {
+        "function":
+        ascii_art_generator.ascii_art_generator,
+        "render":
+        renderers.render_ascii_art,
+        "deterministic":
+        True,
+        "system_prompt":
+        """Tool: ascii_art_generator
+Description: This tool generates ASCII art graphs from SQL query data. It can take data retrieved from SQL queries and produce simple ASCII representations of that data.
+Instructions:
+- Use this tool to create ASCII art graphs from data returned by SQL queries.
+- The input data should be in a format suitable for creating graphs (e.g., numerical values).
+- The output will be a string formatted as ASCII art.
+- Ensure that the generated ASCII art is visually understandable and properly represents the data.
+"""
+    },
+    "postgres_sql_run": {
+        "function":
+        sql_postgres.run_sql,
+        "bind_connection":
+        True,
+        "system_prompt":
+        PromptFragment(postgres_sql_run_prompt,
+                       version=sql_postgres.schema_version,
+                       segment="data"),
+        # Reads run concurrently on their own pooled connection
+        "parallel_safe":
+        sql_postgres.is_read_only,
+        "timeout":
+        60,
+        "render":
+        renderers.render_sql_result,
+    },
+    "self-code-update": {
+        "function":
+        self_aware.add_tool(__file__),
+        "system_prompt":
+        PromptFragment(self_code_update_prompt,
+                       version=file_mtime(__file__),
+                       segment="code"),
+    },
+    "python_code_executor": {
+        "function":
+        eval.execute_python_code,
+        "parallel_safe":
+        eval.is_parallel_safe,
+        "deterministic":
+        eval.is_deterministic,
+        "timeout":
+        30,
+        "render":
+        renderers.render_python_output,
+        "system_prompt":
+        """
 Tool: python_code_executor
 Description: Executes a given Python code snippet and returns the output or any errors encountered during execution.
 Use this for mathemathical computations or anything that requires exact responses which could be implemented as python code.
@@ -157,8 +176,8 @@ Instructions:
 - The output will include any results printed or error messages generated during execution.
 - Always print the result of the computation that you want to output, don't just return it.
 """,
-        }
     }
+}
 
 
 # This 'tools' list is for the LLM client, defining the schema of available functions.
@@ -256,3 +275,71 @@ TOOLS = [
         }
     }
 ]
+
+
+# Persistent Python sessions (SANDBOX_STATEFUL) keep variables between
+# python_code_executor calls; their tools are only offered when enabled
+if Config.SANDBOX_STATEFUL:
+    TOOL_MAPPING["python_code_executor"]["system_prompt"] += """- Variables, imports and functions defined in one call are kept for later calls in the same conversation, so don't recompute or redefine them.
+"""
+    TOOL_MAPPING.update({
+        "python_session_inspect": {
+            "function":
+            eval.inspect_python_session,
+            "render":
+            renderers.render_python_output,
+            "system_prompt":
+            """
+Tool: python_session_inspect
+Description: Lists the variables of this conversation's persistent Python session, with their types and values.
+Instructions:
+- Use it to check which variables earlier python_code_executor calls left before reusing them.
+""",
+        },
+        "python_session_reset": {
+            "function":
+            eval.reset_python_session,
+            "render":
+            renderers.render_python_output,
+            "system_prompt":
+            """
+Tool: python_session_reset
+Description: Clears this conversation's persistent Python session, so the next python_code_executor call starts from an empty namespace.
+Instructions:
+- Use it when the user asks to start over or when the session's state got in the way.
+""",
+        },
+    })
+    TOOLS.extend([
+        {
+            "type": "function",
+            "function": {
+                "name": "python_session_inspect",
+                "description":
+                "Lists the variables of this conversation's persistent Python session.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {}
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "python_session_reset",
+                "description":
+                "Clears this conversation's persistent Python session.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {}
+                }
+            }
+        },
+    ])
+
+REGISTRY = ToolRegistry(TOOL_MAPPING, TOOLS)
+DISPATCHER = ToolDispatcher(REGISTRY)
+# Answers repeated requests without calling the LLM
+RESPONSE_CACHE = ResponseCache(REGISTRY)
+# Runs the saved SQL of recurring questions (used by agent_loop), or None if disabled
+SQL_INTENTS = get_intent_cache()
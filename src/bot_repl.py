@@ -6,6 +6,7 @@ import time
 import json
 import pprint
 import argparse # For command-line arguments
+import agent_loop
 import assistant_loader
 from tools import sql
 
@@ -75,31 +76,15 @@ def repl():
                 conversation_history.append({"role": "user", "content": user_input})
 
                 # 'assistant' is now the dynamically imported module
-                assistant_response = assistant.call_llm(conversation_history=conversation_history)
-
-                print("Assistant Response")
-                pprint.pp(assistant_response)
-
-                if assistant_response.tool_calls is not None:
-                    print(f"USING TOOL")
-                    pprint.pp(assistant_response.tool_calls)
-                    try:
-                        # 'assistant' is now the dynamically imported module
-                        tool_responses = assistant.get_tool_response(conn, assistant_response.tool_calls)
-                        for tool_response in tool_responses:
+                for event in agent_loop.run(assistant, conn, conversation_history):
+                    if event.type == "tool_calls":
+                        print(f"USING TOOL")
+                        pprint.pp(event.tool_calls)
+                    elif event.type == "tool_results":
+                        for tool_response in event.tool_responses:
                             print("Tool response: " + tool_response["content"])
-                            conversation_history.append(tool_response)
-                    except Exception as e:
-                         print(f"An unexpected error occurred while using tool: {e}")
-                else:
-                    print("No tool called by assistant.")
-                    if assistant_response.content is not None:
-                        print(assistant_response.content)
-                        conversation_history.append({"role": "assistant", "content": assistant_response.content})
-                    else:
-                        # Handle cases where there's no content and no tool call (might indicate an issue)
-                        print("Assistant did not provide content or request a tool.")
-                        conversation_history.append({"role": "assistant", "content": ""}) # Add empty assistant message
+                    elif event.type == "final":
+                        print(event.content or "Assistant did not provide content or request a tool.")
 
             except EOFError:
                 print("\nAssistant: Exiting.")
@@ -3,9 +3,12 @@ import json
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+import agent_loop
 import assistant_loader
 from tools import sql_postgres
 from utils import get_logger, Config
+from utils.deadline import request_deadline
+from utils.sandbox_kernels import conversation_scope
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -68,14 +71,29 @@ def process_slack_message(app, say, body, logger_in_handler, client):
             say(text=error_msg, thread_ts=reply_in_thread_ts)
         return
 
-    conn = None
     try:
-        conn = sql_postgres.get_connection_from_env_credentials()
-        log.info("Database connection established")
+        with request_deadline(Config.REQUEST_TIMEOUT), conversation_scope(thread_id), \
+                sql_postgres.connection() as conn:
+            log.info("Leased database connection from pool")
+
+            conversation_history = conversation_histories.get(thread_id, [])
+
+            if not conversation_history:
+                if assistant is None:
+                    error_msg = "Assistant module not loaded"
+                    if logger_in_handler:
+                        logger_in_handler.error(error_msg)
+                    else:
+                        print(error_msg)
+                    say(text=error_msg, thread_ts=reply_in_thread_ts)
+                    return
+                
+                system_message = assistant.system_prompt(conn)
+                conversation_history.append(system_message)
+                log.info(f"New conversation started for thread {thread_id}")
 
-        conversation_history = conversation_histories.get(thread_id, [])
+            conversation_history.append({"role": "user", "content": text})
 
-        if not conversation_history:
             if assistant is None:
                 error_msg = "Assistant module not loaded"
                 if logger_in_handler:
@@ -84,64 +102,25 @@ def process_slack_message(app, say, body, logger_in_handler, client):
                     print(error_msg)
                 say(text=error_msg, thread_ts=reply_in_thread_ts)
                 return
-                
-            system_message = assistant.system_prompt(conn)
-            conversation_history.append(system_message)
-            log.info(f"New conversation started for thread {thread_id}")
-
-        conversation_history.append({"role": "user", "content": text})
-
-        if assistant is None:
-            error_msg = "Assistant module not loaded"
-            if logger_in_handler:
-                logger_in_handler.error(error_msg)
-            else:
-                print(error_msg)
-            say(text=error_msg, thread_ts=reply_in_thread_ts)
-            return
             
-        assistant_response = assistant.call_llm(
-            conversation_history=conversation_history)
-        log.info(f"Received assistant response for thread {thread_id}")
-        log.debug(f"LLM Raw Response: {assistant_response}")
-
-        # Handle tool calls or content
-        if assistant_response.tool_calls is not None:
-            log.info(f"Assistant is using tools: {len(assistant_response.tool_calls)} tool call(s)")
-            say(text="I will run the following Tools:", thread_ts=reply_in_thread_ts)
-            for tool_call in assistant_response.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-                say(text=f"Tool: {tool_name}\nArguments: {tool_args}",
-                    thread_ts=reply_in_thread_ts)
-
-            if assistant is None:
-                error_msg = "Assistant module not loaded"
-                if logger_in_handler:
-                    logger_in_handler.error(error_msg)
-                else:
-                    print(error_msg)
-                say(text=error_msg, thread_ts=reply_in_thread_ts)
-                return
-                
-            tool_responses = assistant.get_tool_response(
-                conn, assistant_response.tool_calls)
-            for tool_response in tool_responses:
-                log.debug(f"Tool response: {tool_response['content']}")
-                tool_response_content = tool_response["content"]
-                say(text=f"Result: {tool_response_content}", thread_ts=reply_in_thread_ts)
-                conversation_history.append(tool_response)
-
-        else:
-            log.info("No tool called by assistant")
-            say(text=assistant_response.content, thread_ts=reply_in_thread_ts)
-            conversation_history.append({
-                "role": "assistant",
-                "content": assistant_response.content
-            })
-
-        conversation_histories[thread_id] = conversation_history
-        log.info(f"Conversation history for thread {thread_id} updated. Length: {len(conversation_history)}")
+            for event in agent_loop.run(assistant, conn, conversation_history):
+                if event.type == "tool_calls":
+                    say(text="I will run the following Tools:", thread_ts=reply_in_thread_ts)
+                    for tool_call in event.tool_calls:
+                        tool_name = tool_call.function.name
+                        tool_args = json.loads(tool_call.function.arguments)
+                        say(text=f"Tool: {tool_name}\nArguments: {tool_args}",
+                            thread_ts=reply_in_thread_ts)
+                elif event.type == "tool_results":
+                    for tool_response in event.tool_responses:
+                        log.debug(f"Tool response: {tool_response['content']}")
+                elif event.type == "final":
+                    log.info(f"Agent loop for thread {thread_id} finished after {event.steps} step(s)")
+                    say(text=event.content or "Assistant did not provide content or request a tool.",
+                        thread_ts=reply_in_thread_ts)
+
+            conversation_histories[thread_id] = conversation_history
+            log.info(f"Conversation history for thread {thread_id} updated. Length: {len(conversation_history)}")
 
     except Exception as e:
         log.error(f"Error in process_slack_message for thread {thread_id}: {e}", exc_info=True)
@@ -164,10 +143,6 @@ def process_slack_message(app, say, body, logger_in_handler, client):
 
         except Exception as say_e:
             log.error(f"Failed to send error message to Slack for thread {thread_id}: {say_e}", exc_info=True)
-    finally:
-        if conn:
-            conn.close()
-            log.info("Database connection closed")
 
 
 def start_slack_bot():
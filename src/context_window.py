@@ -0,0 +1,303 @@
+"""
+Token-budgeted view of a conversation history for LLM calls.
+
+Stored conversation histories grow with every turn. Before each LLM call the
+assistant modules pass the history through a ContextWindow, which keeps the
+system prompt and the most recent turns within a per-model token budget:
+
+1. If the whole history fits, it is sent unchanged.
+2. Otherwise large tool results of older turns are cut down to a preview.
+3. If that is not enough, the oldest turns are dropped and replaced by a
+   rolling summary. Summaries are produced by the LLM on a background
+   thread and cached by the exact turns they cover, so the request that
+   first needs one never waits for it: until it is ready, the longest
+   already summarized prefix is used instead.
+
+The stored history itself is never modified.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Token budgets for conversation messages (not counting tool schemas or the
+# reply), for models without an entry in CONTEXT_TOKEN_BUDGETS
+DEFAULT_MODEL_BUDGETS = {
+    "openai/gpt-4o-mini": 32000,
+    "openai/gpt-4o": 32000,
+    "qwen2.5-coder:3b": 8000,
+}
+
+# Fixed per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier part of this conversation:\n"
+
+SUMMARIZE_PROMPT = """Summarize the conversation below so you can continue it later without the original messages.
+Keep facts, decisions, names of tables and columns, numbers and any open questions.
+If a previous summary is given, fold it into the new summary.
+Answer with the summary only, in at most {max_words} words."""
+
+_UNSET = object()
+_encoding = _UNSET
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is _UNSET:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            logger.info("tiktoken not available, estimating token counts from text length")
+            _encoding = None
+    return _encoding
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(text):
+    """Number of tokens in text (exact with tiktoken, else about 4 characters per token)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Content blocks, as used for prompt caching
+        content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    parts = [str(content)]
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {}) if isinstance(tool_call, dict) else {}
+        parts.append(str(function.get("name", "")))
+        parts.append(str(function.get("arguments", "")))
+    if message.get("name"):
+        parts.append(str(message["name"]))
+    return "\n".join(parts)
+
+
+def count_message_tokens(message):
+    """Approximate number of prompt tokens a chat message takes."""
+    return MESSAGE_OVERHEAD_TOKENS + count_text_tokens(_message_text(message))
+
+
+def _role(message):
+    return message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+
+
+def split_turns(messages):
+    """
+    Group messages into turns, each starting with a user message.
+
+    A user message directly following tool results (such as a follow-up
+    instruction) stays in the same turn, so an assistant message with
+    tool_calls is never separated from its tool results.
+    """
+    turns = []
+    for message in messages:
+        starts_turn = _role(message) == "user" and not (turns and _role(turns[-1][-1]) == "tool")
+        if starts_turn or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def current_model():
+    """Name of the model the assistant modules are currently configured to call."""
+    return Config.DEFAULT_LLM_MODEL if Config.USE_OPEN_ROUTER else Config.OLLAMA_MODEL
+
+
+def llm_summarize(previous_summary, messages, max_words=250):
+    """
+    Summarize messages with the configured LLM provider.
+
+    Args:
+        previous_summary: Summary of the turns before messages, or None
+        messages: Messages to summarize
+        max_words: Upper bound on the summary length
+
+    Returns:
+        The summary text
+    """
+    transcript = []
+    if previous_summary:
+        transcript.append(f"Previous summary:\n{previous_summary}\n")
+    for message in messages:
+        transcript.append(f"{_role(message)}: {_message_text(message).strip()}")
+
+    prompt = [
+        {"role": "system", "content": SUMMARIZE_PROMPT.format(max_words=max_words)},
+        {"role": "user", "content": "\n".join(transcript)},
+    ]
+    from LLM_client import get_llm_client
+    return get_llm_client().complete(prompt)
+
+
+class ContextWindow:
+    """
+    Builds the list of messages sent to the LLM from a full conversation history.
+
+    Thread-safe; one instance is shared by all conversations of an assistant module.
+    """
+
+    def __init__(self, budgets=None, default_budget=None, summarizer=llm_summarize,
+                 tool_result_tokens=300, summary_tokens=400, min_turns=1,
+                 cache_size=256, executor=None):
+        """
+        Args:
+            budgets: Dict of model name to token budget (defaults to
+                DEFAULT_MODEL_BUDGETS updated with Config.CONTEXT_TOKEN_BUDGETS)
+            default_budget: Budget for other models (defaults to Config.CONTEXT_TOKEN_BUDGET)
+            summarizer: Callable (previous_summary, messages) -> summary text,
+                or None to drop old turns without summarizing them
+            tool_result_tokens: Size older tool results are cut down to
+            summary_tokens: Tokens reserved for the summary message
+            min_turns: Most recent turns that are always kept, even over budget
+            cache_size: Number of summaries kept in memory
+            executor: Executor for summarization (defaults to a single background thread)
+        """
+        if budgets is None:
+            budgets = dict(DEFAULT_MODEL_BUDGETS, **Config.CONTEXT_TOKEN_BUDGETS)
+        self.budgets = budgets
+        self.default_budget = Config.CONTEXT_TOKEN_BUDGET if default_budget is None else default_budget
+        self.summarizer = summarizer
+        self.tool_result_tokens = tool_result_tokens
+        self.summary_tokens = summary_tokens
+        self.min_turns = min_turns
+        self.cache_size = cache_size
+
+        self._summaries = OrderedDict()  # prefix digest -> summary text
+        self._pending = set()  # prefix digests being summarized
+        self._lock = threading.Lock()
+        self._executor = executor
+
+    def budget_for(self, model):
+        """Token budget for conversation messages sent to model."""
+        return self.budgets.get(model, self.default_budget)
+
+    def build(self, history, model=None):
+        """
+        Return the messages to send for history, within the model's budget.
+
+        Args:
+            history: Full conversation history (not modified)
+            model: Model name, defaults to the currently configured model
+
+        Returns:
+            A new list of messages
+        """
+        budget = self.budget_for(model or current_model())
+        messages = [m if isinstance(m, dict) else m.dict() for m in history]
+
+        system = messages[:1] if messages and _role(messages[0]) == "system" else []
+        turns = split_turns(messages[len(system):])
+        system_tokens = sum(count_message_tokens(m) for m in system)
+        turn_tokens = [sum(count_message_tokens(m) for m in turn) for turn in turns]
+
+        if system_tokens + sum(turn_tokens) <= budget:
+            return messages
+
+        # Older turns first lose the bulk of their tool results
+        turns = [self._compact(turn) for turn in turns[:-1]] + turns[-1:]
+        turn_tokens = [sum(count_message_tokens(m) for m in turn) for turn in turns]
+        if system_tokens + sum(turn_tokens) <= budget:
+            return system + [m for turn in turns for m in turn]
+
+        # Then the oldest turns are dropped, keeping room for their summary
+        available = budget - system_tokens - self.summary_tokens
+        keep = 0
+        used = 0
+        for tokens in reversed(turn_tokens):
+            if keep >= self.min_turns and used + tokens > available:
+                break
+            keep += 1
+            used += tokens
+
+        dropped, kept = turns[:len(turns) - keep], turns[len(turns) - keep:]
+        summary = self._summary_for(dropped)
+        logger.info(
+            f"Context window: sending {len(kept)} of {len(turns)} turns "
+            f"(~{system_tokens + used} tokens, budget {budget}), "
+            f"{'with' if summary else 'without'} a summary of the rest")
+
+        window = list(system)
+        if summary:
+            window.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        window.extend(m for turn in kept for m in turn)
+        return window
+
+    def _compact(self, turn):
+        compacted = []
+        for message in turn:
+            if _role(message) == "tool" and count_message_tokens(message) > self.tool_result_tokens:
+                content = str(message.get("content") or "")
+                preview = content[:self.tool_result_tokens * 2]
+                omitted = count_text_tokens(content) - count_text_tokens(preview)
+                message = dict(message, content=f"{preview}\n[... ~{omitted} more tokens of tool output omitted]")
+            compacted.append(message)
+        return compacted
+
+    def _summary_for(self, dropped):
+        """Best cached summary for the dropped turns; schedules a better one if needed."""
+        if not dropped or self.summarizer is None:
+            return None
+
+        digests = self._prefix_digests(dropped)
+        with self._lock:
+            covered, summary = self._best_cached(digests)
+            schedule = covered < len(dropped) and digests[-1] not in self._pending
+            if schedule:
+                self._pending.add(digests[-1])
+        if schedule:
+            self._get_executor().submit(self._summarize, dropped, digests)
+        return summary
+
+    def _best_cached(self, digests):
+        # Caller holds self._lock
+        for covered in range(len(digests), 0, -1):
+            summary = self._summaries.get(digests[covered - 1])
+            if summary is not None:
+                self._summaries.move_to_end(digests[covered - 1])
+                return covered, summary
+        return 0, None
+
+    def _summarize(self, turns, digests):
+        try:
+            with self._lock:
+                covered, previous = self._best_cached(digests)
+            messages = [m for turn in turns[covered:] for m in turn]
+            summary = self.summarizer(previous, messages)
+            with self._lock:
+                self._summaries[digests[-1]] = summary
+                while len(self._summaries) > self.cache_size:
+                    self._summaries.popitem(last=False)
+            logger.info(f"Summarized {len(turns)} earlier turns ({len(messages)} new messages)")
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._pending.discard(digests[-1])
+
+    def _prefix_digests(self, turns):
+        digests = []
+        digest = hashlib.sha256()
+        for turn in turns:
+            digest.update(json.dumps(turn, sort_keys=True, default=str).encode())
+            digests.append(digest.copy().hexdigest())
+        return digests
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        return self._executor
@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Key prefix used for conversations stored in Replit DB
+REPLIT_KEY_PREFIX = "conversation_"
+
+
+class ConversationStore(ABC):
+    """
+    Interface for persisting conversation histories.
+
+    Histories are append-only: a front end loads the history once per turn
+    and then appends only the messages produced during that turn.
+    """
+
+    @abstractmethod
+    def load(self, conv_id):
+        """
+        Load a conversation history.
+
+        Returns:
+            List of message dictionaries, or None if the conversation does not exist
+        """
+
+    @abstractmethod
+    def append(self, conv_id, messages):
+        """Append messages to the end of a conversation, creating it if needed."""
+
+    @abstractmethod
+    def delete(self, conv_id):
+        """Remove a conversation and all its messages."""
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Append-only conversation store backed by a local SQLite database.
+
+    Each message is one row, so a turn writes only its new messages instead
+    of rewriting the whole history. If a legacy store is given, conversations
+    missing locally are migrated from it on first load.
+    """
+
+    def __init__(self, path, legacy_store=None):
+        """
+        Args:
+            path: Path of the SQLite database file
+            legacy_store: Optional store to migrate unknown conversations from
+        """
+        self.path = path
+        self.legacy_store = legacy_store
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conv_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS conversation_messages_conv_id_idx
+                ON conversation_messages (conv_id, id)
+            """)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, conv_id):
+        rows = self._connection().execute(
+            "SELECT message FROM conversation_messages WHERE conv_id = ? ORDER BY id",
+            (conv_id, )).fetchall()
+        if rows:
+            return [json.loads(row[0]) for row in rows]
+
+        if self.legacy_store is not None:
+            history = self.legacy_store.load(conv_id)
+            if history:
+                logger.info(f"Migrating conversation {conv_id} ({len(history)} messages) from legacy store")
+                self.append(conv_id, history)
+                return history
+        return None
+
+    def append(self, conv_id, messages):
+        if not messages:
+            return
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO conversation_messages (conv_id, message) VALUES (?, ?)",
+                [(conv_id, json.dumps(message, default=str)) for message in messages])
+        logger.debug(f"Appended {len(messages)} message(s) to conversation {conv_id}")
+
+    def delete(self, conv_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM conversation_messages WHERE conv_id = ?", (conv_id, ))
+
+
+class ReplitConversationStore(ConversationStore):
+    """
+    Legacy store keeping each whole history under one Replit DB key.
+
+    Every append rewrites the full history, so this is kept only as a
+    migration source and for deployments that cannot write local files.
+    """
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Replit database instance (``replit.db``)
+        """
+        self.db = db
+
+    def load(self, conv_id):
+        history = self.db.get(REPLIT_KEY_PREFIX + conv_id)
+        if history is None:
+            return None
+        return [_to_primitive(message) for message in _to_primitive(history)]
+
+    def append(self, conv_id, messages):
+        history = self.load(conv_id) or []
+        self.db.set(REPLIT_KEY_PREFIX + conv_id, history + list(messages))
+
+    def delete(self, conv_id):
+        key = REPLIT_KEY_PREFIX + conv_id
+        if key in self.db:
+            del self.db[key]
+
+    def conversation_ids(self):
+        """Ids of all conversations stored in Replit DB."""
+        keys = self.db.prefix(REPLIT_KEY_PREFIX) if hasattr(self.db, "prefix") else [
+            key for key in self.db.keys() if key.startswith(REPLIT_KEY_PREFIX)
+        ]
+        return [key[len(REPLIT_KEY_PREFIX):] for key in keys]
+
+
+def _to_primitive(value):
+    """Convert Replit DB observed containers to plain lists and dicts."""
+    try:
+        from replit.database import to_primitive
+    except ImportError:
+        return value
+    return to_primitive(value)
+
+
+def _replit_db():
+    try:
+        from replit import db
+    except ImportError:
+        return None
+    return db
+
+
+def migrate_replit_conversations(replit_store, store, delete_migrated=False):
+    """
+    Copy every conversation from Replit DB into another store.
+
+    Conversations that already exist in the target store are skipped, so the
+    migration can be re-run safely.
+
+    Args:
+        replit_store: ReplitConversationStore to read from
+        store: ConversationStore to write to
+        delete_migrated: Remove conversations from Replit DB once copied
+
+    Returns:
+        Number of conversations migrated
+    """
+    migrated = 0
+    for conv_id in replit_store.conversation_ids():
+        if store.load(conv_id):
+            continue
+
+        history = replit_store.load(conv_id)
+        if history:
+            store.append(conv_id, history)
+            migrated += 1
+        if delete_migrated:
+            replit_store.delete(conv_id)
+
+    logger.info(f"Migrated {migrated} conversation(s) from Replit DB")
+    return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """Return the configured conversation store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            db = _replit_db()
+            replit_store = ReplitConversationStore(db) if db is not None else None
+
+            if Config.CONVERSATION_STORE == "replit":
+                if replit_store is None:
+                    raise ValueError("CONVERSATION_STORE=replit but Replit DB is not configured")
+                logger.info("Using Replit DB conversation store")
+                _store = replit_store
+            else:
+                legacy_store = replit_store if Config.CONVERSATION_MIGRATE_FROM_REPLIT else None
+                logger.info(f"Using SQLite conversation store at {Config.CONVERSATION_DB_PATH}")
+                _store = SQLiteConversationStore(Config.CONVERSATION_DB_PATH, legacy_store=legacy_store)
+        return _store
+
+
+if __name__ == "__main__":
+    # Bulk migration: python src/conversation_store.py
+    db = _replit_db()
+    if db is None:
+        print("Replit DB is not configured, nothing to migrate.")
+    else:
+        target = SQLiteConversationStore(Config.CONVERSATION_DB_PATH)
+        count = migrate_replit_conversations(ReplitConversationStore(db), target)
+        print(f"Migrated {count} conversation(s) to {os.path.abspath(Config.CONVERSATION_DB_PATH)}")
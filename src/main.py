@@ -3,18 +3,20 @@ import uuid
 import json
 from functools import wraps
 
-import replit
 import requests
-from flask import Flask, Response, redirect, render_template, request
-from replit import db
+from flask import Flask, Response, redirect, render_template, request, stream_with_context
 from utils.env_loader import load_env_variables
 
 load_env_variables()
 
+import agent_loop
 import assistant_loader
 from bot_slack import start_slack_bot
+from conversation_store import get_conversation_store
 from tools import sql_postgres
 from utils import get_logger, Config, require_auth
+from utils.deadline import request_deadline
+from utils.sandbox_kernels import conversation_scope
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -55,13 +57,19 @@ def computer():
 
   req = content['req']
   conv_id = content['conv_id']
+  render_mode = content.get('render', Config.RENDER_MODE)
+  if render_mode not in agent_loop.RENDER_MODES:
+    return f"Invalid 'render' mode, expected one of: {', '.join(agent_loop.RENDER_MODES)}", 400
   logger.debug(f"Received request: {json.dumps(content)}")
   
-  conv_hist = db.get("conversation_" + conv_id)
+  conv_hist = get_conversation_store().load(conv_id)
 
-  # Get database connection
-  conn = sql_postgres.get_connection_from_env_credentials()
+  # Lease a pooled database connection for the duration of the request
+  with request_deadline(Config.REQUEST_TIMEOUT), conversation_scope(conv_id), sql_postgres.connection() as conn:
+    return _handle_request(conn, req, conv_id, conv_hist, render_mode)
 
+
+def _handle_request(conn, req, conv_id, conv_hist, render_mode="auto"):
   if req.startswith("version"):
     global assistant
     version = req.split("version")[1].strip()
@@ -75,68 +83,122 @@ def computer():
 
   if conv_hist is None:
     conv_hist = [assistant.system_prompt(conn)]
+    persisted_count = 0
   else:
-    conv_hist = replit.database.to_primitive(conv_hist)
-    conv_hist = [replit.database.to_primitive(i) for i in conv_hist]
+    persisted_count = len(conv_hist)
   
   logger.debug(f"Conversation history: {json.dumps(conv_hist)}")
   conv_hist.append({"role": "user", "content": req})
 
-  assistant_response = assistant.call_llm(conversation_history=conv_hist)
-  logger.info("Received assistant response")
-  logger.debug(f"Assistant response details: {assistant_response}")
-
-  response = ""
-  if assistant_response.tool_calls is not None:
-    logger.info(f"Assistant is using tools: {len(assistant_response.tool_calls)} tool call(s)")
-    try:
-      # 'assistant' is now the dynamically imported module
-      tool_responses = assistant.get_tool_response(
-          conn, assistant_response.tool_calls)
-      for tool_response in tool_responses:
-        logger.debug(f"Tool response: {tool_response['content']}")
-        conv_hist.append(tool_response)
-      conv_hist.append({
-          "role":
-          "user",
-          "content":
-          """Reformat the tool responses in a very short and mobile friendly way. Think about displaying it in a chat app - use newlines as needed. Don't use a tool for this,  just do it. And don't mention that you are reformatting. Just give the response."""
-      })
-      assistant_response = assistant.call_llm(conversation_history=conv_hist)
-      logger.info("Received follow-up assistant response after tool use")
-      logger.debug(f"Follow-up response details: {assistant_response}")
-      response += assistant_response.content
-      conv_hist.append({
-          "role": "assistant",
-          "content": assistant_response.content
-      })
-
-    except Exception as e:
-      logger.error(f"An unexpected error occurred while using tool: {e}", exc_info=True)
-  else:
-    logger.info("No tool called by assistant")
-    if assistant_response.content is not None:
-      logger.debug(f"Assistant content: {assistant_response.content}")
-      response += assistant_response.content
-      conv_hist.append({
-          "role": "assistant",
-          "content": assistant_response.content
-      })
-    else:
-      # Handle cases where there's no content and no tool call (might indicate an issue)
-      logger.warning("Assistant did not provide content or request a tool")
-      conv_hist.append({
-          "role": "assistant",
-          "content": ""
-      })  # Add empty assistant message
-      response += "Assistant did not provide content or request a tool."
-
-  ###
-
-  db.set("conversation_" + conv_id, conv_hist)
+  response = None
+  try:
+    for event in agent_loop.run(assistant, conn, conv_hist, render_mode=render_mode):
+      if event.type == "tool_results":
+        for tool_response in event.tool_responses:
+          logger.debug(f"Tool response: {tool_response['content']}")
+      elif event.type == "final":
+        response = event.content or "Assistant did not provide content or request a tool."
+  except Exception as e:
+    logger.error(f"An unexpected error occurred while handling the request: {e}", exc_info=True)
+
+  if response is None:
+    # A turn without an assistant reply is not saved
+    return "An unexpected error occurred while handling the request", 500
+
+  # Only the messages added during this turn are written
+  get_conversation_store().append(conv_id, conv_hist[persisted_count:])
   return response
 
 
+@app.route('/computer/stream', methods=['POST'])
+@require_auth
+def computer_stream():
+  """Same as /computer, but relays the reply as Server-Sent Events while it is generated."""
+  content = request.get_json(silent=True)
+
+  if content is None:
+    return "Invalid JSON data", 400
+
+  if 'req' not in content or 'conv_id' not in content:
+    return "Missing 'req' or 'conv_id' in the request", 400
+
+  req = content['req']
+  conv_id = content['conv_id']
+  render_mode = content.get('render', Config.RENDER_MODE)
+  if render_mode not in agent_loop.RENDER_MODES:
+    return f"Invalid 'render' mode, expected one of: {', '.join(agent_loop.RENDER_MODES)}", 400
+  logger.debug(f"Received streaming request: {json.dumps(content)}")
+
+  conv_hist = get_conversation_store().load(conv_id)
+
+  def generate():
+    with request_deadline(Config.REQUEST_TIMEOUT), conversation_scope(conv_id), sql_postgres.connection() as conn:
+      yield from _stream_request(conn, req, conv_id, conv_hist, render_mode)
+
+  return Response(
+      stream_with_context(generate()),
+      mimetype='text/event-stream',
+      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _sse(event, data):
+  return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_request(conn, req, conv_id, conv_hist, render_mode="auto"):
+  if req.startswith("version"):
+    yield _sse("token", {"content": _handle_request(conn, req, conv_id, conv_hist)})
+    yield _sse("done", {})
+    return
+
+  if assistant is None:
+    yield _sse("error", {"message": "Failed to load assistant module"})
+    return
+
+  if conv_hist is None:
+    conv_hist = [assistant.system_prompt(conn)]
+    persisted_count = 0
+  else:
+    persisted_count = len(conv_hist)
+
+  conv_hist.append({"role": "user", "content": req})
+
+  finished = False
+  try:
+    for event in agent_loop.run(assistant, conn, conv_hist, render_mode=render_mode, stream=True):
+      if event.type == "content":
+        yield _sse("token", {"content": event.content})
+      elif event.type == "tool_calls":
+        for tool_call in event.tool_calls:
+          yield _sse("tool_call", {
+              "id": getattr(tool_call, 'id', None),
+              "name": tool_call.function.name,
+              "arguments": tool_call.function.arguments,
+          })
+      elif event.type == "tool_results":
+        for tool_response in event.tool_responses:
+          yield _sse("tool_result", {
+              "tool_call_id": tool_response.get("tool_call_id"),
+              "name": tool_response["name"],
+              "content": tool_response["content"],
+          })
+      elif event.type == "final":
+        finished = True
+        if event.reason != "answer":
+          # Answers from the model were already streamed token by token
+          yield _sse("token", {"content": event.content})
+
+    yield _sse("done", {})
+  except Exception as e:
+    logger.error(f"Error while streaming response: {e}", exc_info=True)
+    yield _sse("error", {"message": str(e)})
+  finally:
+    # The LLM clients append the assistant messages to conv_hist as they
+    # complete; a turn without an assistant reply is not saved
+    if finished:
+      get_conversation_store().append(conv_id, conv_hist[persisted_count:])
+
+
 @app.route('/new_conversation', methods=['GET'])
 @require_auth
 def new_conversation():
@@ -0,0 +1,77 @@
+"""
+System prompt layout for provider-side prompt caching.
+
+Providers cache the longest previously seen prefix of a prompt, so a system
+prompt is built from a stable part (assistant and tool instructions, code,
+schema) followed by a volatile part (the current time and other per-request
+context). OpenAI models cache such prefixes automatically; Anthropic and
+Gemini models on OpenRouter need the stable part marked with cache_control,
+which PROMPT_CACHE_CONTROL enables.
+
+Cached token counts reported by the provider are tallied here so the savings
+can be read from the logs.
+"""
+
+import threading
+
+from context_window import count_text_tokens
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+
+def system_message(stable, volatile):
+    """
+    Build a system message with the stable text first.
+
+    Args:
+        stable: Text that is identical across requests
+        volatile: Text that changes between requests
+
+    Returns:
+        A system message dict. With PROMPT_CACHE_CONTROL on OpenRouter the
+        content is a list of text blocks, the stable one marked cacheable.
+    """
+    logger.debug(f"System prompt: ~{count_text_tokens(stable)} stable tokens, "
+                 f"~{count_text_tokens(volatile)} volatile tokens")
+
+    if Config.PROMPT_CACHE_CONTROL and Config.USE_OPEN_ROUTER:
+        return {
+            "role": "system",
+            "content": [
+                {"type": "text", "text": stable, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": volatile},
+            ],
+        }
+    return {"role": "system", "content": stable + volatile}
+
+
+def record_usage(prompt_tokens, cached_tokens):
+    """
+    Tally the prompt tokens of one LLM call and how many the provider served from cache.
+
+    Returns:
+        Dict with the running totals
+    """
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["prompt_tokens"] += prompt_tokens or 0
+        _stats["cached_tokens"] += cached_tokens or 0
+        totals = dict(_stats)
+
+    if prompt_tokens:
+        share = 100 * (cached_tokens or 0) / prompt_tokens
+        total_share = 100 * totals["cached_tokens"] / max(totals["prompt_tokens"], 1)
+        logger.info(f"Prompt cache: {cached_tokens or 0} of {prompt_tokens} prompt tokens cached ({share:.0f}%), "
+                    f"{total_share:.0f}% over {totals['calls']} calls")
+    return totals
+
+
+def usage_stats():
+    """Running totals of prompt and cached tokens since startup."""
+    with _stats_lock:
+        return dict(_stats)
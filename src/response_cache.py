@@ -0,0 +1,419 @@
+"""
+Exact-match cache of LLM replies.
+
+Users often repeat the same question, which gives the model the same
+prompt. Before each LLM call the assistant modules look the request up by a
+hash of:
+
+- the model and the tool schemas,
+- the system prompt, with timestamps replaced by a placeholder so the
+  current time line does not defeat the cache (the schema and code it
+  contains still do),
+- the current turn and the LLM_CACHE_CONTEXT_TURNS turns before it, without
+  tool call ids.
+
+Older turns and the rolling summary of the context window are not part of
+the key. A request is not cached when any turn of the conversation, not only
+those in the key, contains output of a tool call that is not declared
+deterministic in the tool registry (SQL results, code reading the clock),
+since the same messages may then call for a different reply. Nor is it
+cached once older turns were folded into the summary, whose tool calls can
+no longer be checked. Entries expire after LLM_CACHE_TTL seconds and the least
+recently used ones are evicted beyond LLM_CACHE_MAX_BYTES, in memory or in a
+local SQLite file.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from LLM_stream import ContentDelta, MessageDone
+from context_window import SUMMARY_PREFIX, split_turns
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+
+
+class CacheBackend(ABC):
+    """Storage of serialized replies with TTL expiry and a size bound in bytes."""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the value stored under key, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store value (bytes) under key for ttl seconds, evicting least recently used entries as needed."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all entries."""
+
+    @abstractmethod
+    def stats(self):
+        """Dict with the number of entries and their total size in bytes."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU cache in process memory."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """LRU cache in a local SQLite file, shared by processes on the same host."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS llm_response_cache_last_used_idx
+                ON llm_response_cache (last_used)
+            """)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_response_cache SET last_used = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, size, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl, now))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT key, size FROM llm_response_cache ORDER BY last_used").fetchall()
+                evict = []
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= size
+                conn.executemany("DELETE FROM llm_response_cache WHERE key = ?", evict)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_response_cache")
+
+    def stats(self):
+        with self._connection() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend():
+    """Return the process-wide backend selected by LLM_CACHE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if Config.LLM_CACHE_BACKEND == "sqlite":
+                _backend = SQLiteCacheBackend(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_BYTES)
+            else:
+                _backend = MemoryCacheBackend(Config.LLM_CACHE_MAX_BYTES)
+        return _backend
+
+
+def _get(message, field, default=None):
+    if isinstance(message, dict):
+        return message.get(field, default)
+    return getattr(message, field, default)
+
+
+def _text(content):
+    if isinstance(content, list):
+        content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return " ".join(str(content or "").split())
+
+
+def _tool_calls(message):
+    """(name, parsed arguments) of each tool call in a message."""
+    calls = []
+    for tool_call in _get(message, "tool_calls") or []:
+        function = _get(tool_call, "function") or {}
+        arguments = _get(function, "arguments")
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                pass
+        calls.append((_get(function, "name"), arguments))
+    return calls
+
+
+def _normalize(message):
+    normalized = {"role": _get(message, "role"), "content": _text(_get(message, "content"))}
+    tool_calls = _tool_calls(message)
+    if tool_calls:
+        normalized["tool_calls"] = tool_calls
+    if _get(message, "name"):
+        normalized["name"] = _get(message, "name")
+    return normalized
+
+
+def _serialize(message):
+    """JSON bytes of a reply message, or None if it should not be cached."""
+    provider = type(message).__module__.split(".")[0]
+    if provider not in ("openai", "ollama"):
+        return None
+    if not _get(message, "content") and not _get(message, "tool_calls"):
+        return None
+    return json.dumps({"format": provider, "message": message.dict()}, default=str).encode()
+
+
+def _deserialize(value):
+    data = json.loads(value)
+    message = data["message"]
+    if data["format"] == "ollama":
+        import ollama
+        return ollama.Message.model_validate(message)
+
+    from openai.types.chat import ChatCompletionMessage
+    # Tool call ids must be unique within a conversation
+    for tool_call in message.get("tool_calls") or []:
+        tool_call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+    return ChatCompletionMessage.model_validate(message)
+
+
+class ResponseCache:
+    """
+    Looks LLM requests up before they are sent and stores their replies.
+
+    The call methods take the LLMClient to use on a miss and, like the
+    clients, append the reply to the messages they are given.
+    """
+
+    def __init__(self, registry=None, backend=None, ttl=None, context_turns=None, enabled=None):
+        """
+        Args:
+            registry: ToolRegistry deciding which tool calls are deterministic;
+                without one, requests containing any tool output are not cached
+            backend: CacheBackend (defaults to the process-wide backend)
+            ttl: Seconds an entry is valid (defaults to Config.LLM_CACHE_TTL)
+            context_turns: Turns before the current one that are part of the key
+                (defaults to Config.LLM_CACHE_CONTEXT_TURNS)
+            enabled: Defaults to Config.LLM_CACHE
+        """
+        self.registry = registry
+        self._backend = backend
+        self.ttl = Config.LLM_CACHE_TTL if ttl is None else ttl
+        self.context_turns = Config.LLM_CACHE_CONTEXT_TURNS if context_turns is None else context_turns
+        self.enabled = Config.LLM_CACHE if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "bypasses": 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_cache_backend()
+        return self._backend
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+            return dict(self._counters)
+
+    def stats(self):
+        """Hit, miss and bypass counts, hit rate, and the backend's entries and bytes."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats.update(self.backend.stats())
+        return stats
+
+    def _deterministic(self, messages):
+        for message in messages:
+            for name, arguments in _tool_calls(message):
+                if self.registry is None or not self.registry.is_deterministic(name, arguments):
+                    return False
+        return True
+
+    def key(self, model, tools, messages):
+        """
+        The cache key of a request.
+
+        Returns:
+            A hex digest, or None if the request must not be cached
+        """
+        system = []
+        rest = list(messages)
+        while rest and _get(rest[0], "role") == "system":
+            text = _text(_get(rest.pop(0), "content"))
+            if text.startswith(SUMMARY_PREFIX.strip()):
+                # The summarized turns may have used any tool
+                return None
+            system.append(_TIMESTAMP_PATTERN.sub("<time>", text))
+        rest = [message for message in rest if _get(message, "role") != "system"]
+
+        # Tool output anywhere in the conversation can shape the reply, not
+        # only in the turns that make up the key
+        if not self._deterministic(rest):
+            return None
+        recent = [message for turn in split_turns(rest)[-(self.context_turns + 1):] for message in turn]
+        if not recent:
+            return None
+
+        payload = json.dumps({
+            "model": model,
+            "tools": tools,
+            "system": system,
+            "messages": [_normalize(message) for message in recent],
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _lookup(self, client, messages, tools):
+        """Return (key, cached message or None)."""
+        if not self.enabled:
+            return None, None
+        key = self.key(client.model, tools, messages)
+        if key is None:
+            self._count("bypasses")
+            return None, None
+
+        value = self.backend.get(key)
+        if value is not None:
+            try:
+                message = _deserialize(value)
+            except Exception as e:
+                logger.warning(f"Discarding unreadable response cache entry: {e}")
+            else:
+                counters = self._count("hits")
+                logger.info(f"Response cache hit, {counters['hits']} of "
+                            f"{counters['hits'] + counters['misses']} lookups so far")
+                return key, message
+        self._count("misses")
+        return key, None
+
+    def _store(self, key, message):
+        if key is None:
+            return
+        value = _serialize(message)
+        if value is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def call_llm(self, client, messages, tools):
+        """Reply from the cache, or from client.call_llm, which is then cached."""
+        key, message = self._lookup(client, messages, tools)
+        if message is not None:
+            messages.append(message.dict())
+            return message
+        message = client.call_llm(messages, tools)
+        self._store(key, message)
+        return message
+
+    def call_llm_stream(self, client, messages, tools):
+        """
+        Like client.call_llm_stream. A cached reply is yielded as one
+        ContentDelta (if it has content) and a MessageDone.
+        """
+        key, message = self._lookup(client, messages, tools)
+        if message is not None:
+            messages.append(message.dict())
+            if message.content:
+                yield ContentDelta(message.content)
+            yield MessageDone(message)
+            return
+        for event in client.call_llm_stream(messages, tools):
+            if event.type == "message":
+                self._store(key, event.message)
+            yield event
+
+    async def acall_llm(self, client, messages, tools):
+        """Async variant of call_llm."""
+        key, message = self._lookup(client, messages, tools)
+        if message is not None:
+            messages.append(message.dict())
+            return message
+        message = await client.acall_llm(messages, tools)
+        self._store(key, message)
+        return message
@@ -0,0 +1,152 @@
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from utils import get_logger, Config
+from utils.deadline import Deadline, deadline_scope, remaining
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide tool executor, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.TOOL_DISPATCH_MAX_WORKERS,
+                thread_name_prefix="tool")
+        return _executor
+
+
+def tool_response(tool_call, tool_name, tool_result):
+    """Build the tool message answering one tool call."""
+    if hasattr(tool_call, 'id'):
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": tool_name,
+            "content": str(tool_result),
+        }
+    return {
+        "role": "tool",
+        "name": tool_name,
+        "content": str(tool_result),
+    }
+
+
+class ToolDispatcher:
+    """
+    Runs the tool calls of one LLM turn, concurrently where that is safe.
+
+    Calls to tools that declare themselves parallel safe are submitted to a
+    bounded thread pool as they are encountered and bounded by the tool's
+    timeout. Any other call is a barrier: the calls before it are finished
+    first, then it runs on the caller's thread with the request's database
+    connection, so a write still happens after the reads that preceded it
+    and before those that follow. Connection-bound tools running on the
+    pool lease their own pooled connection, since psycopg2 connections must
+    not be shared between threads.
+
+    Each concurrent call runs under its own Deadline (see utils.deadline).
+    When a call times out it is cancelled if it has not started yet, and
+    otherwise its deadline is expired, which cancels a running SQL
+    statement, so abandoned calls don't hold on to the shared pool's threads.
+
+    Responses are always returned in the order of the tool calls.
+    """
+
+    def __init__(self, registry, executor=None, default_timeout=None):
+        """
+        Args:
+            registry: ToolRegistry of the assistant module
+            executor: Executor for concurrent calls (defaults to the shared tool executor)
+            default_timeout: Seconds allowed for concurrent calls of tools without a timeout
+        """
+        self.registry = registry
+        self._executor = executor
+        self.default_timeout = default_timeout
+
+    def dispatch(self, conn, tool_calls):
+        """
+        Execute tool calls and return one tool message per call, in order.
+
+        Args:
+            conn: The request's database connection
+            tool_calls: Tool calls from the assistant message
+
+        Returns:
+            List of tool messages
+        """
+        responses = [None] * len(tool_calls)
+        pending = []
+
+        for index, tool_call in enumerate(tool_calls):
+            tool_name = tool_call.function.name
+            tool_args = self._parse_arguments(tool_call)
+
+            if tool_name in self.registry and self.registry.is_parallel_safe(tool_name, tool_args):
+                pending.append(self._submit(index, tool_name, tool_args))
+                continue
+
+            self._collect(pending, tool_calls, responses)
+            pending = []
+            responses[index] = tool_response(tool_call, tool_name, self._call(conn, tool_name, tool_args))
+
+        self._collect(pending, tool_calls, responses)
+        return responses
+
+    def _parse_arguments(self, tool_call):
+        try:
+            return json.loads(tool_call.function.arguments)
+        except Exception:
+            return tool_call.function.arguments
+
+    def _call(self, conn, tool_name, tool_args):
+        if tool_name not in self.registry:
+            return f"Error: Tool '{tool_name}' not found in current mapping."
+        tool_function = self.registry.get_function(tool_name, conn)
+        try:
+            return tool_function(**tool_args)
+        except Exception as e:
+            return f"Error executing tool {tool_name}: {e}"
+
+    def _submit(self, index, tool_name, tool_args):
+        timeout = self.registry.timeout(tool_name)
+        if timeout is None:
+            timeout = self.default_timeout if self.default_timeout is not None else Config.TOOL_DEFAULT_TIMEOUT
+        # Never wait past the request's deadline
+        timeout = min(timeout, remaining(timeout))
+        deadline = Deadline(timeout)
+        executor = self._executor or get_executor()
+        # Run with a copy of the caller's context so context variables
+        # (request deadlines and the like) are visible to the tool
+        context = contextvars.copy_context()
+        future = executor.submit(context.run, self._call_until, deadline, tool_name, tool_args)
+        return index, tool_name, future, deadline, timeout
+
+    def _call_until(self, deadline, tool_name, tool_args):
+        try:
+            with deadline_scope(deadline):
+                return self._call(None, tool_name, tool_args)
+        finally:
+            deadline.close()
+
+    def _collect(self, pending, tool_calls, responses):
+        for index, tool_name, future, deadline, timeout in pending:
+            try:
+                result = future.result(timeout=deadline.remaining())
+            except FutureTimeoutError:
+                logger.warning(f"Tool {tool_name} timed out after {timeout:g} seconds")
+                if not future.cancel():
+                    # Already running: stop its SQL statement and anything else watching the deadline
+                    deadline.expire()
+                result = f"Error: Tool {tool_name} timed out after {timeout:g} seconds"
+            except Exception as e:
+                result = f"Error executing tool {tool_name}: {e}"
+            responses[index] = tool_response(tool_calls[index], tool_name, result)
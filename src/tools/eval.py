@@ -1,10 +1,51 @@
-import sys
-import io
-from utils import get_logger, Config, sandbox_python_execution
+import re
+from utils import (get_logger, Config, sandbox_python_execution, get_sandbox_pool,
+                   get_kernel_manager, current_conversation, capture_stdout)
 
 # Initialize logger
 logger = get_logger(__name__)
 
+# Modules whose results vary between runs (clock, randomness, environment, network)
+_NONDETERMINISTIC_PATTERN = re.compile(
+    r'\b(random|secrets|uuid|time|datetime|os|sys|socket|urllib|requests|http|subprocess)\b')
+
+def _stateful():
+    """Whether code runs in the conversation's persistent Python session."""
+    return Config.SANDBOX_EXECUTION and Config.SANDBOX_STATEFUL
+
+def is_deterministic(code: str) -> bool:
+    """
+    Whether running the code twice gives the same output.
+    
+    A conservative check: code mentioning the clock, randomness, the
+    environment or the network is treated as non-deterministic, and so is
+    any code run in a persistent session, whose output depends on earlier calls.
+    
+    Args:
+        code: The Python code to execute
+        
+    Returns:
+        True if the output depends only on the code
+    """
+    return not _stateful() and not _NONDETERMINISTIC_PATTERN.search(code)
+
+def is_parallel_safe(code: str) -> bool:
+    """
+    Whether python_code_executor calls can run concurrently with other tool calls.
+    
+    Sandboxed code runs in its own process, and the legacy in-process
+    method captures only the output of its own context (see
+    utils.output_capture). Calls sharing a persistent session must run in
+    the order the model made them.
+    
+    Args:
+        code: The Python code to execute
+        
+    Returns:
+        True unless the code will run in the conversation's persistent session
+    """
+    return not (Config.ENABLE_CODE_EXECUTION and _stateful())
+
 def execute_python_code(code: str) -> str:
     """
     Executes the given Python code and returns the output or error.
@@ -30,21 +71,27 @@ def execute_python_code(code: str) -> str:
     # Use the sandbox for secure execution if enabled
     try:
         if hasattr(Config, 'SANDBOX_EXECUTION') and Config.SANDBOX_EXECUTION:
-            logger.info("Using sandbox for code execution")
-            result = sandbox_python_execution(code)
+            if Config.SANDBOX_STATEFUL and current_conversation() is not None:
+                logger.info("Using the conversation's persistent Python session for code execution")
+                result = get_kernel_manager().execute(current_conversation(), code)
+            elif Config.SANDBOX_WORKER_POOL:
+                logger.info("Using sandbox worker pool for code execution")
+                result = get_sandbox_pool().execute(code)
+            else:
+                logger.info("Using sandbox for code execution")
+                result = sandbox_python_execution(code)
         else:
             # Legacy execution method with basic safety
             logger.info("Using legacy code execution method")
-            output = io.StringIO()
-            sys.stdout = output
-            try:
-                # Execute in an empty global namespace for some isolation
-                exec(code, {})
-                result = output.getvalue()
-            except Exception as e:
-                result = f"Error: {e}"
-            finally:
-                sys.stdout = sys.__stdout__  # Reset redirect
+            # Only this context's output is captured, so concurrent runs and
+            # other threads' prints don't mix
+            with capture_stdout() as output:
+                try:
+                    # Execute in an empty global namespace for some isolation
+                    exec(code, {})
+                    result = output.getvalue()
+                except Exception as e:
+                    result = f"Error: {e}"
     except Exception as e:
         logger.error(f"Error during code execution: {e}", exc_info=True)
         result = f"Error during code execution: {str(e)}"
@@ -53,3 +100,44 @@ def execute_python_code(code: str) -> str:
     logger.debug(f"Execution result: {result}")
     
     return result.strip()
+
+def _session_unavailable():
+    """Why the current request has no persistent Python session, or None if it can have one."""
+    if not Config.ENABLE_CODE_EXECUTION:
+        return "Code execution is disabled for security reasons. Set ENABLE_CODE_EXECUTION=true to enable."
+    if not _stateful():
+        return "Persistent Python sessions are disabled. Set SANDBOX_STATEFUL=true to enable."
+    if current_conversation() is None:
+        return "Persistent Python sessions are only available within a conversation."
+    return None
+
+def inspect_python_session() -> str:
+    """
+    Lists the variables of the conversation's persistent Python session.
+    
+    Returns:
+        The session's variables with their types and values, or a message
+        saying why there is no session
+    """
+    unavailable = _session_unavailable()
+    if unavailable:
+        return unavailable
+    result = get_kernel_manager().inspect(current_conversation())
+    if result is None:
+        return "No Python session is running for this conversation; python_code_executor will start one."
+    return result
+
+def reset_python_session() -> str:
+    """
+    Stops the conversation's persistent Python session, clearing its variables.
+    
+    Returns:
+        A message saying whether a session was reset
+    """
+    unavailable = _session_unavailable()
+    if unavailable:
+        return unavailable
+    logger.info(f"Resetting Python session of conversation {current_conversation()}")
+    if get_kernel_manager().reset(current_conversation()):
+        return "The Python session was reset; all variables were cleared."
+    return "No Python session was running for this conversation."
@@ -0,0 +1,247 @@
+import os
+import threading
+
+from utils import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_UNSET = object()
+
+# System prompt segments, from the least to the most frequently changing.
+# Keeping stable text first lets providers reuse a cached prompt prefix.
+SEGMENT_ORDER = ("instructions", "code", "data")
+
+
+class PromptFragment:
+    """
+    A piece of a tool's system prompt that is expensive to render.
+
+    The rendered text is cached and only re-rendered when the value returned
+    by the version callable changes (or after an explicit invalidate()).
+    """
+
+    def __init__(self, render, version=None, segment="data"):
+        """
+        Args:
+            render: Callable taking a database connection (or None) and returning the prompt text
+            version: Optional callable taking the same connection and returning a hashable
+                version of the underlying data. Without it the fragment is rendered once
+                and kept until invalidated.
+            segment: One of SEGMENT_ORDER, how often the rendered text changes
+        """
+        if segment not in SEGMENT_ORDER:
+            raise ValueError(f"Unknown prompt segment: {segment}")
+        self._render = render
+        self._version = version
+        self.segment = segment
+        self._text = None
+        self._rendered_version = _UNSET
+        self._lock = threading.Lock()
+
+    def version(self, conn=None):
+        """Current version of the data behind this fragment."""
+        return self._version(conn) if self._version else None
+
+    def get(self, conn=None):
+        """Return the cached text, re-rendering it if the version changed."""
+        version = self.version(conn)
+        with self._lock:
+            if self._text is not None and self._rendered_version == version:
+                return self._text
+
+        logger.debug(f"Rendering prompt fragment (version: {version})")
+        text = self._render(conn)
+        with self._lock:
+            self._text = text
+            self._rendered_version = version
+        return text
+
+    def invalidate(self):
+        """Drop the cached text so the next get() re-renders it."""
+        with self._lock:
+            self._text = None
+            self._rendered_version = _UNSET
+
+
+def file_mtime(path):
+    """Return a version callable that changes whenever the file at path is modified."""
+    def version(conn=None):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+    return version
+
+
+class ToolRegistry:
+    """
+    Tools available to an assistant module, built once at import time.
+
+    Function bindings, system prompt fragments and the TOOLS schemas passed
+    to the LLM are kept separately, so dispatching a tool call never has to
+    render prompts and only invalidated prompt fragments are re-rendered.
+
+    The tool mapping has the same shape as an assistant's TOOL_MAPPING:
+    ``{name: {"function": ..., "system_prompt": ...}}``. The system prompt
+    may be a plain string or a PromptFragment. Entries with
+    ``"bind_connection": True`` hold a factory that takes the request's
+    database connection and returns the tool function.
+
+    Entries may also declare ``"parallel_safe"`` (a bool, or a predicate
+    called with the tool call's arguments) to allow the call to run
+    concurrently with other calls of the same turn, and ``"timeout"`` in
+    seconds for such concurrent runs. ``"render"`` is an optional callable
+    turning the tool's output into text for the user (see tools.renderers).
+    ``"deterministic"`` (a bool or a predicate, like ``"parallel_safe"``)
+    marks calls whose output depends only on their arguments, so LLM replies
+    that follow them may be served from the response cache.
+    """
+
+    def __init__(self, tool_mapping, tools):
+        """
+        Args:
+            tool_mapping: Dict of tool name to function binding and system prompt
+            tools: List of tool schemas for the LLM client
+        """
+        self.tools = tools
+        self._functions = {}
+        self._connection_bound = set()
+        self._prompts = {}
+        self._parallel_safe = {}
+        self._timeouts = {}
+        self._renderers = {}
+        self._deterministic = {}
+
+        for name, entry in tool_mapping.items():
+            self._functions[name] = entry["function"]
+            if entry.get("bind_connection"):
+                self._connection_bound.add(name)
+            self._prompts[name] = entry.get("system_prompt", "")
+            self._parallel_safe[name] = entry.get("parallel_safe", False)
+            self._timeouts[name] = entry.get("timeout")
+            self._deterministic[name] = entry.get("deterministic", False)
+            if entry.get("render"):
+                self._renderers[name] = entry["render"]
+
+    def __contains__(self, name):
+        return name in self._functions
+
+    def names(self):
+        """Names of all registered tools, in registration order."""
+        return list(self._functions)
+
+    def get_function(self, name, conn=None):
+        """
+        Return the callable for a tool, bound to conn if the tool needs a connection.
+
+        Returns:
+            The tool function, or None if no tool with that name is registered
+        """
+        if name not in self._functions:
+            return None
+        if name in self._connection_bound:
+            return self._functions[name](conn)
+        return self._functions[name]
+
+    def is_connection_bound(self, name):
+        """Whether the tool's function is a factory taking a database connection."""
+        return name in self._connection_bound
+
+    def is_parallel_safe(self, name, args):
+        """
+        Whether a call to the tool may run concurrently with other tool calls.
+
+        Args:
+            name: Tool name
+            args: Parsed arguments of the call
+
+        Returns:
+            True only if the tool declared itself safe for these arguments
+        """
+        return self._check("parallel_safe", self._parallel_safe.get(name, False), name, args)
+
+    def is_deterministic(self, name, args):
+        """
+        Whether the output of a call to the tool depends only on its arguments.
+
+        Args:
+            name: Tool name
+            args: Parsed arguments of the call
+
+        Returns:
+            True only if the tool declared itself deterministic for these arguments
+        """
+        return self._check("deterministic", self._deterministic.get(name, False), name, args)
+
+    def _check(self, flag, value, name, args):
+        if not callable(value):
+            return bool(value)
+        if not isinstance(args, dict):
+            return False
+        try:
+            return bool(value(**args))
+        except Exception as e:
+            logger.warning(f"{flag} check for tool {name} failed: {e}")
+            return False
+
+    def timeout(self, name):
+        """Timeout in seconds declared by the tool, or None."""
+        return self._timeouts.get(name)
+
+    def render(self, tool_responses):
+        """
+        Render tool messages for the user without asking the LLM.
+
+        Args:
+            tool_responses: Tool messages as returned by the dispatcher
+
+        Returns:
+            The rendered text, or None if any result has no renderer or
+            is not in a form its renderer understands
+        """
+        parts = []
+        for tool_response in tool_responses:
+            renderer = self._renderers.get(tool_response.get("name"))
+            if renderer is None:
+                return None
+            try:
+                rendered = renderer(tool_response["content"])
+            except Exception as e:
+                logger.warning(f"Rendering output of tool {tool_response.get('name')} failed: {e}")
+                return None
+            if rendered is None:
+                return None
+            parts.append(rendered)
+        return "\n\n".join(parts) if parts else None
+
+    def system_prompt(self, conn=None):
+        """
+        Concatenated system prompt text for all tools.
+
+        Plain string prompts come first, followed by fragments in
+        SEGMENT_ORDER, each in registration order.
+        """
+        parts = []
+        for segment in SEGMENT_ORDER:
+            for prompt in self._prompts.values():
+                if isinstance(prompt, PromptFragment):
+                    if prompt.segment == segment:
+                        parts.append(prompt.get(conn))
+                elif segment == "instructions":
+                    parts.append(prompt)
+        return "".join(parts)
+
+    def version(self, conn=None):
+        """Tuple of the current versions of all dynamic prompt fragments."""
+        return tuple(
+            (name, prompt.version(conn))
+            for name, prompt in self._prompts.items()
+            if isinstance(prompt, PromptFragment)
+        )
+
+    def invalidate(self, name=None):
+        """Invalidate the prompt fragment of one tool, or of all tools if name is None."""
+        for tool_name, prompt in self._prompts.items():
+            if isinstance(prompt, PromptFragment) and name in (None, tool_name):
+                prompt.invalidate()
@@ -0,0 +1,98 @@
+"""
+Deterministic, mobile friendly rendering of tool results.
+
+Each renderer takes the content of a tool message and returns the text to
+show the user, or None if it does not recognise the output, in which case
+the LLM is asked to reformat it instead.
+"""
+
+import re
+
+MAX_OUTPUT_CHARS = 1500
+
+SQL_NO_DATA = "SQL statement(s) executed successfully. No data returned."
+SQL_EMPTY_RESULT = "```\n-\n``` (No results or an empty set was returned)"
+SQL_ERROR_PREFIXES = ("SQL Error:", "SQL validation failed:", "Error formatting results:")
+# Appended by run_sql when the row cap cut the result short, and when
+# several statements ran
+SQL_ROW_COUNT_NOTE = re.compile(r"\n(\d+ of ≥?\d+ rows shown)\s*$")
+SQL_STATEMENT_COUNTS_NOTE = re.compile(r"\n(Rows per statement: [^\n]*)\s*$")
+
+
+def _truncate(text, limit=MAX_OUTPUT_CHARS):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + f"\n… ({len(text) - limit} more characters)"
+
+
+def _parse_orgtbl(content):
+    """Parse a fenced orgtbl table as produced by format_run_sql_result_as_md."""
+    lines = content.strip().splitlines()
+    if len(lines) < 4 or lines[0] != "```" or lines[-1] != "```":
+        return None
+
+    table = [line for line in lines[1:-1] if not line.startswith("|-")]
+    cells = [[cell.strip() for cell in line.strip()[1:-1].split("|")] for line in table]
+    if not cells or any(not line.startswith("|") for line in table):
+        return None
+    headers, rows = cells[0], cells[1:]
+    # A "|" inside a value makes the table ambiguous
+    if any(len(row) != len(headers) for row in rows):
+        return None
+    return headers, rows
+
+
+def render_sql_result(content):
+    """Render postgres_sql_run output: rows as short "column: value" blocks."""
+    content = str(content)
+    if content.startswith(SQL_ERROR_PREFIXES):
+        return content
+
+    notes = []
+    for pattern in (SQL_STATEMENT_COUNTS_NOTE, SQL_ROW_COUNT_NOTE):
+        note = pattern.search(content)
+        if note:
+            content = content[:note.start()]
+            notes.insert(0, f"({note.group(1)})")
+    suffix = "".join(f"\n\n{note}" for note in notes)
+
+    if content == SQL_NO_DATA:
+        return "Done. No data returned." + suffix
+    if content == SQL_EMPTY_RESULT:
+        return "No results." + suffix
+    table = _parse_orgtbl(content)
+    if table is None:
+        return None
+    headers, rows = table
+
+    if len(headers) == 1:
+        if len(rows) == 1:
+            rendered = f"{headers[0]}: {rows[0][0]}"
+        else:
+            rendered = f"{headers[0]}:\n" + "\n".join(f"• {row[0]}" for row in rows)
+    else:
+        blocks = ["\n".join(f"{header}: {value}" for header, value in zip(headers, row)) for row in rows]
+        rendered = _truncate("\n\n".join(blocks))
+    return rendered + suffix
+
+
+def render_python_output(content):
+    """Render python_code_executor output: stdout as is, errors by their last line."""
+    content = str(content).strip()
+    if content.startswith("Error"):
+        # Tracebacks end with the exception itself
+        last_line = content.splitlines()[-1].strip()
+        if last_line.startswith("Error:"):
+            return last_line
+        return f"Error: {last_line}"
+    if not content:
+        return "(no output)"
+    return _truncate(content)
+
+
+def render_ascii_art(content):
+    """Render ascii_art_generator output as a monospaced block."""
+    content = str(content).strip("\n")
+    if not content:
+        return None
+    return f"```\n{_truncate(content)}\n```"
@@ -1,5 +1,7 @@
 from tabulate import tabulate
 
+from tools.sql_lexer import split_statements
+
 
 def get_schema(conn):
     cursor = conn.cursor()
@@ -56,11 +58,7 @@ def run_sql(conn):
 
 
 def parse_sql(assistant_response: str):
-    all_statements = []
-    statements = assistant_response.split(';')
-    cleaned_statements = [stmt.strip() for stmt in statements if stmt.strip()]
-    all_statements.extend(cleaned_statements)
-    return all_statements
+    return [statement.text for statement in split_statements(assistant_response)]
 
 
 def format_run_sql_result_as_md(sql_results):
@@ -0,0 +1,257 @@
+"""
+Cache of natural language requests answered by one SQL query.
+
+Most postgres_sql_run traffic is a small set of recurring questions that the
+LLM turns into the same SQL every time. When a request is answered with a
+single read-only postgres_sql_run call that succeeds, its SQL is saved as a
+named query for the normalized request text and the current schema
+fingerprint, much like save_sql_query_to_file saves a query under a name.
+The next time the same request arrives the agent loop runs the saved SQL
+directly and only falls back to the LLM if it fails.
+
+To keep replays correct, only requests that open a conversation (and so do
+not depend on earlier turns) are learned and replayed, SQL containing date or time
+literals is never saved (it would answer "yesterday" with a fixed day), and
+entries expire after SQL_INTENT_TTL seconds or when the schema changes.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from tools import sql_postgres
+from tools.renderers import SQL_ERROR_PREFIXES
+from utils import get_logger, Config
+
+# Initialize logger
+logger = get_logger(__name__)
+
+TOOL_NAME = "postgres_sql_run"
+
+_DATE_LITERAL_PATTERN = re.compile(r"'\d{4}-\d{2}-\d{2}|'\d{1,2}:\d{2}")
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+
+def normalize_request(text):
+    """Lowercase the request and drop punctuation and repeated whitespace."""
+    return " ".join(_PUNCTUATION_PATTERN.sub(" ", str(text).lower()).split())
+
+
+def _get(value, field, default=None):
+    if isinstance(value, dict):
+        return value.get(field, default)
+    return getattr(value, field, default)
+
+
+def _sql_of(tool_call):
+    """The sql_statements argument of a postgres_sql_run tool call, or None."""
+    function = _get(tool_call, "function") or {}
+    if _get(function, "name") != TOOL_NAME:
+        return None
+    arguments = _get(function, "arguments")
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(arguments, dict):
+        return None
+    return arguments.get("sql_statements")
+
+
+def succeeded(tool_responses):
+    """Whether every postgres_sql_run result is data rather than an error."""
+    return all(not str(response["content"]).startswith(SQL_ERROR_PREFIXES) for response in tool_responses)
+
+
+def tool_call_message(sql):
+    """An assistant message calling postgres_sql_run with sql, in the configured provider's format."""
+    if Config.USE_OPEN_ROUTER:
+        from openai.types.chat import ChatCompletionMessage
+        return ChatCompletionMessage.model_validate({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": TOOL_NAME, "arguments": json.dumps({"sql_statements": sql})},
+            }],
+        })
+
+    import ollama
+    return ollama.Message(role="assistant", content="", tool_calls=[
+        ollama.Message.ToolCall(function=ollama.Message.ToolCall.Function(
+            name=TOOL_NAME, arguments={"sql_statements": sql}))
+    ])
+
+
+class SQLIntentCache:
+    """
+    Saved SQL per normalized request and schema fingerprint, in a local SQLite file.
+    """
+
+    def __init__(self, path=None, ttl=None, fingerprint=None):
+        """
+        Args:
+            path: SQLite file (defaults to Config.SQL_INTENT_CACHE_PATH)
+            ttl: Seconds a saved query is used for (defaults to Config.SQL_INTENT_TTL)
+            fingerprint: Function of a connection returning the schema fingerprint
+                (defaults to sql_postgres.schema_fingerprint)
+        """
+        self.path = path or Config.SQL_INTENT_CACHE_PATH
+        self.ttl = Config.SQL_INTENT_TTL if ttl is None else ttl
+        self.fingerprint = fingerprint or sql_postgres.schema_fingerprint
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "learned": 0, "failed": 0}
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads. The file is
+        # only created on first use, not when the assistant module is imported.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sql_intents (
+                    request TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL,
+                    PRIMARY KEY (request, fingerprint)
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        """Hit, miss, learned and failed replay counts, and the number of saved queries."""
+        with self._lock:
+            stats = dict(self._counters)
+        with self._connection() as conn:
+            stats["entries"] = conn.execute("SELECT COUNT(*) FROM sql_intents").fetchone()[0]
+        return stats
+
+    def lookup(self, db_conn, request):
+        """
+        Find the saved SQL for a request.
+
+        Args:
+            db_conn: PostgreSQL connection for the schema fingerprint
+            request: The user's message
+
+        Returns:
+            The SQL, or None
+        """
+        key = normalize_request(request)
+        with self._connection() as conn:
+            # Only pay for the fingerprint query if the request is known at all
+            known = conn.execute("SELECT 1 FROM sql_intents WHERE request = ? LIMIT 1", (key,)).fetchone()
+        if not key or not known:
+            self._count("misses")
+            return None
+
+        fingerprint = self.fingerprint(db_conn)
+        if fingerprint is None:
+            self._count("misses")
+            return None
+
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT sql, created_at FROM sql_intents WHERE request = ? AND fingerprint = ?",
+                (key, fingerprint)).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                # Entries for other fingerprints may belong to processes on
+                # another schema, so only those past their lifetime are dropped
+                conn.execute("DELETE FROM sql_intents WHERE request = ? AND created_at + ? <= ?",
+                             (key, self.ttl, now))
+                self._count("misses")
+                return None
+            conn.execute("UPDATE sql_intents SET hits = hits + 1, last_used = ? WHERE request = ? AND fingerprint = ?",
+                         (now, key, fingerprint))
+        self._count("hits")
+        logger.info(f"SQL intent cache hit for request: {key}")
+        return row[0]
+
+    def replay(self, db_conn, request):
+        """The saved SQL for a request as an assistant tool call message, or None."""
+        sql = self.lookup(db_conn, request)
+        return tool_call_message(sql) if sql else None
+
+    def succeeded(self, tool_responses):
+        """Whether a replayed query succeeded."""
+        return succeeded(tool_responses)
+
+    def forget(self, db_conn, request):
+        """
+        Drop the SQL saved for a request at the current schema fingerprint, e.g. after it failed.
+
+        Entries for other fingerprints are kept; they may belong to processes on another schema.
+
+        Args:
+            db_conn: PostgreSQL connection for the schema fingerprint
+            request: The user's message
+        """
+        self._count("failed")
+        fingerprint = self.fingerprint(db_conn)
+        if fingerprint is None:
+            return
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sql_intents WHERE request = ? AND fingerprint = ?",
+                         (normalize_request(request), fingerprint))
+
+    def learn(self, db_conn, request, tool_calls, tool_responses):
+        """
+        Save the SQL of a request answered by one successful read-only postgres_sql_run call.
+
+        Args:
+            db_conn: PostgreSQL connection for the schema fingerprint
+            request: The user's message, which must not depend on earlier turns
+            tool_calls: The tool calls the LLM made in reply to the request
+            tool_responses: Their results
+
+        Returns:
+            True if the SQL was saved
+        """
+        key = normalize_request(request)
+        if not key or len(tool_calls or []) != 1 or not succeeded(tool_responses):
+            return False
+        sql = _sql_of(tool_calls[0])
+        if not sql or not sql_postgres.is_read_only(sql) or _DATE_LITERAL_PATTERN.search(sql):
+            return False
+        fingerprint = self.fingerprint(db_conn)
+        if fingerprint is None:
+            return False
+
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sql_intents (request, fingerprint, sql, created_at) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, sql, time.time()))
+        self._count("learned")
+        logger.info(f"Saved SQL for request: {key}")
+        return True
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_intent_cache():
+    """Return the process-wide SQL intent cache, or None if SQL_INTENT_CACHE is disabled."""
+    global _cache
+    if not Config.SQL_INTENT_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLIntentCache()
+        return _cache
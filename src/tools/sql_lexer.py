@@ -0,0 +1,145 @@
+"""
+Single-pass SQL lexer following PostgreSQL's quoting rules.
+
+split_statements() splits a string on the semicolons that actually end a
+statement, skipping those inside string literals ('...', E'...'), quoted
+identifiers ("..."), dollar-quoted bodies ($$...$$, $tag$...$tag$) and
+comments (-- ... and nested /* ... */). Along the way it collects the
+keywords of each statement outside of quotes and comments and classifies
+the statement, so callers can decide how to run, cache or route it without
+matching regexes against the raw text (where a 'drop' inside a string
+literal would look like a DROP).
+"""
+
+import re
+from dataclasses import dataclass
+from typing import FrozenSet
+
+SELECT = "SELECT"
+DML = "DML"
+DDL = "DDL"
+OTHER = "OTHER"
+
+# Leading keywords of statements that only read (unless they contain a write keyword)
+READ_KEYWORDS = frozenset({"SELECT", "WITH", "SHOW", "EXPLAIN", "VALUES", "TABLE"})
+DML_KEYWORDS = frozenset({"INSERT", "UPDATE", "DELETE", "MERGE", "COPY", "TRUNCATE"})
+DDL_KEYWORDS = frozenset({"CREATE", "ALTER", "DROP"})
+# Keywords that make a statement write, lock rows or change the schema
+WRITE_KEYWORDS = frozenset({
+    "INSERT", "UPDATE", "DELETE", "MERGE", "INTO", "CREATE", "ALTER", "DROP",
+    "TRUNCATE", "GRANT", "REVOKE", "COPY", "LOCK",
+})
+
+_TOKEN_PATTERN = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*)
+    | (?P<escape_string>[Ee]'(?:[^'\\]|\\.|'')*(?:'|\Z))
+    | (?P<word>[^\W\d][\w$]*)
+    | (?P<number>\d[\w.]*)
+    | (?P<string>'(?:[^']|'')*(?:'|\Z))
+    | (?P<identifier>"(?:[^"]|"")*(?:"|\Z))
+    | (?P<dollar>\$(?:[^\W\d]\w*)?\$)
+    | (?P<semicolon>;)
+    | (?P<other>[^\s\w'"$;/-]+|.)
+""", re.VERBOSE | re.DOTALL)
+_COMMENT_DELIMITER_PATTERN = re.compile(r"/\*|\*/")
+
+
+@dataclass(frozen=True)
+class Statement:
+    """One SQL statement, without its terminating semicolon."""
+    text: str
+    keyword: str
+    keywords: FrozenSet[str]
+    kind: str
+
+    @property
+    def read_only(self):
+        """Whether the statement only reads: no writes, row locks or schema changes."""
+        return self.keyword in READ_KEYWORDS and not (self.keywords & WRITE_KEYWORDS)
+
+
+def classify(keyword, keywords):
+    """
+    The kind of a statement: SELECT, DML, DDL or OTHER.
+
+    Args:
+        keyword: The statement's first keyword, upper case
+        keywords: All of its keywords outside quotes and comments
+    """
+    if keyword in DDL_KEYWORDS:
+        return DDL
+    if keyword in DML_KEYWORDS:
+        return DML
+    if keyword in READ_KEYWORDS:
+        if keyword in ("SELECT", "WITH") and "INTO" in keywords and not (keywords & DML_KEYWORDS):
+            # SELECT ... INTO new_table creates a table
+            return DDL
+        if keywords & DML_KEYWORDS:
+            # WITH ... INSERT/UPDATE/DELETE, EXPLAIN ANALYZE DELETE ...
+            return DML
+        return SELECT
+    return OTHER
+
+
+def _skip_block_comment(sql, pos):
+    """Position after the block comment opened at pos; block comments nest."""
+    depth = 0
+    for match in _COMMENT_DELIMITER_PATTERN.finditer(sql, pos):
+        depth += 1 if match.group() == "/*" else -1
+        if depth == 0:
+            return match.end()
+    return len(sql)
+
+
+def _statement(sql, start, end, keywords):
+    words = frozenset(keyword for keyword in keywords if keyword)
+    return Statement(sql[start:end].strip(), keywords[0], words, classify(keywords[0], words))
+
+
+def split_statements(sql):
+    """
+    Split SQL into statements in one pass.
+
+    Statements made only of whitespace and comments are dropped. Unterminated
+    quotes and comments run to the end of the input, as in PostgreSQL.
+
+    Args:
+        sql: String containing one or more SQL statements
+
+    Returns:
+        List of Statement
+    """
+    statements = []
+    keywords = []
+    start = pos = 0
+    length = len(sql)
+    match_token = _TOKEN_PATTERN.match
+
+    while pos < length:
+        match = match_token(sql, pos)
+        kind = match.lastgroup
+        pos = match.end()
+        if kind == "word":
+            keywords.append(match.group().upper())
+        elif kind == "semicolon":
+            if keywords:
+                statements.append(_statement(sql, start, match.start(), keywords))
+            keywords = []
+            start = pos
+        elif kind == "block_comment":
+            pos = _skip_block_comment(sql, match.start())
+        elif kind == "dollar":
+            close = sql.find(match.group(), pos)
+            pos = length if close < 0 else close + len(match.group())
+            if not keywords:
+                keywords.append("")
+        elif not keywords and kind not in ("space", "line_comment") and match.group().strip("("):
+            # A statement starting with something other than a keyword
+            # (leading parentheses aside) has no leading keyword
+            keywords.append("")
+
+    if keywords:
+        statements.append(_statement(sql, start, length, keywords))
+    return statements
@@ -1,7 +1,17 @@
+import contextlib
+import json
+import threading
+import time
+import uuid
+
 import psycopg2
+import psycopg2.extensions
 from tabulate import tabulate
 
+from tools import sql_lexer
+from tools.renderers import SQL_NO_DATA
 from utils import get_logger, Config, validate_sql
+from utils.deadline import current_deadline
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -52,73 +62,395 @@ def get_connection_from_env_credentials():
     )
 
 
-def get_schema(conn):
+class PoolError(Exception):
+    """Raised when a connection cannot be leased from the pool."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Connections are opened lazily up to max_size and kept open between
+    requests. Idle connections are health checked before being handed out
+    again, and connections returned in a failed or unknown state are rolled
+    back or discarded so the next borrower always gets a clean session.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=30.0):
+        """
+        Args:
+            connect: Callable returning a new psycopg2 connection
+            min_size: Number of connections opened up front
+            max_size: Maximum number of open connections (leased + idle)
+            timeout: Seconds to wait for a free connection before giving up
+            health_check_interval: Idle seconds after which a connection is
+                checked with a round trip before being reused
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool sizes: min_size={min_size}, max_size={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = []  # (connection, returned_at) pairs, most recently used last
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(min_size):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning(f"Could not pre-open pooled connection: {e}")
+                break
+            self._size += 1
+            self._idle.append((conn, time.monotonic()))
+
+    def getconn(self, timeout=None):
+        """
+        Lease a connection from the pool, waiting up to timeout seconds.
+
+        Raises:
+            PoolError: If the pool is closed or no connection became available in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Connection pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn, returned_at = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f"Timed out after {timeout}s waiting for a PostgreSQL connection "
+                            f"(max_size={self.max_size})")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                logger.debug("Opened new pooled PostgreSQL connection")
+                return conn
+
+            if self._is_healthy(conn, returned_at):
+                return conn
+
+            logger.info("Discarding unhealthy pooled PostgreSQL connection")
+            self._discard(conn)
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a leased connection to the pool.
+
+        Open transactions are rolled back. Connections that are closed, in an
+        unknown state, or explicitly discarded are closed instead of reused.
+        """
+        if not discard and not self._closed and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS,
+                              psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+                    conn.rollback()
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    discard = True
+            except Exception as e:
+                logger.warning(f"Failed to reset pooled connection, discarding it: {e}")
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager leasing a connection for the duration of the block.
+
+        The connection is always returned to the pool. If the block raises,
+        any open transaction is rolled back, and connection-level errors
+        cause the connection to be discarded rather than reused.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close all idle connections and refuse further leases."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Error closing discarded connection: {e}")
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            logger.info(
+                f"Creating PostgreSQL connection pool "
+                f"(min={Config.POSTGRES_POOL_MIN_SIZE}, max={Config.POSTGRES_POOL_MAX_SIZE})")
+            _pool = ConnectionPool(
+                get_connection_from_env_credentials,
+                min_size=Config.POSTGRES_POOL_MIN_SIZE,
+                max_size=Config.POSTGRES_POOL_MAX_SIZE,
+                timeout=Config.POSTGRES_POOL_TIMEOUT,
+                health_check_interval=Config.POSTGRES_POOL_HEALTH_CHECK_INTERVAL,
+            )
+        return _pool
+
+
+def connection(timeout=None):
+    """
+    Lease a pooled connection: ``with sql_postgres.connection() as conn: ...``
+    """
+    return get_pool().connection(timeout)
+
+
+# Statements that can be run through a server-side cursor (DECLARE ... CURSOR FOR)
+_CURSOR_KEYWORDS = frozenset({"SELECT", "WITH", "VALUES", "TABLE"})
+
+# Statements EXPLAIN accepts, checked by the cost guard
+_EXPLAIN_KEYWORDS = frozenset({"SELECT", "WITH", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE"})
+# Plan nodes listed in the cost guard's plan summary
+_PLAN_SUMMARY_NODES = 8
+
+# Rows fetched per round trip while counting rows past the cap
+_COUNT_BATCH_SIZE = 500
+
+_ABORTED_ERROR = "SQL Error: The transaction was aborted by an earlier error and has been rolled back."
+
+# Cheap query whose result changes whenever a table, column, index or
+# constraint in the public schema is created, altered or dropped (every such
+# change writes a new catalog row version, i.e. a new xmin).
+SCHEMA_FINGERPRINT_QUERY = """
+    SELECT md5(concat_ws('|',
+        (SELECT string_agg(c.oid::text || ':' || c.xmin::text, ',' ORDER BY c.oid)
+         FROM pg_catalog.pg_class c
+         WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p', 'i')),
+        (SELECT string_agg(a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text, ','
+                           ORDER BY a.attrelid, a.attnum)
+         FROM pg_catalog.pg_attribute a
+         JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+         WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p') AND a.attnum > 0),
+        (SELECT string_agg(con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid)
+         FROM pg_catalog.pg_constraint con
+         WHERE con.connamespace = 'public'::regnamespace)
+    ));
+"""
+
+# Single catalog query returning the full definition of every table in the
+# public schema: columns, defaults, primary/unique/foreign key and check
+# constraints, plus any indexes not already implied by a constraint.
+SCHEMA_QUERY = """
+    SELECT
+        'CREATE TABLE ' || quote_ident(c.relname) || ' (' ||
+        concat_ws(', ', cols.definition, cons.definition) || ');' ||
+        COALESCE(E'\\n' || idx.definition, '') AS create_statement
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN LATERAL (
+        SELECT string_agg(
+            quote_ident(a.attname) || ' ' || pg_catalog.format_type(a.atttypid, a.atttypmod) ||
+            CASE WHEN a.attnotnull THEN ' NOT NULL' ELSE '' END ||
+            COALESCE(' DEFAULT ' || pg_catalog.pg_get_expr(d.adbin, d.adrelid), ''),
+            ', ' ORDER BY a.attnum
+        ) AS definition
+        FROM pg_catalog.pg_attribute a
+        LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    ) cols ON true
+    LEFT JOIN LATERAL (
+        SELECT string_agg(
+            'CONSTRAINT ' || quote_ident(con.conname) || ' ' || pg_catalog.pg_get_constraintdef(con.oid, true),
+            ', ' ORDER BY CASE con.contype WHEN 'p' THEN 0 WHEN 'u' THEN 1 WHEN 'f' THEN 2 ELSE 3 END, con.conname
+        ) AS definition
+        FROM pg_catalog.pg_constraint con
+        WHERE con.conrelid = c.oid AND con.contype IN ('p', 'u', 'f', 'c')
+    ) cons ON true
+    LEFT JOIN LATERAL (
+        SELECT string_agg(pg_catalog.pg_get_indexdef(i.indexrelid) || ';', E'\\n' ORDER BY i.indexrelid) AS definition
+        FROM pg_catalog.pg_index i
+        WHERE i.indrelid = c.oid
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_catalog.pg_constraint ic
+              WHERE ic.conrelid = c.oid AND ic.conindid = i.indexrelid)
+    ) idx ON true
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname;
+"""
+
+# Rendered schema, keyed by the fingerprint it was rendered at. run_sql bumps
+# the generation after DDL so the cache (and anything keyed on schema_version,
+# such as the postgres_sql_run tool prompt) refreshes even if the catalog
+# change is not visible in the fingerprint.
+_schema_cache = {"fingerprint": None, "schema": None}
+_schema_generation = 0
+_schema_lock = threading.Lock()
+
+
+def invalidate_schema_cache():
+    """Drop the cached schema. Called by run_sql after CREATE/ALTER/DROP statements."""
+    global _schema_generation
+    with _schema_lock:
+        _schema_generation += 1
+        _schema_cache["fingerprint"] = None
+        _schema_cache["schema"] = None
+    logger.debug("Schema cache invalidated")
+
+
+def schema_fingerprint(conn=None):
+    """
+    Get a cheap fingerprint of the public schema's catalog state.
+
+    It only depends on the database, so other processes compute the same
+    fingerprint for the same schema.
+    
+    Args:
+        conn: PostgreSQL database connection. If None, one is leased from the pool.
+        
+    Returns:
+        String that changes whenever the schema changes, or None if it could not be computed
+    """
+    if conn is None:
+        with connection() as leased_conn:
+            return schema_fingerprint(leased_conn)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCHEMA_FINGERPRINT_QUERY)
+        row = cursor.fetchone()
+        return row[0] if row else ''
+    except Exception as e:
+        logger.warning(f"Could not compute schema fingerprint: {e}")
+        conn.rollback()
+        return None
+    finally:
+        cursor.close()
+
+
+def schema_version(conn=None):
+    """
+    Get the schema fingerprint combined with this process's schema cache generation.
+
+    Unlike the fingerprint it also changes after run_sql executes DDL, so it
+    suits in-process caches of anything derived from the schema; it must not
+    be shared with other processes.
+
+    Args:
+        conn: PostgreSQL database connection. If None, one is leased from the pool.
+
+    Returns:
+        String that changes whenever the schema changes, or None if it could not be computed
+    """
+    generation = _schema_generation
+    fingerprint = schema_fingerprint(conn)
+    return None if fingerprint is None else f"{generation}:{fingerprint}"
+
+
+def get_schema(conn=None):
     """
     Get PostgreSQL database schema as CREATE TABLE statements.
+
+    The rendered schema is cached and only re-read from the catalog when the
+    schema fingerprint changes.
     
     Args:
-        conn: PostgreSQL database connection
+        conn: PostgreSQL database connection. If None, one is leased from the pool.
         
     Returns:
         String containing CREATE TABLE statements for all tables
     """
+    if conn is None:
+        with connection() as leased_conn:
+            return get_schema(leased_conn)
+
+    fingerprint = schema_version(conn)
+    with _schema_lock:
+        if fingerprint is not None and _schema_cache["fingerprint"] == fingerprint:
+            logger.debug("Using cached database schema")
+            return _schema_cache["schema"]
+
     logger.info("Retrieving database schema")
     cursor = conn.cursor()
 
     try:
-        # Get all user tables
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
-            ORDER BY table_name;
-        """)
-        tables = cursor.fetchall()
-        
-        logger.info(f"Found {len(tables)} tables in database")
-        schema_statements = []
-
-        for table_name_tuple in tables:
-            table_name = table_name_tuple[0]
-            logger.debug(f"Getting schema for table: {table_name}")
-
-            # Get CREATE TABLE statement equivalent for PostgreSQL
-            cursor.execute(
-                """
-                SELECT
-                    'CREATE TABLE ' || table_name || ' (' ||
-                    string_agg(
-                        column_name || ' ' ||
-                        CASE
-                            WHEN data_type = 'character varying' THEN 'VARCHAR(' || character_maximum_length || ')'
-                            WHEN data_type = 'character' THEN 'CHAR(' || character_maximum_length || ')'
-                            WHEN data_type = 'numeric' THEN 'NUMERIC(' || numeric_precision || ',' || numeric_scale || ')'
-                            WHEN data_type = 'integer' THEN 'INTEGER'
-                            WHEN data_type = 'bigint' THEN 'BIGINT'
-                            WHEN data_type = 'smallint' THEN 'SMALLINT'
-                            WHEN data_type = 'boolean' THEN 'BOOLEAN'
-                            WHEN data_type = 'text' THEN 'TEXT'
-                            WHEN data_type = 'timestamp without time zone' THEN 'TIMESTAMP'
-                            WHEN data_type = 'timestamp with time zone' THEN 'TIMESTAMPTZ'
-                            WHEN data_type = 'date' THEN 'DATE'
-                            WHEN data_type = 'time without time zone' THEN 'TIME'
-                            WHEN data_type = 'uuid' THEN 'UUID'
-                            ELSE UPPER(data_type)
-                        END ||
-                        CASE WHEN is_nullable = 'NO' THEN ' NOT NULL' ELSE '' END,
-                        ', '
-                        ORDER BY ordinal_position
-                    ) || ');' as create_statement
-                FROM information_schema.columns
-                WHERE table_name = %s AND table_schema = 'public'
-                GROUP BY table_name;
-            """, (table_name, ))
-
-            create_statement_tuple = cursor.fetchone()
-            if create_statement_tuple:
-                schema_statements.append(create_statement_tuple[0])
-
-        return "\n".join(schema_statements)
+        cursor.execute(SCHEMA_QUERY)
+        rows = cursor.fetchall()
+        logger.info(f"Found {len(rows)} tables in database")
+        schema = "\n".join(row[0] for row in rows)
+
+        if fingerprint is not None:
+            with _schema_lock:
+                _schema_cache["fingerprint"] = fingerprint
+                _schema_cache["schema"] = schema
+        return schema
     except Exception as e:
         logger.error(f"Error retrieving database schema: {e}", exc_info=True)
         return f"Error retrieving database schema: {e}"
@@ -126,12 +458,27 @@ def get_schema(conn):
         cursor.close()
 
 
-def run_sql(conn):
+def run_sql(conn=None):
     """
     Returns a function that executes SQL statements against the provided connection.
     
+    At most SQL_MAX_ROWS rows are returned, whatever LIMIT the statement has;
+    larger results end with an "N of M rows shown" line.
+
+    Each statement runs with a statement_timeout of at most
+    SQL_STATEMENT_TIMEOUT seconds and the time left before the request's
+    deadline (see utils.deadline), and is cancelled with conn.cancel() if the
+    deadline passes while it runs.
+
+    All statements are validated before any of them runs. With
+    SQL_SINGLE_TRANSACTION they then run in one transaction, committed once
+    and rolled back as a whole if any statement fails; otherwise each
+    statement is committed on its own. The result is the last result set,
+    followed by the row count of every statement when there are several.
+    
     Args:
-        conn: PostgreSQL database connection
+        conn: PostgreSQL database connection. If None, each call leases a
+            connection from the pool and returns it when done.
         
     Returns:
         Function that executes SQL statements
@@ -146,70 +493,369 @@ def run_sql(conn):
         Returns:
             Formatted results or error message
         """
+        if conn is None:
+            with connection() as leased_conn:
+                return run_sql(leased_conn)(sql_statements)
+
         logger.info("Executing SQL statements")
         logger.debug(f"SQL statements: {sql_statements}")
         
         column_names = []
         rows = []
-        parsed_sql_list = parse_sql(str(sql_statements))
+        total, exact = 0, True
+        statements = sql_lexer.split_statements(str(sql_statements))
 
-        for sql_statement in parsed_sql_list:
-            if not sql_statement.strip():
-                continue
-
-            # Validate SQL for security
-            is_valid, reason = validate_sql(sql_statement)
+        # Validate SQL for security, all statements before running any
+        for statement in statements:
+            is_valid, reason = validate_sql(statement.text)
             if not is_valid:
                 logger.warning(f"SQL validation failed: {reason}")
                 return f"SQL validation failed: {reason}"
 
-            cursor = conn.cursor()
-            logger.info(f"Running SQL: {sql_statement}")
+        single_transaction = Config.SQL_SINGLE_TRANSACTION
+        counts = []
+        ddl = False
+        timeout = None
+        cursor = None
 
-            try:
-                cursor.execute(sql_statement)
+        try:
+            for index, statement in enumerate(statements):
+                sql_statement = statement.text
+                # One statement_timeout per transaction
+                if index == 0 or not single_transaction:
+                    timeout = statement_timeout()
+                    if timeout is not None and timeout <= 0:
+                        logger.warning("Request deadline passed before the SQL statement could run")
+                        conn.rollback()
+                        return "SQL Error: The request's time limit was used up before the query could run."
+                    if timeout is not None:
+                        set_statement_timeout(conn, timeout)
+
+                # Reads go through a named (server-side) cursor, so rows past
+                # the cap are never sent to us and the query stops when the
+                # cursor is closed
+                server_side = statement.keyword in _CURSOR_KEYWORDS and statement.read_only
+                logger.info(f"Running SQL: {sql_statement}")
+
+                statement_to_run = sql_statement
+                if statement.keyword in _EXPLAIN_KEYWORDS and (Config.SQL_MAX_COST > 0 or Config.SQL_MAX_PLAN_ROWS > 0):
+                    with _cancel_on_deadline(conn):
+                        statement_to_run, rejection = cost_guard(conn, sql_statement, server_side)
+                    if rejection:
+                        conn.rollback()
+                        return rejection
+                limited = statement_to_run != sql_statement
 
-                if cursor.description:
+                cursor = conn.cursor(name=f"run_sql_{uuid.uuid4().hex}") if server_side else conn.cursor()
+                with _cancel_on_deadline(conn):
+                    cursor.execute(statement_to_run)
+
+                # A named cursor's description is only known after the first fetch
+                if server_side or cursor.description:
+                    with _cancel_on_deadline(conn):
+                        rows, total, exact = fetch_capped(cursor, Config.SQL_MAX_ROWS, Config.SQL_ROW_COUNT_LIMIT)
+                    # The cost guard's LIMIT hides how many rows there really are
+                    exact = exact and not (limited and total > len(rows))
                     column_names = [
-                        description[0] for description in cursor.description
+                        description[0] for description in cursor.description or []
                     ]
-                    rows = cursor.fetchall()
-                    logger.info(f"Query returned {len(rows)} rows")
+                    counts.append((statement.keyword, total, exact))
+                    logger.info(f"Query returned {len(rows)} of {'' if exact else '≥'}{total} rows")
                 else:
-                    column_names = []
-                    rows = []
+                    counts.append((statement.keyword, cursor.rowcount, True))
                     logger.info("Query executed successfully (no rows returned)")
 
+                cursor.close()
+                cursor = None
+
+                ddl = ddl or statement.kind == sql_lexer.DDL
+                if not single_transaction:
+                    if _aborted(conn):
+                        conn.rollback()
+                        return _ABORTED_ERROR
+                    conn.commit()
+                    logger.debug("Transaction committed")
+                    if ddl:
+                        invalidate_schema_cache()
+                        ddl = False
+
+            if single_transaction:
+                # commit() on an aborted transaction silently rolls it back
+                if _aborted(conn):
+                    conn.rollback()
+                    return _ABORTED_ERROR + (" None of the statements took effect." if len(statements) > 1 else "")
                 conn.commit()
-                logger.debug("Transaction committed")
+                logger.debug(f"Transaction of {len(statements)} statement(s) committed")
+                if ddl:
+                    invalidate_schema_cache()
 
-            except Exception as e:
-                conn.rollback()
-                error_msg = f"SQL Error: {e}"
-                logger.error(error_msg, exc_info=True)
-                return error_msg
-            finally:
+        except psycopg2.extensions.QueryCanceledError as e:
+            conn.rollback()
+            logger.warning(f"SQL statement cancelled after {timeout}s: {e}")
+            return (f"SQL Error: The query was cancelled because it ran out of time"
+                    f"{f' ({timeout:g}s)' if timeout else ''}. "
+                    f"Try a cheaper query, e.g. with a narrower filter or a LIMIT."
+                    f"{_rollback_note(statements, counts, single_transaction)}")
+        except Exception as e:
+            conn.rollback()
+            error_msg = f"SQL Error: {e}{_rollback_note(statements, counts, single_transaction)}"
+            logger.error(error_msg, exc_info=True)
+            return error_msg
+        finally:
+            if cursor is not None:
                 cursor.close()
 
         # Format and return results
         if column_names and rows:
             result = format_run_sql_result_as_md(
                 [dict(zip(column_names, row)) for row in rows])
-            logger.debug(f"Formatted result: {result}")
-            return result
         elif rows:
             result = format_run_sql_result_as_md(rows)
-            logger.debug(f"Formatted result: {result}")
-            return result
         else:
-            return "SQL statement(s) executed successfully. No data returned."
+            result = SQL_NO_DATA
+
+        if total > len(rows):
+            result += row_count_note(len(rows), total, exact)
+        if len(counts) > 1:
+            result += ("" if result.endswith("\n") else "\n") + statement_counts_note(counts)
+        logger.debug(f"Formatted result: {result}")
+        return result
 
     return inner
 
 
+def statement_timeout():
+    """
+    Seconds the next SQL statement may run: the smaller of SQL_STATEMENT_TIMEOUT and
+    the time left before the request's deadline, or None if neither is set.
+    """
+    limits = []
+    if Config.SQL_STATEMENT_TIMEOUT > 0:
+        limits.append(Config.SQL_STATEMENT_TIMEOUT)
+    deadline = current_deadline()
+    if deadline is not None:
+        limits.append(deadline.remaining())
+    return min(limits) if limits else None
+
+
+def set_statement_timeout(conn, seconds):
+    """
+    Limit statements of the connection's current transaction to seconds.
+
+    SET LOCAL ends with the transaction, so the limit never leaks into later
+    borrowers of a pooled connection.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET LOCAL statement_timeout = %s", (max(1, int(seconds * 1000)),))
+    finally:
+        cursor.close()
+
+
+def _execute(conn, command):
+    """Run a command that returns no rows on its own cursor."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(command)
+    finally:
+        cursor.close()
+
+
+def _cancel_on_deadline(conn):
+    """Cancel the connection's running statement if the request's deadline passes."""
+    deadline = current_deadline()
+    if deadline is None:
+        return contextlib.nullcontext()
+    return deadline.on_expire(conn.cancel)
+
+
+def explain(conn, sql_statement):
+    """
+    Get the planner's estimate for a statement, without running it.
+
+    Args:
+        conn: PostgreSQL database connection
+        sql_statement: A single statement EXPLAIN accepts
+
+    Returns:
+        The root node of the EXPLAIN (FORMAT JSON) plan
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql_statement)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def plan_summary(plan, max_nodes=_PLAN_SUMMARY_NODES):
+    """
+    Describe the most expensive part of a plan, one node per line, e.g.
+    "Nested Loop (cost=250000125, rows=10000000000)".
+    """
+    lines = []
+
+    def walk(node, depth):
+        if len(lines) >= max_nodes:
+            return
+        relation = f" on {node['Relation Name']}" if node.get("Relation Name") else ""
+        lines.append(f"{'  ' * depth}{node.get('Node Type', '?')}{relation} "
+                     f"(cost={node.get('Total Cost', 0):.0f}, rows={node.get('Plan Rows', 0)})")
+        for child in node.get("Plans") or []:
+            walk(child, depth + 1)
+
+    walk(plan, 0)
+    return "\n".join(lines)
+
+
+def cost_guard(conn, sql_statement, limitable):
+    """
+    Check a statement's estimated cost and rows against SQL_MAX_COST and SQL_MAX_PLAN_ROWS.
+
+    Reads over budget are wrapped in a LIMIT of one row past SQL_MAX_ROWS,
+    which is all run_sql returns anyway, as long as that brings the cost
+    within budget. Anything else over budget is rejected with a summary of
+    the plan, so the model can write a cheaper query.
+
+    Args:
+        conn: PostgreSQL database connection
+        sql_statement: A single statement EXPLAIN accepts
+        limitable: Whether the statement is a read that can be wrapped in a LIMIT
+
+    Returns:
+        Tuple of (statement to run, rejection message or None)
+    """
+    max_cost, max_rows = Config.SQL_MAX_COST, Config.SQL_MAX_PLAN_ROWS
+    plan = explain(conn, sql_statement)
+    over_cost = max_cost > 0 and plan["Total Cost"] > max_cost
+    over_rows = max_rows > 0 and plan["Plan Rows"] > max_rows
+    if not over_cost and not over_rows:
+        return sql_statement, None
+
+    if limitable:
+        # On its own line, a trailing -- comment of the statement can't swallow the ")"
+        limited = f"SELECT * FROM (\n{sql_statement}\n) AS limited LIMIT {Config.SQL_MAX_ROWS + 1}"
+        if not over_cost or explain(conn, limited)["Total Cost"] <= max_cost:
+            logger.info(f"Cost guard limited query estimated at cost {plan['Total Cost']:.0f}, "
+                        f"{plan['Plan Rows']} rows")
+            return limited, None
+
+    if over_cost:
+        reason = f"estimated cost {plan['Total Cost']:.0f} exceeds the limit of {max_cost:g}"
+    else:
+        reason = f"estimated {plan['Plan Rows']} rows exceed the limit of {max_rows}"
+    logger.warning(f"Cost guard rejected query: {reason}")
+    return sql_statement, (
+        f"SQL validation failed: Query rejected, {reason}. Query plan:\n{plan_summary(plan)}\n"
+        f"Rewrite it to be cheaper, e.g. add join conditions, filter on indexed columns or aggregate.")
+
+
+def statement_counts_note(counts):
+    """
+    The line appended to the result of several statements, e.g.
+    "Rows per statement: CREATE, INSERT 3, SELECT 3".
+
+    Args:
+        counts: (leading keyword, row count or -1 if unknown, whether the count is exact) per statement
+    """
+    parts = []
+    for verb, count, exact in counts:
+        parts.append(f"{verb} {'' if exact else '≥'}{count}" if count >= 0 else verb)
+    return f"Rows per statement: {', '.join(parts)}\n"
+
+
+def _rollback_note(statements, counts, single_transaction):
+    """Which of several statements failed, and what became of the ones before it."""
+    if len(statements) < 2:
+        return ""
+    failed = len(counts) + 1
+    if single_transaction:
+        return f" (statement {failed} of {len(statements)}; the transaction was rolled back, none of the statements took effect)"
+    if failed > 1:
+        return f" (statement {failed} of {len(statements)}; the {failed - 1} statement(s) before it were committed)"
+    return f" (statement 1 of {len(statements)})"
+
+
+def _aborted(conn):
+    """Whether an error aborted the connection's transaction, which can then only be rolled back."""
+    return conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR
+
+
+def fetch_capped(cursor, max_rows, count_limit):
+    """
+    Fetch at most max_rows rows, then count (without keeping) further rows up to count_limit.
+
+    If the query is cancelled while the rows past the cap are being counted,
+    the rows already fetched are returned with the count seen so far. The
+    count of a server-side cursor runs inside a savepoint, which is rolled
+    back on cancel, so the transaction (and the statements before this one)
+    can still be committed.
+
+    Args:
+        cursor: Cursor of an executed query
+        max_rows: Number of rows to return
+        count_limit: Stop counting once this many rows have been seen
+
+    Returns:
+        Tuple of (rows, total rows seen, whether total is the exact row count)
+    """
+    rows = cursor.fetchmany(max_rows)
+    total = len(rows)
+    if total < max_rows:
+        return rows, total, True
+
+    count_limit = max(count_limit, max_rows)
+    # Rows of a client-side cursor have all arrived already, only FETCH can be cancelled
+    savepoint = cursor.name is not None
+    if savepoint:
+        _execute(cursor.connection, "SAVEPOINT run_sql_count")
+    while total <= count_limit:
+        try:
+            batch = cursor.fetchmany(min(_COUNT_BATCH_SIZE, count_limit + 1 - total))
+        except psycopg2.extensions.QueryCanceledError as e:
+            logger.warning(f"Row count stopped at {total} rows: {e}")
+            if savepoint:
+                _execute(cursor.connection, "ROLLBACK TO SAVEPOINT run_sql_count")
+            break
+        if not batch:
+            return rows, total, True
+        total += len(batch)
+    return rows, total, False
+
+
+def row_count_note(shown, total, exact):
+    """The line appended to a truncated result, e.g. "100 of ≥1001 rows shown"."""
+    return f"{shown} of {'' if exact else '≥'}{total} rows shown\n"
+
+
+def is_read_only(sql_statements: str):
+    """
+    Conservatively decide whether SQL statements only read data.
+
+    Used to decide whether a postgres_sql_run call can run concurrently with
+    other tool calls on its own pooled connection. Anything that might write,
+    lock rows or change the schema (including SELECT ... INTO and
+    SELECT ... FOR UPDATE) is treated as a write.
+
+    Args:
+        sql_statements: String containing one or more SQL statements
+
+    Returns:
+        True if every statement is a plain read
+    """
+    statements = sql_lexer.split_statements(str(sql_statements))
+    return bool(statements) and all(statement.read_only for statement in statements)
+
+
 def parse_sql(assistant_response: str):
     """
     Parse SQL statements from a string.
+
+    Semicolons inside string literals, quoted identifiers, dollar-quoted
+    bodies and comments do not end a statement (see tools.sql_lexer).
     
     Args:
         assistant_response: String containing one or more SQL statements
@@ -218,10 +864,7 @@ def parse_sql(assistant_response: str):
         List of SQL statements
     """
     logger.debug(f"Parsing SQL statements from: {assistant_response}")
-    all_statements = []
-    statements = assistant_response.split(';')
-    cleaned_statements = [stmt.strip() for stmt in statements if stmt.strip()]
-    all_statements.extend(cleaned_statements)
+    all_statements = [statement.text for statement in sql_lexer.split_statements(assistant_response)]
     logger.debug(f"Parsed {len(all_statements)} SQL statements")
     return all_statements
 
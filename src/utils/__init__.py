@@ -7,15 +7,31 @@ from .config import Config
 from .security import (
     sanitize_input,
     validate_sql,
+    sql_violations,
+    check_python_code,
+    python_code_violations,
     sandbox_python_execution,
     require_auth
 )
+from .sandbox_pool import SandboxWorkerPool, get_sandbox_pool
+from .output_capture import capture_stdout
+from .sandbox_kernels import KernelManager, get_kernel_manager, conversation_scope, current_conversation
 
 __all__ = [
     'get_logger',
     'Config',
     'sanitize_input',
     'validate_sql',
+    'sql_violations',
+    'check_python_code',
+    'python_code_violations',
     'sandbox_python_execution',
+    'SandboxWorkerPool',
+    'get_sandbox_pool',
+    'KernelManager',
+    'get_kernel_manager',
+    'conversation_scope',
+    'current_conversation',
+    'capture_stdout',
     'require_auth'
 ]
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+AST-based static analysis of Python code for the sandbox.
+
+The regex blocklist in utils.security matches text, so it rejects
+re.compile(...), profile(...) or a comment mentioning eval( just the same as
+the builtins it is meant to catch, and a rejected snippet costs a full LLM
+retry. analyze_python_code() parses the code instead and looks at what the
+names actually are: imported modules (including "import math, os" and
+"import os.path"), references to dangerous builtins (also when they are not
+called directly, e.g. f = eval, or are reached through another module, e.g.
+io.open or from codecs import open), dunder attributes, and dunder names inside
+string literals (as used with operator.attrgetter). Findings are reported
+with the same messages and in the same order as the regex checks.
+
+Verdicts are memoized by a hash of the exact code, so the model resending
+the same snippet skips the analysis entirely. The code is not normalized
+first: str.splitlines() splits on characters such as \x0c that Python does
+not treat as line breaks, so two snippets that normalize the same can mean
+different things. Code that does not parse falls back to the regex checks.
+"""
+
+import ast
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from .logging_utils import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Must match the order of utils.security's forbidden imports and patterns
+FORBIDDEN_MODULES = (
+    'os', 'subprocess', 'sys', 'shutil', 'importlib',
+    'pickle', 'marshal', 'builtins', 'ctypes', 'socket'
+)
+# Builtins that must not be referenced at all, by the legacy pattern they map to
+FORBIDDEN_BUILTINS = {
+    "__import__": r'__import__\(',
+    "eval": r'eval\(',
+    "exec": r'exec\(',
+    "compile": r'compile\(',
+    "open": r'open\(',
+    "file": r'file\(',
+    "globals": r'globals\(',
+    "locals": r'locals\(',
+    "getattr": r'getattr\(',
+    "setattr": r'setattr\(',
+    "delattr": r'delattr\(',
+}
+# Attributes (and names) used to walk from an object to its class hierarchy or globals
+FORBIDDEN_ATTRIBUTES = {
+    "__class__": r'\b__class__\b',
+    "__bases__": r'\b__bases__\b',
+    "__subclasses__": r'\b__subclasses__\b',
+    "__mro__": r'\b__mro__\b',
+    "mro": r'\bmro\b',
+    "__globals__": r'\b__globals__\b',
+    "__builtins__": r'\b__builtins__\b',
+}
+# Attributes that share a name with a forbidden builtin but are harmless:
+# re.compile and the like build pattern objects, and a code object from the
+# compile builtin can only be run with exec or eval, which are caught anywhere
+HARMLESS_ATTRIBUTES = frozenset({"compile"})
+# The order findings are reported in
+PATTERN_ORDER = list(FORBIDDEN_BUILTINS.values()) + list(FORBIDDEN_ATTRIBUTES.values())
+
+_DUNDER_IN_STRING_PATTERN = re.compile(
+    r'\b(' + '|'.join(name for name in FORBIDDEN_ATTRIBUTES if name.startswith('__')) + r')\b')
+
+_CACHE_SIZE = 1024
+
+
+def _import_error(module):
+    return f"Error: Importing module '{module}' is not allowed for security reasons"
+
+
+def _pattern_error(pattern):
+    return f"Error: Code contains potentially dangerous pattern: {pattern}"
+
+
+class _Analyzer(ast.NodeVisitor):
+    """Collects the forbidden modules and legacy patterns a syntax tree uses."""
+
+    def __init__(self):
+        self.modules = set()
+        self.patterns = set()
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._module(alias.name)
+
+    def visit_ImportFrom(self, node):
+        if not node.level and node.module:
+            self._module(node.module)
+        # from io import open, from codecs import open as o
+        for alias in node.names:
+            if alias.name in FORBIDDEN_BUILTINS:
+                self.patterns.add(FORBIDDEN_BUILTINS[alias.name])
+
+    def _module(self, name):
+        top_level = name.split(".", 1)[0]
+        if top_level in FORBIDDEN_MODULES:
+            self.modules.add(top_level)
+
+    def visit_Name(self, node):
+        if node.id in FORBIDDEN_BUILTINS:
+            self.patterns.add(FORBIDDEN_BUILTINS[node.id])
+        elif node.id in FORBIDDEN_ATTRIBUTES and node.id.startswith("__"):
+            self.patterns.add(FORBIDDEN_ATTRIBUTES[node.id])
+
+    def visit_Attribute(self, node):
+        if node.attr in FORBIDDEN_ATTRIBUTES:
+            self.patterns.add(FORBIDDEN_ATTRIBUTES[node.attr])
+        elif node.attr in FORBIDDEN_BUILTINS and node.attr not in HARMLESS_ATTRIBUTES:
+            # The same functions reached through a module: io.open, codecs.open, _io.open
+            self.patterns.add(FORBIDDEN_BUILTINS[node.attr])
+        self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str):
+            for match in _DUNDER_IN_STRING_PATTERN.finditer(node.value):
+                self.patterns.add(FORBIDDEN_ATTRIBUTES[match.group(1)])
+
+    def errors(self):
+        return ([_import_error(module) for module in FORBIDDEN_MODULES if module in self.modules]
+                + [_pattern_error(pattern) for pattern in PATTERN_ORDER if pattern in self.patterns])
+
+
+_verdicts = OrderedDict()
+_verdicts_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def _cache_key(code):
+    return hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _analyze(code):
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        # The sandbox will report the syntax error; until then be as strict as before
+        logger.debug(f"Code does not parse ({e}), using the regex checks")
+        from .security import python_code_violations
+        return tuple(python_code_violations(code))
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+    return tuple(analyzer.errors())
+
+
+def analyze_python_code(code):
+    """
+    Find every forbidden import and dangerous builtin or attribute in Python code.
+
+    Args:
+        code: The Python code to check
+
+    Returns:
+        Tuple of error messages, forbidden imports first; empty if the code looks safe
+    """
+    key = _cache_key(code)
+    with _verdicts_lock:
+        verdict = _verdicts.get(key)
+        if verdict is not None:
+            _verdicts.move_to_end(key)
+            _counters["hits"] += 1
+            return verdict
+        _counters["misses"] += 1
+
+    verdict = _analyze(code)
+    with _verdicts_lock:
+        _verdicts[key] = verdict
+        while len(_verdicts) > _CACHE_SIZE:
+            _verdicts.popitem(last=False)
+    return verdict
+
+
+def cache_info():
+    """Verdict cache hits, misses and size."""
+    with _verdicts_lock:
+        return dict(_counters, size=len(_verdicts))
+
+
+def clear_cache():
+    with _verdicts_lock:
+        _verdicts.clear()
+        _counters.update(hits=0, misses=0)
@@ -21,6 +21,37 @@ class Config:
     POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD")
     POSTGRES_PORT = int(os.environ.get("POSTGRES_PORT", 5432))
     DATABASE_URL = os.environ.get("DATABASE_URL")
+    POSTGRES_POOL_MIN_SIZE = int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 1))
+    POSTGRES_POOL_MAX_SIZE = int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 10))
+    POSTGRES_POOL_TIMEOUT = float(os.environ.get("POSTGRES_POOL_TIMEOUT", 30))
+    POSTGRES_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", 30))
+    
+    # Tool calls of one LLM turn that are safe to run concurrently share this pool
+    TOOL_DISPATCH_MAX_WORKERS = int(os.environ.get("TOOL_DISPATCH_MAX_WORKERS", 4))
+    TOOL_DEFAULT_TIMEOUT = float(os.environ.get("TOOL_DEFAULT_TIMEOUT", 60))
+    
+    # Rows returned by postgres_sql_run, and how far past that rows are
+    # counted for the "N of M rows shown" note
+    SQL_MAX_ROWS = int(os.environ.get("SQL_MAX_ROWS", 100))
+    SQL_ROW_COUNT_LIMIT = int(os.environ.get("SQL_ROW_COUNT_LIMIT", 1000))
+    
+    # Run the statements of one postgres_sql_run call in a single transaction
+    SQL_SINGLE_TRANSACTION = os.environ.get("SQL_SINGLE_TRANSACTION", "true").lower() == "true"
+    
+    # Seconds a web or Slack request may take. SQL statements are cancelled
+    # when it runs out; SQL_STATEMENT_TIMEOUT > 0 also caps each statement.
+    REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 180))
+    SQL_STATEMENT_TIMEOUT = float(os.environ.get("SQL_STATEMENT_TIMEOUT", 0))
+    
+    # Reject (or, for reads, LIMIT) SQL statements whose EXPLAIN estimate is
+    # above these; 0 disables the check
+    SQL_MAX_COST = float(os.environ.get("SQL_MAX_COST", 0))
+    SQL_MAX_PLAN_ROWS = int(os.environ.get("SQL_MAX_PLAN_ROWS", 0))
+    
+    # Conversation history storage ("sqlite" or "replit")
+    CONVERSATION_STORE = os.environ.get("CONVERSATION_STORE", "sqlite").lower()
+    CONVERSATION_DB_PATH = os.environ.get("CONVERSATION_DB_PATH", "conversations.db")
+    CONVERSATION_MIGRATE_FROM_REPLIT = os.environ.get("CONVERSATION_MIGRATE_FROM_REPLIT", "true").lower() == "true"
     
     # API keys and tokens
     OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
@@ -37,11 +68,83 @@ class Config:
     # LLM configuration
     DEFAULT_LLM_MODEL = os.environ.get("DEFAULT_LLM_MODEL", "openai/gpt-4o-mini")
     
+    # Pooled HTTP connections shared by the LLM clients
+    LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 20))
+    LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", 30))
+    LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", 120))
+    
+    # Fail over to the other provider when the configured one fails, and stop
+    # calling a provider for LLM_BREAKER_RESET_TIMEOUT seconds after
+    # LLM_BREAKER_FAILURES consecutive failures. LLM_HEDGE_AFTER > 0 also sends
+    # calls still unanswered after that many seconds to the local Ollama model;
+    # hedged calls run on a pool of LLM_HEDGE_WORKERS threads.
+    LLM_FAILOVER = os.environ.get("LLM_FAILOVER", "false").lower() == "true"
+    LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 3))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.environ.get("LLM_BREAKER_RESET_TIMEOUT", 30))
+    LLM_HEDGE_AFTER = float(os.environ.get("LLM_HEDGE_AFTER", 0))
+    LLM_HEDGE_WORKERS = int(os.environ.get("LLM_HEDGE_WORKERS", 32))
+    
+    # Exact-match cache of LLM replies ("memory" or "sqlite" backend)
+    LLM_CACHE = os.environ.get("LLM_CACHE", "true").lower() == "true"
+    LLM_CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "memory").lower()
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.db")
+    LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 3600))
+    LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+    LLM_CACHE_CONTEXT_TURNS = int(os.environ.get("LLM_CACHE_CONTEXT_TURNS", 1))
+    
+    # Run saved SQL for recurring questions instead of asking the LLM again
+    SQL_INTENT_CACHE = os.environ.get("SQL_INTENT_CACHE", "true").lower() == "true"
+    SQL_INTENT_CACHE_PATH = os.environ.get("SQL_INTENT_CACHE_PATH", "sql_intents.db")
+    SQL_INTENT_TTL = float(os.environ.get("SQL_INTENT_TTL", 7 * 24 * 3600))
+    
+    # Token budget for the conversation messages sent with each LLM call.
+    # CONTEXT_TOKEN_BUDGETS overrides it per model: "model=tokens,model=tokens"
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 16000))
+    CONTEXT_TOKEN_BUDGETS = {
+        model.strip(): int(tokens)
+        for model, _, tokens in (
+            entry.partition("=") for entry in os.environ.get("CONTEXT_TOKEN_BUDGETS", "").split(",")
+        ) if model.strip() and tokens.strip()
+    }
+    
+    # Limits of one agent turn (LLM -> tools -> LLM ...)
+    AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", 5))
+    AGENT_TIME_BUDGET = float(os.environ.get("AGENT_TIME_BUDGET", 120))
+    
+    # How tool results are presented: "local" renders them without another LLM
+    # call, "llm" asks the LLM to reformat them, "auto" renders locally when
+    # every result has a renderer. Can be overridden per request.
+    RENDER_MODE = os.environ.get("RENDER_MODE", "auto").lower()
+    
+    # Mark the stable part of the system prompt with cache_control blocks
+    # (for OpenRouter models that need explicit cache breakpoints, e.g. Anthropic)
+    PROMPT_CACHE_CONTROL = os.environ.get("PROMPT_CACHE_CONTROL", "false").lower() == "true"
+    
     # Feature flags
     USE_OPEN_ROUTER =  os.environ.get("USE_OPEN_ROUTER", "true").lower() == "true"
     ENABLE_SLACK_BOT = os.environ.get("ENABLE_SLACK_BOT", "false").lower() == "true"
     ENABLE_CODE_EXECUTION = os.environ.get("ENABLE_CODE_EXECUTION", "false").lower() == "true"
     SANDBOX_EXECUTION = os.environ.get("SANDBOX_EXECUTION", "true").lower() == "true"
+    SANDBOX_WORKER_POOL = os.environ.get("SANDBOX_WORKER_POOL", "true").lower() == "true"
+    
+    # Sandbox worker pool configuration
+    SANDBOX_POOL_SIZE = int(os.environ.get("SANDBOX_POOL_SIZE", 2))
+    SANDBOX_WORKER_MAX_JOBS = int(os.environ.get("SANDBOX_WORKER_MAX_JOBS", 100))
+    SANDBOX_TIMEOUT = int(os.environ.get("SANDBOX_TIMEOUT", 5))
+    SANDBOX_MEMORY_LIMIT_MB = int(os.environ.get("SANDBOX_MEMORY_LIMIT_MB", 256))
+    SANDBOX_PRELOAD_MODULES = [
+        module.strip() for module in os.environ.get(
+            "SANDBOX_PRELOAD_MODULES",
+            "math,random,statistics,datetime,json,re,collections,itertools,functools,decimal,fractions,numpy"
+        ).split(",") if module.strip()
+    ]
+
+    # Persistent per-conversation Python sessions (sandbox kernels)
+    SANDBOX_STATEFUL = os.environ.get("SANDBOX_STATEFUL", "false").lower() == "true"
+    SANDBOX_KERNEL_MAX_COUNT = int(os.environ.get("SANDBOX_KERNEL_MAX_COUNT", 8))
+    SANDBOX_KERNEL_IDLE_TIMEOUT = int(os.environ.get("SANDBOX_KERNEL_IDLE_TIMEOUT", 600))
+    SANDBOX_KERNEL_MAX_LIFETIME = int(os.environ.get("SANDBOX_KERNEL_MAX_LIFETIME", 3600))
+    SANDBOX_KERNEL_MEMORY_LIMIT_MB = int(os.environ.get("SANDBOX_KERNEL_MEMORY_LIMIT_MB", 512))
     
     @classmethod
     def validate_required_env_vars(cls, required_vars):
@@ -0,0 +1,146 @@
+"""
+Per-request deadlines.
+
+The web API and the Slack bot open a deadline for each request with
+request_deadline(). It is kept in a context variable, so everything running
+on behalf of the request (the agent loop, the tool dispatcher's pool threads,
+which run with a copy of the caller's context, and run_sql) can see how much
+time is left without it being passed through every call. Code doing blocking
+work registers a callback with on_expire(), e.g. conn.cancel, which is called
+from a timer thread if the deadline passes while the work is still running.
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+from .logging_utils import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+_current = contextvars.ContextVar("request_deadline", default=None)
+
+
+class Deadline:
+    """A point in time by which a request should be done."""
+
+    def __init__(self, timeout):
+        """
+        Args:
+            timeout: Seconds from now
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+        self._callbacks = {}
+        self._next_id = 0
+        self._timer = None
+        self._expired = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left, never negative."""
+        if self._expired:
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    @contextlib.contextmanager
+    def on_expire(self, callback):
+        """
+        Call callback (from a timer thread) if the deadline passes before the block ends.
+
+        The callback is never called after the block has ended: leaving the
+        block waits for a callback that is already running.
+        """
+        with self._lock:
+            key = self._next_id
+            self._next_id += 1
+            self._callbacks[key] = callback
+            if self._timer is None and not self._expired:
+                self._timer = threading.Timer(self.remaining(), self.expire)
+                self._timer.daemon = True
+                self._timer.start()
+        try:
+            if self.expired():
+                self.expire()
+            yield self
+        finally:
+            with self._lock:
+                self._callbacks.pop(key, None)
+
+    def expire(self):
+        """End the deadline now and run the registered callbacks, e.g. when the client went away."""
+        with self._lock:
+            self._expired = True
+            for callback in list(self._callbacks.values()):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning(f"Deadline callback failed: {e}")
+            self._callbacks.clear()
+
+    def close(self):
+        """Stop the timer; called when the request is finished."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._callbacks.clear()
+        if timer is not None:
+            timer.cancel()
+
+
+@contextlib.contextmanager
+def request_deadline(timeout):
+    """
+    Run the block under a deadline of timeout seconds.
+
+    A nested deadline never extends the enclosing one. A timeout of 0 or
+    None runs the block without a deadline (unless one is already set).
+
+    Yields:
+        The Deadline in effect, or None
+    """
+    outer = _current.get()
+    if not timeout or timeout <= 0:
+        yield outer
+        return
+    if outer is not None and outer.remaining() <= timeout:
+        yield outer
+        return
+
+    deadline = Deadline(timeout)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+        deadline.close()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """
+    Run the block under an existing Deadline, e.g. one its creator may expire() early.
+
+    Unlike request_deadline() this does not check the enclosing deadline;
+    the caller must not give the block more time than it has.
+    """
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current_deadline():
+    """The deadline of the current request, or None."""
+    return _current.get()
+
+
+def remaining(default=None):
+    """Seconds left before the current request's deadline, or default if there is none."""
+    deadline = _current.get()
+    return default if deadline is None else deadline.remaining()
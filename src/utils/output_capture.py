@@ -0,0 +1,73 @@
+"""
+Per-context capture of sys.stdout.
+
+Reassigning sys.stdout redirects the output of every thread in the process,
+so two concurrent captures would collect each other's output, along with
+anything else printed meanwhile. capture_stdout() instead installs (once) a
+proxy as sys.stdout that sends each write to the buffer of the capture
+active in the writer's context, and to the original stream otherwise. The
+buffer is kept in a context variable, so a capture covers the thread that
+opened it, and code run with a copy of its context, and nothing else.
+"""
+
+import contextlib
+import contextvars
+import io
+import sys
+import threading
+
+_buffer = contextvars.ContextVar("stdout_capture", default=None)
+_install_lock = threading.Lock()
+
+
+class ContextStdout:
+    """Stand-in for sys.stdout writing to the current context's capture buffer, if any."""
+
+    def __init__(self, stream):
+        """
+        Args:
+            stream: The stream written to outside of a capture
+        """
+        self.stream = stream
+
+    def _target(self):
+        buffer = _buffer.get()
+        return self.stream if buffer is None else buffer
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def writelines(self, lines):
+        self._target().writelines(lines)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        # encoding, isatty, fileno and the like
+        return getattr(self._target(), name)
+
+
+def install():
+    """Make sys.stdout a ContextStdout, unless it already is one."""
+    with _install_lock:
+        if not isinstance(sys.stdout, ContextStdout):
+            sys.stdout = ContextStdout(sys.stdout)
+        return sys.stdout
+
+
+@contextlib.contextmanager
+def capture_stdout():
+    """
+    Capture what the current context writes to sys.stdout during the block.
+
+    Yields:
+        The io.StringIO receiving the output
+    """
+    install()
+    buffer = io.StringIO()
+    token = _buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _buffer.reset(token)
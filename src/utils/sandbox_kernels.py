@@ -0,0 +1,347 @@
+"""
+Persistent per-conversation Python sessions ("kernels") for the sandbox.
+
+Pooled sandbox workers run every snippet in a fresh namespace, so a
+multi-step analysis makes the model resend and recompute everything on each
+call. With SANDBOX_STATEFUL each conversation instead gets its own
+long-lived sandbox worker (see sandbox_worker.py) whose globals persist
+between calls: data parsed, modules imported and helpers defined by one
+call are there for the next.
+
+A kernel is a whole process, so kernels are bounded: one is stopped when it
+has been idle for idle_timeout seconds, when it has lived for max_lifetime
+seconds, when it breaches its memory or CPU limit, and, least recently used
+first, when more than max_kernels are running. The next call of that
+conversation starts a new kernel and its output tells the model that the
+earlier variables are gone.
+
+The web API and the Slack bot set the conversation of a request with
+conversation_scope(); it is kept in a context variable like the request
+deadline (see deadline.py).
+"""
+
+import atexit
+import contextlib
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+from .config import Config
+from .logging_utils import get_logger
+from .sandbox_pool import SandboxError, SandboxWorker
+from .security import check_python_code
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Conversations whose kernel was evicted, remembered to explain the lost state
+_MAX_STOPPED = 1024
+
+LOST_STATE = "Variables from earlier calls are gone."
+
+_conversation = contextvars.ContextVar("sandbox_conversation", default=None)
+
+
+@contextlib.contextmanager
+def conversation_scope(conversation_id):
+    """Run the block on behalf of a conversation, whose Python session it then uses."""
+    token = _conversation.set(None if conversation_id is None else str(conversation_id))
+    try:
+        yield
+    finally:
+        _conversation.reset(token)
+
+
+def current_conversation():
+    """The conversation of the current request, or None."""
+    return _conversation.get()
+
+
+class Kernel:
+    """A conversation's sandbox worker. Its lock is held while it runs a job."""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.started_at = self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.stopped = False
+
+
+class KernelManager:
+    """
+    Thread-safe set of persistent sandbox workers, one per conversation.
+
+    Calls of the same conversation run one at a time, in the order they
+    acquire the kernel; calls of different conversations run concurrently.
+    """
+
+    def __init__(self, max_kernels=8, idle_timeout=600, max_lifetime=3600, timeout=5.0,
+                 memory_limit_mb=512, cpu_limit_seconds=5, preload=(), reap_interval=30):
+        """
+        Args:
+            max_kernels: Kernels kept running; the least recently used are stopped beyond it
+            idle_timeout: Seconds without a call after which a kernel is stopped
+            max_lifetime: Seconds after which a kernel is stopped, however busy
+            timeout: Wall clock seconds allowed per snippet
+            memory_limit_mb: Address space each kernel may allocate on top of
+                the interpreter and pre-imported modules, for all its variables
+            cpu_limit_seconds: CPU seconds allowed per snippet
+            preload: Module names imported by each kernel at startup
+            reap_interval: Seconds between checks for idle and expired kernels
+        """
+        if max_kernels < 1:
+            raise ValueError(f"Invalid kernel settings: max_kernels={max_kernels}")
+
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.reap_interval = reap_interval
+        self._worker_config = {
+            "preload": list(preload),
+            "memory_limit_mb": memory_limit_mb,
+            "cpu_limit_seconds": int(cpu_limit_seconds),
+            "persistent": True,
+        }
+
+        self._kernels = OrderedDict()  # Least recently used first
+        self._stopped = OrderedDict()  # Conversation -> why its kernel was stopped
+        self._closed = False
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+    def execute(self, conversation_id, code):
+        """
+        Check and execute code in the conversation's kernel, starting one if needed.
+
+        Args:
+            conversation_id: The conversation the code belongs to
+            code: The Python code to execute
+
+        Returns:
+            The code's output, or an error message starting with "Error:"
+        """
+        error = check_python_code(code)
+        if error:
+            return error
+
+        self.evict_expired()
+        while True:
+            try:
+                kernel = self._kernel(conversation_id)
+            except SandboxError as e:
+                return f"Error: {e}"
+            with kernel.lock:
+                if kernel.stopped:
+                    # Evicted between the lookup and the lock
+                    continue
+                notice = self._stop_notice(conversation_id)
+                try:
+                    reply = kernel.worker.run(code, self.timeout)
+                except SandboxError as e:
+                    self._stop(conversation_id, kernel)
+                    return _with_notice(f"Error: {e}. {LOST_STATE}", notice)
+                kernel.last_used = time.monotonic()
+                if reply.get("recycle"):
+                    self._stop(conversation_id, kernel)
+            break
+
+        if not reply["ok"]:
+            stderr = reply["stderr"].rstrip()
+            if reply.get("recycle"):
+                stderr = f"{stderr}. {LOST_STATE}"
+            return _with_notice(f"Error: {stderr}", notice)
+        return _with_notice(reply["stdout"], notice)
+
+    def inspect(self, conversation_id):
+        """
+        Describe the conversation's kernel and list its variables.
+
+        Returns:
+            The description, or None if the conversation has no kernel running
+        """
+        with self._lock:
+            kernel = self._kernels.get(conversation_id)
+        if kernel is None:
+            return None
+        with kernel.lock:
+            if kernel.stopped:
+                return None
+            try:
+                reply = kernel.worker.inspect(self.timeout)
+            except SandboxError as e:
+                self._stop(conversation_id, kernel)
+                return f"Error: {e}. {LOST_STATE}"
+            if not reply["ok"]:
+                self._stop(conversation_id, kernel)
+                return f"Error: {reply['stderr'].rstrip()}. {LOST_STATE}"
+
+            age = time.monotonic() - kernel.started_at
+            header = (f"Python session: {kernel.worker.jobs} call(s), running for {age:.0f} seconds, "
+                      f"using {reply['memory_mb']:g} MB")
+        return f"{header}\n{reply['stdout'] or '(no variables defined)'}"
+
+    def reset(self, conversation_id):
+        """
+        Stop the conversation's kernel; its next call starts with an empty namespace.
+
+        Returns:
+            True if a kernel was running
+        """
+        with self._lock:
+            kernel = self._kernels.get(conversation_id)
+        if kernel is None:
+            return False
+        # Wait for a running call rather than killing it halfway
+        with kernel.lock:
+            self._stop(conversation_id, kernel)
+        return True
+
+    def evict_expired(self):
+        """Stop idle, expired and surplus kernels that are not running a call."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            surplus = len(self._kernels) - self.max_kernels
+            for conversation_id, kernel in list(self._kernels.items()):
+                if now - kernel.last_used >= self.idle_timeout:
+                    reason = f"it was idle for more than {self.idle_timeout:g} seconds"
+                elif now - kernel.started_at >= self.max_lifetime:
+                    reason = f"it reached its maximum lifetime of {self.max_lifetime:g} seconds"
+                elif surplus > 0:
+                    reason = "too many Python sessions were running"
+                else:
+                    continue
+                if not kernel.lock.acquire(blocking=False):
+                    # Busy, so not idle; a busy kernel past its lifetime goes on a later pass
+                    continue
+                try:
+                    self._remove(conversation_id, kernel, reason)
+                finally:
+                    kernel.lock.release()
+                surplus -= 1
+                evicted.append((conversation_id, kernel, reason))
+
+        for conversation_id, kernel, reason in evicted:
+            logger.info(f"Stopping Python session of conversation {conversation_id}: {reason}")
+            kernel.worker.close()
+
+    def stats(self):
+        """Number of running kernels and of conversations whose kernel was stopped."""
+        with self._lock:
+            return {"kernels": len(self._kernels), "stopped": len(self._stopped)}
+
+    def closeall(self):
+        """Stop all kernels and refuse further work."""
+        self._stop_reaper.set()
+        with self._lock:
+            self._closed = True
+            kernels, self._kernels = list(self._kernels.values()), OrderedDict()
+        for kernel in kernels:
+            kernel.stopped = True
+            kernel.worker.close()
+
+    def _kernel(self, conversation_id):
+        with self._lock:
+            if self._closed:
+                raise SandboxError("Python sessions are shut down")
+            kernel = self._kernels.get(conversation_id)
+            if kernel is not None:
+                self._kernels.move_to_end(conversation_id)
+                return kernel
+
+        # Starting a worker takes a while; don't hold up other conversations
+        logger.info(f"Starting Python session for conversation {conversation_id}")
+        kernel = Kernel(SandboxWorker(self._worker_config))
+        with self._lock:
+            closed = self._closed
+            existing = self._kernels.get(conversation_id)
+            if existing is None and not closed:
+                self._kernels[conversation_id] = kernel
+                self._start_reaper()
+            surplus = len(self._kernels) > self.max_kernels
+        if closed or existing is not None:
+            # Shut down, or another call of the conversation started one first
+            kernel.worker.close()
+            if closed:
+                raise SandboxError("Python sessions are shut down")
+            return existing
+
+        if surplus:
+            self.evict_expired()
+        return kernel
+
+    def _stop(self, conversation_id, kernel):
+        # Called with kernel.lock held, after the caller reported the lost state
+        with self._lock:
+            self._remove(conversation_id, kernel)
+        kernel.worker.close()
+
+    def _remove(self, conversation_id, kernel, reason=None):
+        # Called with self._lock and kernel.lock held
+        kernel.stopped = True
+        if self._kernels.get(conversation_id) is kernel:
+            del self._kernels[conversation_id]
+        if reason:
+            self._stopped[conversation_id] = reason
+            self._stopped.move_to_end(conversation_id)
+            while len(self._stopped) > _MAX_STOPPED:
+                self._stopped.popitem(last=False)
+        else:
+            self._stopped.pop(conversation_id, None)
+
+    def _stop_notice(self, conversation_id):
+        with self._lock:
+            reason = self._stopped.pop(conversation_id, None)
+        if reason is None:
+            return None
+        return f"Note: The Python session of this conversation was restarted because {reason}. {LOST_STATE}"
+
+    def _start_reaper(self):
+        # Called with self._lock held
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while not self._stop_reaper.wait(self.reap_interval):
+                try:
+                    self.evict_expired()
+                except Exception as e:
+                    logger.error(f"Could not stop expired Python sessions: {e}")
+
+        self._reaper = threading.Thread(target=reap, name="sandbox-kernel-reaper", daemon=True)
+        self._reaper.start()
+
+
+def _with_notice(result, notice):
+    if not notice:
+        return result
+    if result.startswith("Error:"):
+        # Keep the result recognizable as an error
+        return f"Error: {notice}\n{result[len('Error:'):].lstrip()}"
+    return f"{notice}\n{result}"
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_kernel_manager():
+    """Return the process-wide kernel manager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            logger.info(f"Starting Python session manager (max_kernels={Config.SANDBOX_KERNEL_MAX_COUNT})")
+            _manager = KernelManager(
+                max_kernels=Config.SANDBOX_KERNEL_MAX_COUNT,
+                idle_timeout=Config.SANDBOX_KERNEL_IDLE_TIMEOUT,
+                max_lifetime=Config.SANDBOX_KERNEL_MAX_LIFETIME,
+                timeout=Config.SANDBOX_TIMEOUT,
+                memory_limit_mb=Config.SANDBOX_KERNEL_MEMORY_LIMIT_MB,
+                cpu_limit_seconds=Config.SANDBOX_TIMEOUT,
+                preload=Config.SANDBOX_PRELOAD_MODULES,
+            )
+            atexit.register(_manager.closeall)
+        return _manager
@@ -0,0 +1,314 @@
+"""
+Pool of warm sandbox worker processes for executing Python code.
+
+Starting a fresh interpreter for every snippet costs tens of milliseconds,
+and several hundred more for snippets that import numpy. The pool keeps a
+few long-lived workers (see sandbox_worker.py) with common modules already
+imported and resource limits already applied, sends them code over a pipe,
+and replaces a worker after a fixed number of jobs, on a timeout, or when it
+breaches a resource limit.
+"""
+
+import atexit
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from .config import Config
+from .logging_utils import get_logger
+from .security import check_python_code
+
+# Initialize logger
+logger = get_logger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+# Numerical libraries start a thread per core by default, which inflates the
+# worker's virtual memory far beyond what the memory limit allows
+WORKER_ENV_OVERRIDES = {
+    "OPENBLAS_NUM_THREADS": "1",
+    "OMP_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+
+
+class SandboxError(Exception):
+    """Raised when a sandbox worker dies, hangs or cannot be started."""
+    pass
+
+
+class SandboxWorker:
+    """A single sandbox worker process and its request/reply pipes."""
+
+    def __init__(self, config, startup_timeout=30.0):
+        """
+        Args:
+            config: Dict passed to the worker (preload, memory_limit_mb, cpu_limit_seconds,
+                and persistent to keep the namespace between jobs)
+            startup_timeout: Seconds to wait for the worker to finish pre-importing
+        """
+        env = dict(os.environ, **WORKER_ENV_OVERRIDES)
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, json.dumps(config)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            close_fds=True,
+        )
+        self.jobs = 0
+        try:
+            self._read_reply(startup_timeout)
+        except SandboxError:
+            self.close()
+            raise
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, code, timeout):
+        """
+        Execute code in the worker.
+
+        Returns:
+            The worker's reply: dict with ok, stdout, stderr and recycle
+
+        Raises:
+            SandboxError: If the worker timed out or died; it must not be reused
+        """
+        self.jobs += 1
+        return self._request({"code": code}, timeout)
+
+    def inspect(self, timeout):
+        """
+        List the variables of a persistent worker's namespace.
+
+        Returns:
+            The worker's reply: dict with ok, stdout (one "name: type = value"
+            line per variable), stderr, recycle and memory_mb
+
+        Raises:
+            SandboxError: If the worker timed out or died; it must not be reused
+        """
+        return self._request({"inspect": True}, timeout)
+
+    def _request(self, job, timeout):
+        try:
+            self.process.stdin.write(json.dumps(job).encode() + b"\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise SandboxError(f"Sandbox worker is not accepting code: {e}")
+        return self._read_reply(timeout)
+
+    def _read_reply(self, timeout):
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise SandboxError(f"Code execution timed out ({timeout:g} second limit)")
+
+        # Each reply is written and flushed as a single line
+        line = self.process.stdout.readline()
+        if not line.endswith(b"\n"):
+            self.process.wait()
+            raise SandboxError(self._exit_reason())
+        return json.loads(line)
+
+    def _exit_reason(self):
+        returncode = self.process.returncode
+        if returncode == -signal.SIGXCPU or returncode == -signal.SIGKILL:
+            return "Code execution exceeded the CPU time limit"
+        if returncode is not None and returncode < 0:
+            return f"Sandbox worker was killed by signal {-returncode}"
+        return f"Sandbox worker exited unexpectedly (exit code {returncode})"
+
+    def close(self):
+        """Stop the worker. It holds no state worth a graceful shutdown."""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class SandboxWorkerPool:
+    """
+    Thread-safe pool of pre-started sandbox workers.
+
+    Each worker runs one snippet at a time in a fresh namespace. Workers are
+    started in the background up front and after every recycle, so callers
+    normally find a warm worker waiting.
+    """
+
+    def __init__(self, size=2, max_jobs_per_worker=100, timeout=5.0,
+                 memory_limit_mb=256, cpu_limit_seconds=5, preload=(),
+                 acquire_timeout=30.0):
+        """
+        Args:
+            size: Number of worker processes
+            max_jobs_per_worker: Jobs after which a worker is replaced
+            timeout: Wall clock seconds allowed per snippet
+            memory_limit_mb: Address space each worker may allocate on top of
+                the interpreter and pre-imported modules
+            cpu_limit_seconds: CPU seconds allowed per snippet
+            preload: Module names imported by each worker at startup
+            acquire_timeout: Seconds to wait for a free worker
+        """
+        if size < 1 or max_jobs_per_worker < 1:
+            raise ValueError(f"Invalid pool settings: size={size}, max_jobs_per_worker={max_jobs_per_worker}")
+
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._worker_config = {
+            "preload": list(preload),
+            "memory_limit_mb": memory_limit_mb,
+            "cpu_limit_seconds": int(cpu_limit_seconds),
+        }
+
+        self._idle = []
+        self._size = 0  # Workers alive or starting, leased or idle
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(size):
+            self._spawn_async()
+
+    def execute(self, code):
+        """
+        Check and execute code in a pooled worker.
+
+        Args:
+            code: The Python code to execute
+
+        Returns:
+            The code's output, or an error message starting with "Error:"
+        """
+        error = check_python_code(code)
+        if error:
+            return error
+
+        worker = self._acquire()
+        recycle = True
+        try:
+            reply = worker.run(code, self.timeout)
+            recycle = reply.get("recycle", False)
+        except SandboxError as e:
+            logger.warning(f"Recycling sandbox worker {worker.pid}: {e}")
+            return f"Error: {e}"
+        finally:
+            self._release(worker, recycle)
+
+        if not reply["ok"]:
+            return f"Error: {reply['stderr']}"
+        return reply["stdout"]
+
+    def closeall(self):
+        """Stop all idle workers and refuse further work."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise SandboxError("Sandbox worker pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.size:
+                    # A background start failed earlier; start one inline
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SandboxError("Timed out waiting for a free sandbox worker")
+                self._cond.wait(remaining)
+
+        try:
+            return SandboxWorker(self._worker_config)
+        except Exception:
+            self._worker_gone()
+            raise
+
+    def _release(self, worker, recycle=False):
+        if recycle or worker.jobs >= self.max_jobs_per_worker or not worker.alive():
+            worker.close()
+            self._worker_gone()
+            self._spawn_async()
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._size -= 1
+        worker.close()
+
+    def _worker_gone(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _spawn_async(self):
+        with self._cond:
+            if self._closed or self._size >= self.size:
+                return
+            self._size += 1
+
+        def start():
+            try:
+                worker = SandboxWorker(self._worker_config)
+            except Exception as e:
+                logger.error(f"Could not start sandbox worker: {e}")
+                self._worker_gone()
+                return
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(worker)
+                    self._cond.notify()
+                    return
+                self._size -= 1
+            worker.close()
+
+        threading.Thread(target=start, name="sandbox-worker-start", daemon=True).start()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool():
+    """Return the process-wide sandbox worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            logger.info(f"Starting sandbox worker pool (size={Config.SANDBOX_POOL_SIZE})")
+            _pool = SandboxWorkerPool(
+                size=Config.SANDBOX_POOL_SIZE,
+                max_jobs_per_worker=Config.SANDBOX_WORKER_MAX_JOBS,
+                timeout=Config.SANDBOX_TIMEOUT,
+                memory_limit_mb=Config.SANDBOX_MEMORY_LIMIT_MB,
+                cpu_limit_seconds=Config.SANDBOX_TIMEOUT,
+                preload=Config.SANDBOX_PRELOAD_MODULES,
+            )
+            atexit.register(_pool.closeall)
+        return _pool
@@ -0,0 +1,241 @@
+"""
+Long-lived sandbox worker process, started by utils.sandbox_pool.
+
+Not meant to be imported. The worker pre-imports common modules, applies
+resource limits to itself, then executes code snippets received over stdin
+one JSON line at a time, answering each with one JSON line on the original
+stdout. File descriptors 1 and 2 are pointed at /dev/null so nothing the
+executed code does can corrupt the protocol stream.
+
+Pooled workers run every snippet in a fresh namespace and afterwards put
+the modules back as they were at startup, so nothing one snippet imports,
+patches or seeds is seen by the next. Persistent workers (the
+per-conversation kernels of utils.sandbox_kernels) keep one namespace and
+their modules for their whole life and also answer {"inspect": true} with a
+listing of it.
+"""
+
+import builtins
+import contextlib
+import importlib.machinery
+import io
+import json
+import os
+import resource
+import sys
+import traceback
+import types
+
+MAX_OUTPUT_CHARS = 1024 * 1024
+MAX_REPR_CHARS = 80
+
+# Modules whose generator is seeded from OS entropy again after each pooled
+# job, so a seed set by one job does not make the next one's numbers predictable
+RESEEDED_MODULES = ("random", "numpy.random")
+
+_MISSING = object()
+
+
+def _virtual_memory_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _resident_memory_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _apply_memory_limit(limit_mb):
+    # The limit applies on top of what the interpreter and pre-imported
+    # modules already use; an absolute cap small enough to be useful would
+    # not even let the interpreter start.
+    limit = _virtual_memory_bytes() + limit_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _set_cpu_budget(seconds):
+    # RLIMIT_CPU counts the whole process lifetime, so each job gets a
+    # budget relative to the CPU time already used. Exceeding the soft limit
+    # sends SIGXCPU, which terminates the worker and makes the pool recycle it.
+    # Only the soft limit moves: a process can never raise its hard limit
+    # again, so lowering it would cap the worker's total CPU time instead.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + seconds
+    if hard != resource.RLIM_INFINITY and soft > hard:
+        raise ValueError(f"the worker used up its CPU time hard limit ({hard} seconds)")
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _new_namespace():
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+def _run(code, namespace):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    recycle = False
+    ok = True
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(code, "<sandbox>", "exec"), namespace)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+            if not ok:
+                stderr.write(f"SystemExit: {e.code}\n")
+        except MemoryError:
+            ok = False
+            recycle = True
+            stderr.write("MemoryError: Code execution exceeded the memory limit\n")
+        except BaseException as e:
+            ok = False
+            # Hide the worker's own frame from the traceback
+            stderr.write("".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+
+    return {
+        "ok": ok,
+        "stdout": stdout.getvalue()[:MAX_OUTPUT_CHARS],
+        "stderr": stderr.getvalue()[:MAX_OUTPUT_CHARS],
+        "recycle": recycle,
+    }
+
+
+def _snapshot_modules():
+    """The loaded modules, each with a copy of its globals."""
+    return {name: (module, dict(getattr(module, "__dict__", {}))) for name, module in list(sys.modules.items())}
+
+
+def _is_extension(module):
+    origin = getattr(getattr(module, "__spec__", None), "origin", None) or ""
+    return origin.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES))
+
+
+def _restore_modules(snapshot):
+    """
+    Undo what a job did to the loaded modules.
+
+    Modules the job imported are unloaded and the globals of the others are
+    reset, which drops replaced functions and added attributes; objects
+    changed in place are not restored.
+
+    Args:
+        snapshot: The result of _snapshot_modules() at startup
+
+    Returns:
+        False if the job loaded an extension module, which cannot be unloaded
+    """
+    restored = True
+    for name in [name for name in sys.modules if name not in snapshot]:
+        if _is_extension(sys.modules.pop(name)):
+            restored = False
+
+    for name, (module, saved) in snapshot.items():
+        sys.modules[name] = module
+        current = getattr(module, "__dict__", None)
+        if current is None:
+            continue
+        for key in [key for key in current if key not in saved]:
+            del current[key]
+        for key, value in saved.items():
+            if current.get(key, _MISSING) is not value:
+                current[key] = value
+
+    for name in RESEEDED_MODULES:
+        module = sys.modules.get(name)
+        if module is not None:
+            module.seed()
+    return restored
+
+
+def _describe(value):
+    if isinstance(value, types.ModuleType):
+        return f"module {value.__name__}"
+    try:
+        text = repr(value)
+    except Exception:
+        text = "<repr failed>"
+    if len(text) > MAX_REPR_CHARS:
+        text = text[:MAX_REPR_CHARS - 3] + "..."
+    return f"{type(value).__name__} = {text}"
+
+
+def _inspect(namespace):
+    # repr() may run code defined in the session, so it is contained like a job
+    lines = []
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for name, value in list(namespace.items()):
+            if not name.startswith("__"):
+                try:
+                    lines.append(f"{name}: {_describe(value)}")
+                except MemoryError:
+                    return {"ok": False, "stdout": "", "recycle": True,
+                            "stderr": "MemoryError: Code execution exceeded the memory limit\n"}
+    return {
+        "ok": True,
+        "stdout": "\n".join(lines)[:MAX_OUTPUT_CHARS],
+        "stderr": "",
+        "recycle": False,
+        "memory_mb": round(_resident_memory_bytes() / (1024 * 1024), 1),
+    }
+
+
+def _handle(job, config, namespace=None):
+    """Run one job; namespace is the persistent namespace, or None for a fresh one."""
+    try:
+        _set_cpu_budget(config["cpu_limit_seconds"])
+    except (ValueError, OSError) as e:
+        # Never run code without a CPU limit; the pool replaces the worker
+        return {"ok": False, "stdout": "", "recycle": True,
+                "stderr": f"Could not apply the CPU time limit: {e}\n"}
+    if namespace is None:
+        namespace = _new_namespace()
+    if job.get("inspect"):
+        return _inspect(namespace)
+    return _run(job["code"], namespace)
+
+
+def main():
+    config = json.loads(sys.argv[1])
+
+    # Keep the protocol streams on private descriptors
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    for module in config.get("preload", []):
+        try:
+            __import__(module)
+        except Exception:
+            pass
+
+    _apply_memory_limit(config["memory_limit_mb"])
+
+    replies.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    replies.flush()
+
+    persistent = config.get("persistent", False)
+    namespace = _new_namespace()
+    modules = None if persistent else _snapshot_modules()
+    for line in requests:
+        reply = _handle(json.loads(line), config, namespace if persistent else None)
+        if modules is not None and not _restore_modules(modules):
+            reply["recycle"] = True
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,125 @@ def sanitize_input(input_str):
     sanitized = re.sub(r'[;<>&|]', '', input_str)
     return sanitized
 
+_LEADING_WORD_BOUNDARY = re.compile(r'\\b(\w+)')
+_LETTER_OR_ESCAPE = re.compile(r'\\.|[A-Z]')
+
+
+def _literal_first(pattern):
+    r"""
+    Rewrite a leading \bword as word(?<!\wword), which matches the same text.
+
+    A regex starting with a literal is searched for at str.find speed, while
+    one starting with \b (or compiled with re.IGNORECASE) is tried at every
+    position of the input.
+    """
+    match = _LEADING_WORD_BOUNDARY.match(pattern)
+    if match is None:
+        return pattern
+    word = match.group(1)
+    return rf"{word}(?<!\w{word}){pattern[match.end():]}"
+
+
+def _lowercase_pattern(pattern):
+    r"""Lowercase the letters of a pattern, leaving escapes such as \D and \S alone."""
+    return _LETTER_OR_ESCAPE.sub(lambda m: m.group() if m.group().startswith("\\") else m.group().lower(), pattern)
+
+
+class PatternSet:
+    """
+    A fixed list of regexes, compiled once and checked together.
+
+    Each pattern is compiled in an equivalent form that starts with a
+    literal, so each search is a fast literal scan rather than an attempt at
+    every position of the input. Case-insensitive sets lowercase the input
+    once instead of compiling with re.IGNORECASE, which would rule that out.
+    """
+
+    def __init__(self, patterns, ignore_case=False):
+        """
+        Args:
+            patterns: Regular expressions, in the order they should be reported
+            ignore_case: Match regardless of case
+        """
+        self.patterns = list(patterns)
+        self.ignore_case = ignore_case
+        self._compiled = [
+            re.compile(_literal_first(_lowercase_pattern(pattern) if ignore_case else pattern))
+            for pattern in self.patterns
+        ]
+
+    def search_all(self, text):
+        """
+        Find which patterns occur in text.
+
+        Returns:
+            The matching patterns, in the order they were given
+        """
+        if self.ignore_case:
+            text = text.lower()
+        return [pattern for pattern, compiled in zip(self.patterns, self._compiled) if compiled.search(text)]
+
+
+# Common SQL injection patterns
+_DANGEROUS_SQL_PATTERNS = PatternSet([
+    r'--',                  # SQL comment
+    r'/\*.*\*/',            # Multi-line comment
+    r'\bDROP\b',             # Attempting to drop tables
+    r'\bDELETE\b.*FROM',     # Attempting to delete data
+    r'UNION.*SELECT',       # UNION-based injection
+    r'SELECT.*INTO.*OUTFILE', # File write attempt
+    r'EXEC.*xp_',           # SQL Server stored procedures
+    r'OR\s+\d+=\d+',         # Common boolean-based injection (e.g., OR 1=1)
+    r'OR\s+\d+=\s*\d+',      # More flexible boolean-based injection
+], ignore_case=True)
+
+# Modules sandboxed code may not import
+_FORBIDDEN_IMPORTS = [
+    'os', 'subprocess', 'sys', 'shutil', 'importlib',
+    'pickle', 'marshal', 'builtins', 'ctypes', 'socket'
+]
+_FORBIDDEN_IMPORT_PATTERNS = [
+    re.compile(_literal_first(rf"\b{keyword}\s+({'|'.join(_FORBIDDEN_IMPORTS)})\b"))
+    for keyword in ("import", "from")
+]
+
+# Other dangerous patterns in sandboxed code
+_DANGEROUS_CODE_PATTERNS = PatternSet([
+    r'__import__\(',
+    r'eval\(',
+    r'exec\(',
+    r'compile\(',
+    r'open\(',
+    r'file\(',
+    r'globals\(',
+    r'locals\(',
+    r'getattr\(',
+    r'setattr\(',
+    r'delattr\(',
+    r'\b__class__\b',
+    r'\b__bases__\b',
+    r'\b__subclasses__\b',
+    r'\b__mro__\b', # Added to prevent method resolution order inspection
+    r'\bmro\b',     # Added to prevent method resolution order inspection
+    r'\b__globals__\b', # Added to prevent access to global namespace
+    r'\b__builtins__\b',
+])
+
+
+def sql_violations(sql_statement):
+    """
+    Find every potentially dangerous pattern in a SQL statement.
+
+    Args:
+        sql_statement: The SQL statement to check
+
+    Returns:
+        List of reasons, most important first; empty if the statement looks safe
+    """
+    return [f"SQL statement contains potentially dangerous pattern: {pattern}"
+            for pattern in _DANGEROUS_SQL_PATTERNS.search_all(sql_statement)]
+
+
 def validate_sql(sql_statement):
     """
     Validate SQL statements to prevent SQL injection.
@@ -40,26 +159,47 @@ def validate_sql(sql_statement):
     # IMPORTANT: While this function provides a layer of defense, the primary and most robust
     # way to prevent SQL injection is to use parameterized queries (prepared statements)
     # for all database interactions, rather than concatenating user input directly into SQL strings.
-    
-    # Check for common SQL injection patterns
-    dangerous_patterns = [
-        r'--',                  # SQL comment
-        r'/\*.*\*/',            # Multi-line comment
-        r'\bDROP\b',             # Attempting to drop tables
-        r'\bDELETE\b.*FROM',     # Attempting to delete data
-        r'UNION.*SELECT',       # UNION-based injection
-        r'SELECT.*INTO.*OUTFILE', # File write attempt
-        r'EXEC.*xp_',           # SQL Server stored procedures
-        r'OR\s+\d+=\d+',         # Common boolean-based injection (e.g., OR 1=1)
-        r'OR\s+\d+=\s*\d+',      # More flexible boolean-based injection
-    ]
-    
-    for pattern in dangerous_patterns:
-        if re.search(pattern, sql_statement, re.IGNORECASE):
-            return False, f"SQL statement contains potentially dangerous pattern: {pattern}"
+    violations = sql_violations(sql_statement)
+    if violations:
+        return False, violations[0]
     
     return True, "SQL statement appears valid"
 
+def python_code_violations(code):
+    """
+    Find every forbidden import and dangerous pattern in Python code.
+
+    Args:
+        code: The Python code to check
+
+    Returns:
+        List of error messages, forbidden imports first; empty if the code looks safe
+    """
+    modules = {match.group(1) for pattern in _FORBIDDEN_IMPORT_PATTERNS for match in pattern.finditer(code)}
+    errors = [f"Error: Importing module '{module}' is not allowed for security reasons"
+              for module in _FORBIDDEN_IMPORTS if module in modules]
+    errors.extend(f"Error: Code contains potentially dangerous pattern: {pattern}"
+                  for pattern in _DANGEROUS_CODE_PATTERNS.search_all(code))
+    return errors
+
+def check_python_code(code):
+    """
+    Statically check Python code before it is executed in a sandbox.
+
+    The code is analyzed on its syntax tree (see utils.code_analysis), which
+    unlike the regex checks of python_code_violations is not fooled by names
+    in comments or attributes such as re.compile.
+    
+    Args:
+        code: The Python code to check
+        
+    Returns:
+        An error message if the code uses a forbidden module or pattern, otherwise None
+    """
+    from .code_analysis import analyze_python_code
+    errors = analyze_python_code(code)
+    return errors[0] if errors else None
+
 def sandbox_python_execution(code):
     """
     Execute Python code in a restricted sandbox environment.
@@ -76,42 +216,9 @@ def sandbox_python_execution(code):
     # For highly sensitive environments, consider more robust isolation mechanisms
     # like Docker containers, virtual machines, or dedicated sandboxing solutions.
     
-    # List of forbidden modules and functions
-    forbidden_imports = [
-        'os', 'subprocess', 'sys', 'shutil', 'importlib',
-        'pickle', 'marshal', 'builtins', 'ctypes', 'socket'
-    ]
-    
-    # Check for forbidden imports
-    for module in forbidden_imports:
-        if re.search(rf'\b(import|from)\s+{module}\b', code):
-            return f"Error: Importing module '{module}' is not allowed for security reasons"
-    
-    # Check for other dangerous patterns
-    dangerous_patterns = [
-        r'__import__\(',
-        r'eval\(',
-        r'exec\(',
-        r'compile\(',
-        r'open\(',
-        r'file\(',
-        r'globals\(',
-        r'locals\(',
-        r'getattr\(',
-        r'setattr\(',
-        r'delattr\(',
-        r'\b__class__\b',
-        r'\b__bases__\b',
-        r'\b__subclasses__\b',
-        r'\b__mro__\b', # Added to prevent method resolution order inspection
-        r'\bmro\b',     # Added to prevent method resolution order inspection
-        r'\b__globals__\b', # Added to prevent access to global namespace
-        r'\b__builtins__\b',
-    ]
-    
-    for pattern in dangerous_patterns:
-        if re.search(pattern, code):
-            return f"Error: Code contains potentially dangerous pattern: {pattern}"
+    error = check_python_code(code)
+    if error:
+        return error
     
     # Set resource limits for the execution
     def limit_resources():
@@ -0,0 +1,101 @@
+import codecs
+import re
+from collections import namedtuple
+
+# A dispatched Server-Sent Event. data is the concatenation of all data lines.
+ServerSentEvent = namedtuple("ServerSentEvent", ["event", "data", "id"])
+
+_LINE_END = re.compile(r"\r\n|\r|\n")
+
+
+class SSEDecoder:
+    """
+    Incremental decoder for a text/event-stream body.
+
+    Each chunk is scanned once: complete lines are processed as soon as
+    their line terminator arrives, and only the unterminated tail of the
+    last line is kept between chunks, so decoding is linear in the size of
+    the stream no matter how it is split into chunks. Follows the parsing
+    rules of the HTML Server-Sent Events spec: multi-line data fields are
+    joined with newlines and comment lines (keep-alives) are skipped.
+    """
+
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial_line = []
+        self._skip_newline = False
+        self._event = None
+        self._data = []
+        self._id = None
+
+    def feed(self, chunk):
+        """
+        Decode a chunk of the stream.
+
+        Args:
+            chunk: bytes or str, of any size and split at any position
+
+        Yields:
+            ServerSentEvent for every event completed by this chunk
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk)
+        if not chunk:
+            return
+
+        pos = 0
+        # A "\r\n" split across chunks must count as a single line ending
+        if self._skip_newline and chunk[0] == "\n":
+            pos = 1
+        self._skip_newline = False
+
+        for match in _LINE_END.finditer(chunk, pos):
+            self._partial_line.append(chunk[pos:match.start()])
+            line = "".join(self._partial_line)
+            self._partial_line.clear()
+            pos = match.end()
+            if match.group() == "\r" and pos == len(chunk):
+                self._skip_newline = True
+
+            event = self._process_line(line)
+            if event is not None:
+                yield event
+
+        if pos < len(chunk):
+            self._partial_line.append(chunk[pos:])
+
+    def flush(self):
+        """Dispatch a final event left unterminated when the stream ended, if any."""
+        if self._partial_line:
+            line = "".join(self._partial_line)
+            self._partial_line.clear()
+            self._process_line(line)
+        return self._dispatch()
+
+    def _process_line(self, line):
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            # Comment, used by servers as a keep-alive
+            return None
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+        return None
+
+    def _dispatch(self):
+        if not self._data:
+            self._event = None
+            return None
+        event = ServerSentEvent(self._event or "message", "\n".join(self._data), self._id)
+        self._event = None
+        self._data = []
+        return event
@@ -0,0 +1,98 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import agent_loop
+from LLM_stream import ContentDelta
+
+def tool_call(call_id, name="python_code_executor"):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments="{}"))
+
+class FakeAssistant:
+    """Replays scripted LLM replies and answers every tool call with its id."""
+
+    def __init__(self, replies, renderable=False):
+        self.replies = list(replies)
+        self.llm_calls = 0
+        self.tool_rounds = []
+        self.renderable = renderable
+
+    def call_llm(self, conversation_history):
+        self.llm_calls += 1
+        message = self.replies.pop(0)
+        conversation_history.append({"role": "assistant", "content": message.content})
+        return message
+
+    def get_tool_response(self, conn, tool_calls):
+        self.tool_rounds.append([call.id for call in tool_calls])
+        return [{"role": "tool", "tool_call_id": call.id, "name": call.function.name, "content": f"result {call.id}"}
+                for call in tool_calls]
+
+    def render_tool_responses(self, tool_responses):
+        if not self.renderable:
+            return None
+        return ", ".join(response["content"] for response in tool_responses)
+
+def reply(content=None, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls)
+
+class TestAgentLoop(unittest.TestCase):
+
+    def run_loop(self, assistant, **kwargs):
+        history = [{"role": "user", "content": "hi"}]
+        events = list(agent_loop.run(assistant, None, history, **kwargs))
+        return events, history
+
+    def test_answer_without_tools(self):
+        assistant = FakeAssistant([reply("hello")])
+        events, history = self.run_loop(assistant, render_mode="llm")
+        self.assertEqual(events[-1], agent_loop.FinalEvent("hello", 1, "answer"))
+        self.assertEqual(history[-1], {"role": "assistant", "content": "hello"})
+
+    def test_follow_up_tool_calls_are_run(self):
+        assistant = FakeAssistant([
+            reply(tool_calls=[tool_call("a"), tool_call("b")]),
+            reply(tool_calls=[tool_call("c")]),
+            reply("done"),
+        ])
+        events, history = self.run_loop(assistant, render_mode="llm")
+
+        self.assertEqual(assistant.tool_rounds, [["a", "b"], ["c"]])
+        self.assertEqual([event.type for event in events],
+                         ["tool_calls", "tool_results", "tool_calls", "tool_results", "final"])
+        self.assertEqual(events[-1], agent_loop.FinalEvent("done", 3, "answer"))
+        self.assertEqual(history[-2]["content"], agent_loop.FOLLOW_UP_PROMPT)
+
+    def test_locally_rendered_results_end_the_turn(self):
+        assistant = FakeAssistant([reply(tool_calls=[tool_call("a")])], renderable=True)
+        events, history = self.run_loop(assistant, render_mode="auto")
+
+        self.assertEqual(assistant.llm_calls, 1)
+        self.assertEqual(events[-1], agent_loop.FinalEvent("result a", 1, "rendered"))
+        self.assertEqual(history[-1], {"role": "assistant", "content": "result a"})
+
+    def test_step_budget(self):
+        assistant = FakeAssistant([reply(tool_calls=[tool_call(str(i))]) for i in range(5)])
+        events, _ = self.run_loop(assistant, render_mode="llm", max_steps=2)
+
+        self.assertEqual(assistant.llm_calls, 2)
+        self.assertEqual(events[-1], agent_loop.FinalEvent("result 1", 2, "budget"))
+
+    def test_time_budget(self):
+        assistant = FakeAssistant([reply(tool_calls=[tool_call("a")]), reply("never")])
+        events, _ = self.run_loop(assistant, render_mode="llm", time_budget=0)
+
+        self.assertEqual(assistant.llm_calls, 1)
+        self.assertEqual(events[-1].reason, "budget")
+
+    def test_stream_without_call_llm_stream_yields_content(self):
+        assistant = FakeAssistant([reply("hello")])
+        events, _ = self.run_loop(assistant, stream=True)
+        self.assertEqual(events[0], ContentDelta("hello"))
+
+if __name__ == '__main__':
+    unittest.main()
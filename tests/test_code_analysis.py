@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils import code_analysis
+from utils.code_analysis import analyze_python_code
+from utils.security import check_python_code, python_code_violations
+
+class TestCodeAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        code_analysis.clear_cache()
+
+    def test_no_false_positives_from_text(self):
+        code = (
+            "import re\n"
+            "# don't eval( anything, just profile(\n"
+            "pattern = re.compile(r'\\d+')\n"
+            "mro = 'method resolution order'\n"
+            "def profile(values):\n"
+            "    return sum(values)\n"
+            "print(profile([1, 2]), pattern.findall('a1b22'), mro)\n"
+        )
+        self.assertNotEqual(python_code_violations(code), [])
+        self.assertEqual(analyze_python_code(code), ())
+
+    def test_imports_resolved_by_module(self):
+        self.assertEqual(analyze_python_code("import math, os.path"),
+                         ("Error: Importing module 'os' is not allowed for security reasons",))
+        self.assertEqual(analyze_python_code("from sys import argv\nimport subprocess as sp"), (
+            "Error: Importing module 'subprocess' is not allowed for security reasons",
+            "Error: Importing module 'sys' is not allowed for security reasons",
+        ))
+        self.assertEqual(analyze_python_code("import osmosis\nfrom . import os"), ())
+
+    def test_builtins_referenced_without_a_call(self):
+        self.assertEqual(analyze_python_code("f = eval\nf('1')"),
+                         ("Error: Code contains potentially dangerous pattern: eval\\(",))
+
+    def test_builtins_reached_through_modules(self):
+        open_error = ("Error: Code contains potentially dangerous pattern: open\\(",)
+        self.assertEqual(analyze_python_code("import io\nio.open('/etc/hostname').read()"), open_error)
+        self.assertEqual(analyze_python_code("import codecs\nreader = codecs.open\nreader('x')"), open_error)
+        self.assertEqual(analyze_python_code("import _io\n_io.open('x')"), open_error)
+        self.assertEqual(analyze_python_code("from io import open as load\nload('x')"), open_error)
+        self.assertEqual(analyze_python_code("from functools import reduce, eval"),
+                         ("Error: Code contains potentially dangerous pattern: eval\\(",))
+        # A pattern's compile is not the compile builtin
+        self.assertEqual(analyze_python_code("import re\nre.compile('a+').findall('aa')"), ())
+
+    def test_attributes_and_strings(self):
+        self.assertEqual(analyze_python_code("().__class__.__mro__[1].__subclasses__()"), (
+            "Error: Code contains potentially dangerous pattern: \\b__class__\\b",
+            "Error: Code contains potentially dangerous pattern: \\b__subclasses__\\b",
+            "Error: Code contains potentially dangerous pattern: \\b__mro__\\b",
+        ))
+        self.assertEqual(analyze_python_code("import operator\noperator.attrgetter('__globals__')(f)"),
+                         ("Error: Code contains potentially dangerous pattern: \\b__globals__\\b",))
+        self.assertEqual(analyze_python_code("int.mro()"),
+                         ("Error: Code contains potentially dangerous pattern: \\bmro\\b",))
+
+    def test_syntax_error_falls_back_to_regex_checks(self):
+        self.assertEqual(analyze_python_code("import os +"),
+                         ("Error: Importing module 'os' is not allowed for security reasons",))
+
+    def test_check_python_code_uses_first_finding(self):
+        self.assertEqual(check_python_code("eval('1'); open('x')"),
+                         "Error: Code contains potentially dangerous pattern: eval\\(")
+        self.assertIsNone(check_python_code("print(sum(range(10)))"))
+
+    def test_verdicts_are_cached(self):
+        with patch('utils.code_analysis.ast.parse', wraps=code_analysis.ast.parse) as parse:
+            analyze_python_code("x = 1\nprint(x)")
+            analyze_python_code("x = 1\nprint(x)")
+        parse.assert_called_once()
+        self.assertEqual(code_analysis.cache_info(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_cache_key_is_the_exact_code(self):
+        # \x0c ends a line for str.splitlines() but not for Python, so the import is commented out here
+        self.assertIsNone(check_python_code("x = 1 #\x0cimport os; print(os.getcwd())"))
+        self.assertEqual(check_python_code("x = 1 #\nimport os; print(os.getcwd())"),
+                         "Error: Importing module 'os' is not allowed for security reasons")
+
+
+if __name__ == '__main__':
+    unittest.main()
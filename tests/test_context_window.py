@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+from concurrent.futures import Executor, Future
+from unittest.mock import MagicMock
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from context_window import ContextWindow, SUMMARY_PREFIX, count_message_tokens, split_turns
+
+class InlineExecutor(Executor):
+    """Runs submitted work immediately, so summaries are ready after build()."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+def conversation(turns, tool_output="x" * 4000):
+    history = [{"role": "system", "content": "system prompt"}]
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i}"})
+        history.append({"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{i}", "type": "function", "function": {"name": "postgres_sql_run", "arguments": "{}"}}]})
+        history.append({"role": "tool", "tool_call_id": f"call_{i}", "name": "postgres_sql_run", "content": tool_output})
+        history.append({"role": "user", "content": "Reformat the tool responses"})
+        history.append({"role": "assistant", "content": f"answer {i}"})
+    return history
+
+class TestContextWindow(unittest.TestCase):
+
+    def window(self, budget, summarizer=None):
+        return ContextWindow(budgets={}, default_budget=budget, summarizer=summarizer,
+                             summary_tokens=50, executor=InlineExecutor())
+
+    def test_split_turns_keeps_tool_results_with_their_call(self):
+        turns = split_turns(conversation(2)[1:])
+        self.assertEqual(len(turns), 2)
+        self.assertEqual([m["role"] for m in turns[0]], ["user", "assistant", "tool", "user", "assistant"])
+
+    def test_history_within_budget_is_sent_unchanged(self):
+        history = conversation(3)
+        self.assertEqual(self.window(100000).build(history, "model"), history)
+
+    def test_old_tool_results_are_compacted_first(self):
+        history = conversation(3)
+        window = self.window(2500).build(history, "model")
+
+        self.assertEqual(len(window), len(history))
+        self.assertIn("tool output omitted", window[3]["content"])
+        # The latest turn is sent verbatim
+        self.assertEqual(window[-3]["content"], history[-3]["content"])
+        # The stored history is untouched
+        self.assertEqual(history[3]["content"], "x" * 4000)
+
+    def test_old_turns_are_replaced_by_summary(self):
+        summarizer = MagicMock(return_value="they asked questions 0 to 7")
+        history = conversation(10)
+        budget = 1500
+        context = self.window(budget, summarizer)
+
+        # The first build schedules the summary, later ones use it
+        context.build(history, "model")
+        window = context.build(history, "model")
+
+        self.assertEqual(window[0], history[0])
+        self.assertEqual(window[1], {"role": "system", "content": SUMMARY_PREFIX + "they asked questions 0 to 7"})
+        self.assertEqual(window[-1], history[-1])
+        self.assertLessEqual(sum(count_message_tokens(m) for m in window), budget)
+        self.assertEqual(summarizer.call_count, 1)
+
+    def test_rolling_summary_only_summarizes_new_turns(self):
+        summarizer = MagicMock(side_effect=lambda previous, messages: f"{previous}+{len(messages)}")
+        history = conversation(10)
+        context = self.window(1500, summarizer)
+        context.build(history, "model")
+
+        history += conversation(2)[1:]
+        context.build(history, "model")
+
+        first_summary = summarizer.side_effect(None, summarizer.call_args_list[0][0][1])
+        previous, messages = summarizer.call_args[0]
+        self.assertEqual(previous, first_summary)
+        # Two more turns of five messages each were dropped
+        self.assertEqual(len(messages), 10)
+
+    def test_per_model_budget(self):
+        context = ContextWindow(budgets={"small": 10}, default_budget=100000, summarizer=None)
+        history = conversation(3)
+        self.assertEqual(context.build(history, "large"), history)
+        self.assertLess(len(context.build(history, "small")), len(history))
+
+if __name__ == '__main__':
+    unittest.main()
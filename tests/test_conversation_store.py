@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from conversation_store import (
+    SQLiteConversationStore,
+    ReplitConversationStore,
+    migrate_replit_conversations
+)
+
+class FakeReplitDB(dict):
+    """Minimal stand-in for replit.db: a dict with set() and prefix()."""
+
+    def set(self, key, value):
+        self[key] = value
+
+    def prefix(self, prefix):
+        return tuple(key for key in self if key.startswith(prefix))
+
+class TestConversationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "conversations.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append_and_load(self):
+        store = SQLiteConversationStore(self.db_path)
+        self.assertIsNone(store.load("c1"))
+
+        store.append("c1", [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}])
+        store.append("c1", [{"role": "assistant", "content": "hello"}])
+        store.append("c2", [{"role": "user", "content": "other"}])
+
+        self.assertEqual(store.load("c1"), [
+            {"role": "system", "content": "sys"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "hello"},
+        ])
+        self.assertEqual(len(store.load("c2")), 1)
+
+        # Appends are persisted, not held in memory
+        self.assertEqual(len(SQLiteConversationStore(self.db_path).load("c1")), 3)
+
+        store.delete("c1")
+        self.assertIsNone(store.load("c1"))
+
+    def test_append_writes_only_new_rows(self):
+        store = SQLiteConversationStore(self.db_path)
+        store.append("c1", [{"role": "user", "content": str(i)} for i in range(5)])
+        store.append("c1", [{"role": "user", "content": "5"}])
+
+        count = store._connection().execute("SELECT COUNT(*) FROM conversation_messages").fetchone()[0]
+        self.assertEqual(count, 6)
+
+    def test_lazy_migration_from_legacy_store(self):
+        replit_db = FakeReplitDB({"conversation_old": [{"role": "user", "content": "from replit"}]})
+        store = SQLiteConversationStore(self.db_path, legacy_store=ReplitConversationStore(replit_db))
+
+        self.assertEqual(store.load("old"), [{"role": "user", "content": "from replit"}])
+        store.append("old", [{"role": "assistant", "content": "reply"}])
+
+        self.assertEqual(len(SQLiteConversationStore(self.db_path).load("old")), 2)
+        # The legacy key is left untouched
+        self.assertEqual(len(replit_db["conversation_old"]), 1)
+
+    def test_bulk_migration(self):
+        replit_db = FakeReplitDB({
+            "conversation_a": [{"role": "user", "content": "a"}],
+            "conversation_b": [{"role": "user", "content": "b"}],
+            "unrelated_key": "value",
+        })
+        store = SQLiteConversationStore(self.db_path)
+
+        migrated = migrate_replit_conversations(ReplitConversationStore(replit_db), store)
+        self.assertEqual(migrated, 2)
+        self.assertEqual(store.load("b"), [{"role": "user", "content": "b"}])
+
+        # Re-running skips conversations that already exist
+        self.assertEqual(migrate_replit_conversations(ReplitConversationStore(replit_db), store), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils.deadline import current_deadline, remaining, request_deadline
+
+class TestDeadline(unittest.TestCase):
+
+    def test_no_deadline(self):
+        self.assertIsNone(current_deadline())
+        self.assertEqual(remaining(7), 7)
+        with request_deadline(0) as deadline:
+            self.assertIsNone(deadline)
+
+    def test_scope_and_nesting(self):
+        with request_deadline(10) as outer:
+            self.assertIs(current_deadline(), outer)
+            self.assertLessEqual(remaining(), 10)
+            # A nested deadline can only shorten the enclosing one
+            with request_deadline(60) as inner:
+                self.assertIs(inner, outer)
+            with request_deadline(1) as inner:
+                self.assertIsNot(inner, outer)
+                self.assertLessEqual(remaining(), 1)
+            self.assertIs(current_deadline(), outer)
+        self.assertIsNone(current_deadline())
+
+    def test_visible_in_copied_context(self):
+        with request_deadline(10) as deadline, ThreadPoolExecutor(1) as executor:
+            seen = executor.submit(contextvars.copy_context().run, current_deadline).result()
+        self.assertIs(seen, deadline)
+
+    def test_callback_runs_when_deadline_passes(self):
+        fired = threading.Event()
+        with request_deadline(0.05) as deadline:
+            with deadline.on_expire(fired.set):
+                self.assertTrue(fired.wait(2))
+            self.assertTrue(deadline.expired())
+
+    def test_callback_not_run_after_block(self):
+        calls = []
+        with request_deadline(0.05) as deadline:
+            with deadline.on_expire(lambda: calls.append(1)):
+                pass
+            time.sleep(0.1)
+        self.assertEqual(calls, [])
+
+    def test_expire_runs_callbacks(self):
+        calls = []
+        with request_deadline(60) as deadline:
+            with deadline.on_expire(lambda: calls.append(1)):
+                deadline.expire()
+            self.assertEqual(remaining(), 0)
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
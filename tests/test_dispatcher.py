@@ -0,0 +1,149 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from concurrent.futures import ThreadPoolExecutor
+from tools.dispatcher import ToolDispatcher
+from tools.registry import ToolRegistry
+from tools import sql_postgres
+from utils.deadline import current_deadline
+
+def make_call(call_id, name, **args):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+class TestToolDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=False)
+
+    def dispatcher(self, mapping, default_timeout=5):
+        return ToolDispatcher(ToolRegistry(mapping, []), executor=self.executor, default_timeout=default_timeout)
+
+    def test_parallel_safe_calls_overlap_and_keep_order(self):
+        def slow(value, delay):
+            time.sleep(delay)
+            return value
+
+        dispatcher = self.dispatcher({"slow": {"function": slow, "parallel_safe": True}})
+        calls = [make_call("a", "slow", value="first", delay=0.3),
+                 make_call("b", "slow", value="second", delay=0.1),
+                 make_call("c", "slow", value="third", delay=0.2)]
+
+        start = time.monotonic()
+        responses = dispatcher.dispatch(None, calls)
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual([r["tool_call_id"] for r in responses], ["a", "b", "c"])
+        self.assertEqual([r["content"] for r in responses], ["first", "second", "third"])
+
+    def test_unsafe_call_is_a_barrier(self):
+        events = []
+        def read(label):
+            time.sleep(0.05)
+            events.append(label)
+            return label
+        def write(label):
+            events.append(label)
+            return label
+
+        dispatcher = self.dispatcher({
+            "read": {"function": read, "parallel_safe": True},
+            "write": {"function": write},
+        })
+        dispatcher.dispatch(None, [make_call("1", "read", label="r1"), make_call("2", "write", label="w"),
+                                   make_call("3", "read", label="r2")])
+
+        self.assertEqual(events, ["r1", "w", "r2"])
+
+    def test_unsafe_calls_run_on_caller_thread_with_request_connection(self):
+        conn = MagicMock()
+        seen = {}
+        def factory(bound_conn):
+            def run(sql_statements):
+                seen[sql_statements] = (bound_conn, threading.current_thread())
+                return "ok"
+            return run
+
+        dispatcher = self.dispatcher({"sql": {"function": factory, "bind_connection": True,
+                                              "parallel_safe": sql_postgres.is_read_only}})
+        dispatcher.dispatch(conn, [make_call("1", "sql", sql_statements="SELECT 1"),
+                                   make_call("2", "sql", sql_statements="INSERT INTO t VALUES (1)")])
+
+        # Reads lease their own connection on a pool thread
+        self.assertIsNone(seen["SELECT 1"][0])
+        self.assertIsNot(seen["SELECT 1"][1], threading.current_thread())
+        self.assertEqual(seen["INSERT INTO t VALUES (1)"], (conn, threading.current_thread()))
+
+    def test_timeout_and_errors(self):
+        def hang():
+            time.sleep(1)
+        def fail():
+            raise ValueError("boom")
+
+        dispatcher = self.dispatcher({
+            "hang": {"function": hang, "parallel_safe": True, "timeout": 0.1},
+            "fail": {"function": fail, "parallel_safe": True},
+        })
+        responses = dispatcher.dispatch(None, [make_call("1", "hang"), make_call("2", "fail"),
+                                               make_call("3", "missing")])
+
+        self.assertEqual(responses[0]["content"], "Error: Tool hang timed out after 0.1 seconds")
+        self.assertEqual(responses[1]["content"], "Error executing tool fail: boom")
+        self.assertEqual(responses[2]["content"], "Error: Tool 'missing' not found in current mapping.")
+
+    def test_timed_out_call_is_cancelled_through_its_deadline(self):
+        stopped = threading.Event()
+        def hang():
+            # Like run_sql, which cancels its statement when the deadline expires
+            with current_deadline().on_expire(stopped.set):
+                stopped.wait(5)
+            return "stopped"
+
+        dispatcher = self.dispatcher({"hang": {"function": hang, "parallel_safe": True, "timeout": 0.1}})
+        responses = dispatcher.dispatch(None, [make_call("1", "hang")])
+
+        self.assertEqual(responses[0]["content"], "Error: Tool hang timed out after 0.1 seconds")
+        self.assertTrue(stopped.wait(1))
+
+    def test_timed_out_call_that_has_not_started_is_cancelled(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        ran = []
+        def block():
+            release.wait(5)
+        def late():
+            ran.append(True)
+
+        dispatcher = ToolDispatcher(ToolRegistry({
+            "block": {"function": block, "parallel_safe": True, "timeout": 0.1},
+            "late": {"function": late, "parallel_safe": True, "timeout": 0.1},
+        }, []), executor=executor)
+        responses = dispatcher.dispatch(None, [make_call("1", "block"), make_call("2", "late")])
+        release.set()
+        executor.shutdown(wait=True)
+
+        self.assertEqual(responses[1]["content"], "Error: Tool late timed out after 0.1 seconds")
+        self.assertEqual(ran, [])
+
+    def test_is_read_only(self):
+        self.assertTrue(sql_postgres.is_read_only("SELECT * FROM t LIMIT 10; SELECT 1"))
+        self.assertTrue(sql_postgres.is_read_only("WITH x AS (SELECT 1) SELECT * FROM x"))
+        self.assertFalse(sql_postgres.is_read_only("SELECT 1; DELETE FROM t"))
+        self.assertFalse(sql_postgres.is_read_only("SELECT * INTO t2 FROM t"))
+        self.assertFalse(sql_postgres.is_read_only("SELECT * FROM t FOR UPDATE"))
+        self.assertFalse(sql_postgres.is_read_only(""))
+
+if __name__ == '__main__':
+    unittest.main()
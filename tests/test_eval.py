@@ -1,3 +1,4 @@
+import importlib
 import unittest
 import sys
 import os
@@ -6,7 +7,9 @@ from unittest.mock import patch, MagicMock
 # Add the src directory to the Python path to allow imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from tools.eval import execute_python_code
+from tools.eval import (execute_python_code, inspect_python_session, is_deterministic, is_parallel_safe,
+                        reset_python_session)
+from utils.sandbox_kernels import conversation_scope
 from utils.config import Config # Corrected import
 from utils.security import sandbox_python_execution # Explicitly import for mocking
 
@@ -20,6 +23,7 @@ class TestEval(unittest.TestCase):
 
     @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
     @patch('utils.config.Config.SANDBOX_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_WORKER_POOL', False)
     @patch('tools.eval.sandbox_python_execution') # Corrected patch path
     def test_execute_python_code_with_sandbox(self, mock_sandbox_execution):
         mock_sandbox_execution.return_value = "Sandbox output"
@@ -35,6 +39,17 @@ class TestEval(unittest.TestCase):
         result = execute_python_code(code)
         self.assertEqual(result, "912011570760843079616")
 
+    @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_WORKER_POOL', True)
+    @patch('tools.eval.get_sandbox_pool')
+    def test_execute_python_code_with_worker_pool(self, mock_get_pool):
+        mock_get_pool.return_value.execute.return_value = "Pool output\n"
+        code = "print('hello from pool')"
+        result = execute_python_code(code)
+        self.assertEqual(result, "Pool output")
+        mock_get_pool.return_value.execute.assert_called_once_with(code)
+
     @patch('utils.Config.ENABLE_CODE_EXECUTION', True)
     @patch('utils.Config.SANDBOX_EXECUTION', False)
     def test_execute_python_code_legacy_method_success(self):
@@ -49,5 +64,56 @@ class TestEval(unittest.TestCase):
         result = execute_python_code(code)
         self.assertIn("Error: test error", result)
 
+    @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_STATEFUL', True)
+    @patch('tools.eval.get_sandbox_pool')
+    @patch('tools.eval.get_kernel_manager')
+    def test_stateful_execution_uses_conversation_session(self, mock_get_manager, mock_get_pool):
+        mock_get_manager.return_value.execute.return_value = "Session output\n"
+        mock_get_pool.return_value.execute.return_value = "Pool output\n"
+        with conversation_scope("conv-1"):
+            self.assertEqual(execute_python_code("x = 1"), "Session output")
+        mock_get_manager.return_value.execute.assert_called_once_with("conv-1", "x = 1")
+        # Outside of a conversation there is no session to keep
+        self.assertEqual(execute_python_code("print(1)"), "Pool output")
+        self.assertFalse(is_parallel_safe("print(1)"))
+        self.assertFalse(is_deterministic("print(1)"))
+
+    @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_STATEFUL', True)
+    @patch('tools.eval.get_kernel_manager')
+    def test_session_tools(self, mock_get_manager):
+        manager = mock_get_manager.return_value
+        manager.inspect.return_value = None
+        manager.reset.return_value = True
+        with conversation_scope("conv-1"):
+            self.assertIn("No Python session is running", inspect_python_session())
+            self.assertEqual(reset_python_session(), "The Python session was reset; all variables were cleared.")
+        manager.reset.assert_called_once_with("conv-1")
+        self.assertEqual(inspect_python_session(),
+                         "Persistent Python sessions are only available within a conversation.")
+
+    @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_STATEFUL', False)
+    def test_session_tools_disabled(self):
+        with conversation_scope("conv-1"):
+            self.assertIn("SANDBOX_STATEFUL=true", reset_python_session())
+
+    def test_session_tools_registered_only_when_stateful(self):
+        import assistant_v4
+        try:
+            for stateful in (False, True):
+                with patch('utils.config.Config.SANDBOX_STATEFUL', stateful):
+                    importlib.reload(assistant_v4)
+                names = {tool["function"]["name"] for tool in assistant_v4.TOOLS}
+                prompt = assistant_v4.TOOL_MAPPING["python_code_executor"]["system_prompt"]
+                self.assertEqual("python_session_inspect" in names, stateful)
+                self.assertEqual("python_session_reset" in assistant_v4.TOOL_MAPPING, stateful)
+                self.assertEqual("kept for later calls" in prompt, stateful)
+        finally:
+            importlib.reload(assistant_v4)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import asyncio
+from unittest.mock import patch
+
+import httpx
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import LLM_client
+from LLM_client import LLMClient, async_http_client, get_llm_client, get_transport, http_client
+
+# The OpenAI client refuses to initialise without an API key
+with patch('utils.Config.OPENROUTER_API_KEY', 'test-key'):
+    import LLM_client_openrouter
+import LLM_client_ollama
+
+
+class TestSharedTransport(unittest.TestCase):
+
+    def test_sync_clients_share_one_transport(self):
+        transport = get_transport()
+        self.assertIs(get_transport(), transport)
+        self.assertIs(http_client()._transport, transport)
+        self.assertIs(LLM_client_openrouter._http._transport, transport)
+        self.assertIs(LLM_client_openrouter.client._client, LLM_client_openrouter._http)
+        self.assertIs(LLM_client_ollama.get_client()._client._transport, transport)
+        self.assertIs(LLM_client_ollama.get_client(), LLM_client_ollama.get_client())
+
+    def test_async_transport_per_loop(self):
+        async def transports():
+            first = async_http_client()._transport
+            second = LLM_client_ollama.get_async_client()._client._transport
+            openrouter = LLM_client_openrouter._async_client()[1]._transport
+            return first, second, openrouter
+
+        first = asyncio.run(transports())
+        self.assertIs(first[0], first[1])
+        self.assertIs(first[0], first[2])
+        self.assertIsInstance(first[0], httpx.AsyncHTTPTransport)
+
+        second = asyncio.run(transports())
+        self.assertIsNot(second[0], first[0])
+
+    def test_transport_pool_limits_from_config(self):
+        with patch.object(LLM_client, '_transport', None), \
+             patch('utils.Config.LLM_HTTP_MAX_CONNECTIONS', 3):
+            transport = get_transport()
+        self.assertEqual(transport._pool._max_connections, 3)
+
+
+class TestGetLLMClient(unittest.TestCase):
+
+    @patch('utils.Config.LLM_FAILOVER', False)
+    @patch('utils.Config.LLM_HEDGE_AFTER', 0)
+    def test_configured_provider(self):
+        with patch('utils.Config.USE_OPEN_ROUTER', True):
+            self.assertIs(get_llm_client(), LLM_client_openrouter.CLIENT)
+        with patch('utils.Config.USE_OPEN_ROUTER', False):
+            self.assertIs(get_llm_client(), LLM_client_ollama.CLIENT)
+
+    def test_clients_implement_interface(self):
+        for client in (get_llm_client("openrouter"), get_llm_client("ollama")):
+            self.assertIsInstance(client, LLMClient)
+
+    def test_incomplete_client_cannot_be_created(self):
+        class SyncOnlyClient(LLMClient):
+            def call_llm(self, conversation_history, tools):
+                return None
+
+        with self.assertRaises(TypeError):
+            SyncOnlyClient()
+
+    def test_unknown_provider(self):
+        with self.assertRaises(ValueError):
+            get_llm_client("nope")
+
+    def test_ollama_async_call(self):
+        response = LLM_client_ollama.ollama.ChatResponse(
+            model="m", message=LLM_client_ollama.ollama.Message(role="assistant", content="hi"))
+        history = [{"role": "user", "content": "hello"}]
+
+        async def call():
+            client = LLM_client_ollama.get_async_client()
+            with patch.object(client, 'chat', return_value=response):
+                return await LLM_client_ollama.CLIENT.acall_llm(history, [])
+
+        message = asyncio.run(call())
+        self.assertEqual(message.content, "hi")
+        self.assertEqual(history[-1]["content"], "hi")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import unittest
+import sys
+import os
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from LLM_client import LLMClient
+from LLM_router import LLMRouter, ProviderError, ProviderStats, CLOSED, OPEN, HALF_OPEN
+from LLM_stream import ContentDelta, MessageDone
+from utils.deadline import current_deadline, request_deadline
+
+
+class FakeClient(LLMClient):
+    """Replies with its own name after delay seconds, or fails."""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.model = f"{name}-model"
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def _reply(self, conversation_history):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        conversation_history.append({"role": "assistant", "content": self.name})
+        return SimpleNamespace(content=self.name)
+
+    def call_llm(self, conversation_history, tools):
+        return self._reply(conversation_history)
+
+    def complete(self, messages):
+        return self._reply(list(messages))
+
+    def call_llm_stream(self, conversation_history, tools=None):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        yield ContentDelta(self.name)
+        conversation_history.append({"role": "assistant", "content": self.name})
+        yield MessageDone(self.name)
+
+    async def acall_llm(self, conversation_history, tools):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        conversation_history.append({"role": "assistant", "content": self.name})
+        return SimpleNamespace(content=self.name)
+
+    async def acomplete(self, messages):
+        return await self.acall_llm(list(messages), None)
+
+    async def acall_llm_stream(self, conversation_history, tools=None):
+        for event in self.call_llm_stream(conversation_history, tools):
+            yield event
+
+
+class TestProviderStats(unittest.TestCase):
+
+    def test_percentiles_and_error_rate(self):
+        stats = ProviderStats("p:m", window=200)
+        for latency in range(1, 101):
+            stats.record(latency / 100, True)
+        stats.record(5.0, False)
+
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["calls"], 101)
+        self.assertAlmostEqual(snapshot["p50"], 0.51)
+        self.assertAlmostEqual(snapshot["p95"], 0.95)
+        self.assertAlmostEqual(snapshot["error_rate"], 1 / 101)
+
+    def test_breaker_opens_and_probes(self):
+        stats = ProviderStats("p:m", failure_threshold=2, reset_timeout=0.05)
+        stats.record(1.0, False)
+        self.assertTrue(stats.allow())
+        stats.record(1.0, False)
+        self.assertEqual(stats.state, OPEN)
+        self.assertFalse(stats.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(stats.allow())
+        self.assertEqual(stats.state, HALF_OPEN)
+        # Only one probe at a time
+        self.assertFalse(stats.allow())
+        stats.record(0.1, True)
+        self.assertEqual(stats.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        stats = ProviderStats("p:m", failure_threshold=1, reset_timeout=0.0)
+        stats.record(1.0, False)
+        self.assertTrue(stats.allow())
+        stats.record(1.0, False)
+        self.assertEqual(stats.state, OPEN)
+
+
+class TestLLMRouter(unittest.TestCase):
+
+    def test_uses_first_provider(self):
+        primary, fallback = FakeClient("openrouter"), FakeClient("ollama")
+        router = LLMRouter([primary, fallback], hedge_after=0, failure_threshold=3, reset_timeout=30)
+        history = [{"role": "user", "content": "hi"}]
+
+        self.assertEqual(router.call_llm(history, []).content, "openrouter")
+        self.assertEqual(history[-1]["content"], "openrouter")
+        self.assertEqual(fallback.calls, 0)
+        self.assertEqual(router.stats()["openrouter:openrouter-model"]["calls"], 1)
+
+    def test_fails_over_and_opens_circuit(self):
+        primary, fallback = FakeClient("openrouter", fail=True), FakeClient("ollama")
+        router = LLMRouter([primary, fallback], hedge_after=0, failure_threshold=2, reset_timeout=30)
+        history = [{"role": "user", "content": "hi"}]
+
+        for _ in range(3):
+            self.assertEqual(router.call_llm(history, []).content, "ollama")
+
+        # The failed attempts left no trace in the history
+        self.assertEqual([m["content"] for m in history], ["hi", "ollama", "ollama", "ollama"])
+        # After two failures the circuit is open and the primary is skipped
+        self.assertEqual(primary.calls, 2)
+        stats = router.stats()["openrouter:openrouter-model"]
+        self.assertEqual(stats["state"], OPEN)
+        self.assertEqual(stats["error_rate"], 1.0)
+
+    def test_error_strings_count_as_failures(self):
+        class ErrorString(FakeClient):
+            def call_llm(self, conversation_history, tools):
+                return "Error calling Ollama API: model not found"
+
+        router = LLMRouter([ErrorString("ollama"), FakeClient("openrouter")], hedge_after=0,
+                           failure_threshold=3, reset_timeout=30)
+        self.assertEqual(router.call_llm([], []).content, "openrouter")
+
+    def test_all_providers_fail(self):
+        router = LLMRouter([FakeClient("openrouter", fail=True), FakeClient("ollama", fail=True)],
+                           hedge_after=0, failure_threshold=1, reset_timeout=30)
+        with self.assertRaises(ProviderError):
+            router.call_llm([], [])
+        with self.assertRaisesRegex(ProviderError, "circuits are open"):
+            router.call_llm([], [])
+
+    def test_hedges_slow_primary(self):
+        primary, hedge = FakeClient("openrouter", delay=0.5), FakeClient("ollama", delay=0.01)
+        router = LLMRouter([primary, hedge], hedge_after=0.05, failure_threshold=3, reset_timeout=30)
+        history = [{"role": "user", "content": "hi"}]
+
+        start = time.monotonic()
+        self.assertEqual(router.call_llm(history, []).content, "ollama")
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(history[-1]["content"], "ollama")
+        self.assertEqual(len(history), 2)
+
+    def test_hedged_calls_run_in_the_callers_context(self):
+        seen = []
+
+        class DeadlineClient(FakeClient):
+            def call_llm(self, conversation_history, tools):
+                seen.append(current_deadline())
+                return super().call_llm(conversation_history, tools)
+
+        primary, hedge = DeadlineClient("openrouter", delay=0.3), DeadlineClient("ollama")
+        router = LLMRouter([primary, hedge], hedge_after=0.05, failure_threshold=3, reset_timeout=30)
+        with request_deadline(10) as deadline:
+            router.call_llm([], [])
+        self.assertEqual(seen, [deadline, deadline])
+
+    @patch('utils.config.Config.LLM_HEDGE_WORKERS', 7)
+    def test_hedge_pool_size_from_config(self):
+        router = LLMRouter([FakeClient("openrouter"), FakeClient("ollama")], hedge_after=0.05)
+        self.assertEqual(router._get_executor()._max_workers, 7)
+        router._get_executor().shutdown()
+
+    def test_no_hedge_when_primary_is_fast(self):
+        primary, hedge = FakeClient("openrouter"), FakeClient("ollama")
+        router = LLMRouter([primary, hedge], hedge_after=0.2, failure_threshold=3, reset_timeout=30)
+
+        self.assertEqual(router.complete([]).content, "openrouter")
+        self.assertEqual(hedge.calls, 0)
+
+    def test_stream_fails_over_before_first_event(self):
+        router = LLMRouter([FakeClient("openrouter", fail=True), FakeClient("ollama")], hedge_after=0,
+                           failure_threshold=3, reset_timeout=30)
+        history = []
+
+        events = list(router.call_llm_stream(history))
+
+        self.assertEqual(events, [ContentDelta("ollama"), MessageDone("ollama")])
+        self.assertEqual(history, [{"role": "assistant", "content": "ollama"}])
+
+    def test_async_hedge(self):
+        primary, hedge = FakeClient("openrouter", delay=0.5), FakeClient("ollama", delay=0.01)
+        router = LLMRouter([primary, hedge], hedge_after=0.05, failure_threshold=3, reset_timeout=30)
+        history = []
+
+        self.assertEqual(asyncio.run(router.acall_llm(history, [])).content, "ollama")
+        self.assertEqual(history, [{"role": "assistant", "content": "ollama"}])
+        # The cancelled primary call does not count as a failure
+        self.assertEqual(router.stats()["openrouter:openrouter-model"]["error_rate"], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
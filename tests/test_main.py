@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import agent_loop
+import main
+
+
+def failing_run(*args, **kwargs):
+    raise RuntimeError("LLM unavailable")
+    yield
+
+
+class TestHandleRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = MagicMock()
+        patcher = patch('main.get_conversation_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('main.assistant', MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reply_is_saved(self):
+        history = [{"role": "system", "content": "prompt"}]
+
+        def run(assistant, conn, conversation_history, **kwargs):
+            conversation_history.append({"role": "assistant", "content": "hello"})
+            yield agent_loop.FinalEvent("hello", 1, "answer")
+
+        with patch('main.agent_loop.run', run):
+            self.assertEqual(main._handle_request(None, "hi", "conv-1", history), "hello")
+        self.store.append.assert_called_once_with(
+            "conv-1", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+
+    def test_failed_turn_is_an_error_and_not_saved(self):
+        history = [{"role": "system", "content": "prompt"}]
+        with patch('main.agent_loop.run', failing_run):
+            self.assertEqual(main._handle_request(None, "hi", "conv-1", history),
+                             ("An unexpected error occurred while handling the request", 500))
+        self.store.append.assert_not_called()
+
+    def test_failed_stream_is_not_saved(self):
+        history = [{"role": "system", "content": "prompt"}]
+        with patch('main.agent_loop.run', failing_run):
+            events = list(main._stream_request(None, "hi", "conv-1", history))
+        self.assertTrue(events[-1].startswith("event: error"))
+        self.store.append.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from tools.eval import execute_python_code
+from utils.output_capture import ContextStdout, capture_stdout
+
+class TestOutputCapture(unittest.TestCase):
+
+    def test_captures_only_own_context(self):
+        with capture_stdout() as outer:
+            print("outer")
+            with capture_stdout() as inner:
+                print("inner")
+            print("outer again")
+        self.assertIsInstance(sys.stdout, ContextStdout)
+        self.assertEqual(inner.getvalue(), "inner\n")
+        self.assertEqual(outer.getvalue(), "outer\nouter again\n")
+
+    def test_other_threads_are_not_captured(self):
+        started = threading.Event()
+        finish = threading.Event()
+
+        def chatter():
+            started.set()
+            while not finish.is_set():
+                print("noise")
+
+        thread = threading.Thread(target=chatter)
+        with capture_stdout() as output:
+            thread.start()
+            started.wait()
+            print("mine")
+            finish.set()
+            thread.join()
+        self.assertEqual(output.getvalue(), "mine\n")
+
+    def test_concurrent_captures(self):
+        barrier = threading.Barrier(4)
+
+        def run(index):
+            with capture_stdout() as output:
+                # Make sure all four captures are open at the same time
+                barrier.wait()
+                for _ in range(100):
+                    print(index)
+            return output.getvalue()
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(run, range(4)))
+        for index, result in enumerate(results):
+            self.assertEqual(result, f"{index}\n" * 100)
+
+    @patch('utils.config.Config.ENABLE_CODE_EXECUTION', True)
+    @patch('utils.config.Config.SANDBOX_EXECUTION', False)
+    def test_concurrent_legacy_executions(self):
+        code = "for i in range(200):\n    print({n})"
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda n: execute_python_code(code.format(n=n)), range(8)))
+        for n, result in enumerate(results):
+            self.assertEqual(result, "\n".join([str(n)] * 200))
+
+if __name__ == '__main__':
+    unittest.main()
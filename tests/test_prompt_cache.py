@@ -0,0 +1,43 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import prompt_cache
+from context_window import count_message_tokens
+
+class TestPromptCache(unittest.TestCase):
+
+    @patch('utils.Config.PROMPT_CACHE_CONTROL', False)
+    def test_system_message_puts_stable_text_first(self):
+        message = prompt_cache.system_message("tools\n", "time: 12:00\n")
+        self.assertEqual(message, {"role": "system", "content": "tools\ntime: 12:00\n"})
+
+    @patch('utils.Config.PROMPT_CACHE_CONTROL', True)
+    @patch('utils.Config.USE_OPEN_ROUTER', True)
+    def test_system_message_with_cache_control(self):
+        message = prompt_cache.system_message("tools\n", "time: 12:00\n")
+        self.assertEqual(message["content"][0], {"type": "text", "text": "tools\n", "cache_control": {"type": "ephemeral"}})
+        self.assertEqual(message["content"][1], {"type": "text", "text": "time: 12:00\n"})
+        # Content blocks are counted like the equivalent string
+        self.assertEqual(count_message_tokens(message),
+                         count_message_tokens({"role": "system", "content": "tools\ntime: 12:00\n"}))
+
+    @patch('utils.Config.PROMPT_CACHE_CONTROL', True)
+    @patch('utils.Config.USE_OPEN_ROUTER', False)
+    def test_cache_control_is_only_sent_to_open_router(self):
+        self.assertIsInstance(prompt_cache.system_message("a", "b")["content"], str)
+
+    def test_record_usage_keeps_totals(self):
+        before = prompt_cache.usage_stats()
+        prompt_cache.record_usage(1000, 800)
+        totals = prompt_cache.record_usage(500, None)
+        self.assertEqual(totals["calls"] - before["calls"], 2)
+        self.assertEqual(totals["prompt_tokens"] - before["prompt_tokens"], 1500)
+        self.assertEqual(totals["cached_tokens"] - before["cached_tokens"], 800)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from tools.registry import PromptFragment, ToolRegistry
+
+class TestToolRegistry(unittest.TestCase):
+
+    def test_fragment_renders_once_per_version(self):
+        version = [1]
+        render = MagicMock(side_effect=lambda conn: f"schema v{version[0]}")
+        fragment = PromptFragment(render, version=lambda conn: version[0])
+
+        self.assertEqual(fragment.get(), "schema v1")
+        self.assertEqual(fragment.get(), "schema v1")
+        self.assertEqual(render.call_count, 1)
+
+        version[0] = 2
+        self.assertEqual(fragment.get(), "schema v2")
+        self.assertEqual(render.call_count, 2)
+
+    def test_fragment_invalidate_forces_rerender(self):
+        render = MagicMock(return_value="text")
+        fragment = PromptFragment(render)
+        fragment.get()
+        fragment.invalidate()
+        fragment.get()
+        self.assertEqual(render.call_count, 2)
+
+    def test_dispatch_does_not_render_prompts(self):
+        render = MagicMock(return_value="dynamic prompt\n")
+        run_sql = MagicMock()
+        registry = ToolRegistry({
+            "static": {"function": len, "system_prompt": "static prompt\n"},
+            "sql": {"function": run_sql, "bind_connection": True,
+                    "system_prompt": PromptFragment(render)},
+        }, tools=[])
+
+        conn = MagicMock()
+        self.assertIs(registry.get_function("static", conn), len)
+        registry.get_function("sql", conn)
+        run_sql.assert_called_once_with(conn)
+        self.assertIsNone(registry.get_function("missing"))
+        render.assert_not_called()
+
+        self.assertEqual(registry.system_prompt(conn), "static prompt\ndynamic prompt\n")
+        render.assert_called_once_with(conn)
+
+    def test_system_prompt_orders_segments_by_stability(self):
+        registry = ToolRegistry({
+            "schema": {"function": len, "system_prompt": PromptFragment(lambda conn: "schema\n", segment="data")},
+            "code": {"function": len, "system_prompt": PromptFragment(lambda conn: "code\n", segment="code")},
+            "static": {"function": len, "system_prompt": "static\n"},
+        }, tools=[])
+        self.assertEqual(registry.system_prompt(), "static\ncode\nschema\n")
+
+        with self.assertRaises(ValueError):
+            PromptFragment(len, segment="volatile")
+
+    def test_deterministic_flag(self):
+        registry = ToolRegistry({
+            "fixed": {"function": len, "deterministic": True},
+            "checked": {"function": len, "deterministic": lambda code: "random" not in code},
+            "default": {"function": len},
+        }, [])
+
+        self.assertTrue(registry.is_deterministic("fixed", {}))
+        self.assertTrue(registry.is_deterministic("checked", {"code": "print(1)"}))
+        self.assertFalse(registry.is_deterministic("checked", {"code": "random.random()"}))
+        self.assertFalse(registry.is_deterministic("checked", {"unexpected": 1}))
+        self.assertFalse(registry.is_deterministic("default", {}))
+        self.assertFalse(registry.is_deterministic("unknown", {}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from tools import renderers
+from tools.registry import ToolRegistry
+from tools.sql_postgres import format_run_sql_result_as_md
+
+class TestRenderers(unittest.TestCase):
+
+    def test_sql_table(self):
+        content = format_run_sql_result_as_md([
+            {"name": "Alice", "amount": 10},
+            {"name": "Bob", "amount": 2.5},
+        ])
+        self.assertEqual(renderers.render_sql_result(content), "name: Alice\namount: 10\n\nname: Bob\namount: 2.5")
+
+    def test_sql_single_column_and_value(self):
+        self.assertEqual(renderers.render_sql_result(format_run_sql_result_as_md([{"count": 3}])), "count: 3")
+        content = format_run_sql_result_as_md([{"name": "a"}, {"name": "b"}])
+        self.assertEqual(renderers.render_sql_result(content), "name:\n• a\n• b")
+
+    def test_sql_messages(self):
+        self.assertEqual(renderers.render_sql_result(renderers.SQL_NO_DATA), "Done. No data returned.")
+        self.assertEqual(renderers.render_sql_result(format_run_sql_result_as_md([])), "No results.")
+        self.assertEqual(renderers.render_sql_result("SQL Error: boom"), "SQL Error: boom")
+
+    def test_sql_row_count_note(self):
+        content = format_run_sql_result_as_md([{"id": 1}, {"id": 2}]) + "\n2 of ≥1000 rows shown\n"
+        self.assertEqual(renderers.render_sql_result(content), "id:\n• 1\n• 2\n\n(2 of ≥1000 rows shown)")
+
+    def test_sql_statement_counts_note(self):
+        content = renderers.SQL_NO_DATA + "\nRows per statement: CREATE, INSERT 3\n"
+        self.assertEqual(renderers.render_sql_result(content), "Done. No data returned.\n\n(Rows per statement: CREATE, INSERT 3)")
+        content = (format_run_sql_result_as_md([{"id": 1}, {"id": 2}]) + "2 of 5 rows shown\n"
+                   + "Rows per statement: INSERT 5, SELECT 5\n")
+        self.assertEqual(renderers.render_sql_result(content),
+                         "id:\n• 1\n• 2\n\n(2 of 5 rows shown)\n\n(Rows per statement: INSERT 5, SELECT 5)")
+
+    def test_sql_ambiguous_table_is_not_rendered(self):
+        content = format_run_sql_result_as_md([{"a": "x | y", "b": 1}])
+        self.assertIsNone(renderers.render_sql_result(content))
+        self.assertIsNone(renderers.render_sql_result("something else"))
+
+    def test_python_output(self):
+        self.assertEqual(renderers.render_python_output("42\n"), "42")
+        self.assertEqual(renderers.render_python_output(""), "(no output)")
+        traceback = "Error: Traceback (most recent call last):\n  File \"<sandbox>\", line 1\nValueError: boom"
+        self.assertEqual(renderers.render_python_output(traceback), "Error: ValueError: boom")
+        self.assertTrue(renderers.render_python_output("x" * 5000).endswith("(3500 more characters)"))
+
+    def test_registry_render_requires_every_result_to_render(self):
+        registry = ToolRegistry({
+            "python_code_executor": {"function": len, "render": renderers.render_python_output},
+            "other": {"function": len},
+        }, tools=[])
+        python = {"role": "tool", "name": "python_code_executor", "content": "4\n"}
+        other = {"role": "tool", "name": "other", "content": "x"}
+
+        self.assertEqual(registry.render([python, python]), "4\n\n4")
+        self.assertIsNone(registry.render([python, other]))
+
+if __name__ == '__main__':
+    unittest.main()
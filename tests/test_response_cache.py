@@ -0,0 +1,226 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+from openai.types.chat import ChatCompletionMessage
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from LLM_stream import ContentDelta, MessageDone
+from response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend
+from tools.registry import ToolRegistry
+from tools import eval
+
+TOOLS = [{"type": "function", "function": {"name": "postgres_sql_run"}}]
+
+REGISTRY = ToolRegistry({
+    "postgres_sql_run": {"function": len},
+    "python_code_executor": {"function": len, "deterministic": eval.is_deterministic},
+}, TOOLS)
+
+
+def system(time_line):
+    return {"role": "system", "content": f"You are a helpful AI assistant.\nThe current date and time are: {time_line}\n"}
+
+
+def tool_call_message(name, arguments, call_id="call_1"):
+    return {"role": "assistant", "content": None, "tool_calls": [
+        {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}]}
+
+
+class FakeClient:
+    model = "openai/gpt-4o-mini"
+
+    def __init__(self, content="42 orders"):
+        self.content = content
+        self.calls = 0
+
+    def call_llm(self, messages, tools):
+        self.calls += 1
+        message = ChatCompletionMessage(role="assistant", content=self.content)
+        messages.append(message.dict())
+        return message
+
+    def call_llm_stream(self, messages, tools):
+        message = self.call_llm(messages, tools)
+        yield ContentDelta(message.content)
+        yield MessageDone(message)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def make_cache(self, **kwargs):
+        kwargs.setdefault("backend", MemoryCacheBackend(1024 * 1024))
+        return ResponseCache(REGISTRY, ttl=60, context_turns=0, enabled=True, **kwargs)
+
+    def test_repeated_question_is_served_from_cache(self):
+        cache, client = self.make_cache(), FakeClient()
+        first = [system("2026-10-17 09:00:00"), {"role": "user", "content": "How many orders yesterday?"}]
+        second = [system("2026-10-18 10:30:12"),
+                  {"role": "user", "content": "earlier question"}, {"role": "assistant", "content": "earlier answer"},
+                  {"role": "user", "content": "How many  orders yesterday?"}]
+
+        self.assertEqual(cache.call_llm(client, first, TOOLS).content, "42 orders")
+        message = cache.call_llm(client, second, TOOLS)
+
+        self.assertEqual(message.content, "42 orders")
+        self.assertEqual(second[-1]["content"], "42 orders")
+        self.assertEqual(client.calls, 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["entries"], 1)
+
+    def test_key_depends_on_model_tools_and_system_prompt(self):
+        cache = self.make_cache()
+        messages = [system("2026-10-18 10:30:12"), {"role": "user", "content": "hi"}]
+        key = cache.key("m", TOOLS, messages)
+
+        self.assertNotEqual(key, cache.key("other", TOOLS, messages))
+        self.assertNotEqual(key, cache.key("m", [], messages))
+        changed = [{"role": "system", "content": "Schema: orders(id)"}, messages[1]]
+        self.assertNotEqual(key, cache.key("m", TOOLS, changed))
+
+    def test_context_turns(self):
+        cache = ResponseCache(REGISTRY, backend=MemoryCacheBackend(1024), context_turns=1, enabled=True)
+        question = {"role": "user", "content": "and the day before?"}
+        a = [{"role": "user", "content": "orders on monday?"}, {"role": "assistant", "content": "3"}, question]
+        b = [{"role": "user", "content": "refunds on monday?"}, {"role": "assistant", "content": "1"}, question]
+        self.assertNotEqual(cache.key("m", TOOLS, a), cache.key("m", TOOLS, b))
+
+    def test_bypass_after_nondeterministic_tool_output(self):
+        cache, client = self.make_cache(), FakeClient()
+        messages = [
+            {"role": "user", "content": "How many orders?"},
+            tool_call_message("postgres_sql_run", {"sql_statements": "SELECT count(*) FROM orders"}),
+            {"role": "tool", "tool_call_id": "call_1", "name": "postgres_sql_run", "content": "42"},
+        ]
+
+        self.assertIsNone(cache.key("m", TOOLS, messages))
+        cache.call_llm(client, list(messages), TOOLS)
+        cache.call_llm(client, list(messages), TOOLS)
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(cache.stats()["bypasses"], 2)
+
+    def test_bypass_after_nondeterministic_tool_output_in_earlier_turn(self):
+        cache = self.make_cache()
+        question = {"role": "user", "content": "and what is that in thousands?"}
+        messages = [
+            {"role": "user", "content": "How many orders?"},
+            tool_call_message("postgres_sql_run", {"sql_statements": "SELECT count(*) FROM orders"}),
+            {"role": "tool", "tool_call_id": "call_1", "name": "postgres_sql_run", "content": "42000"},
+            {"role": "assistant", "content": "42000 orders"},
+            question,
+        ]
+        # The earlier turn is not part of the key, but its SQL result shapes the reply
+        self.assertIsNone(cache.key("m", TOOLS, messages))
+        self.assertIsNotNone(cache.key("m", TOOLS, [question]))
+
+    def test_bypass_after_summarized_turns(self):
+        cache = self.make_cache()
+        summary = {"role": "system", "content": "Summary of the earlier part of this conversation:\nThere were 42000 orders."}
+        self.assertIsNone(cache.key("m", TOOLS, [summary, {"role": "user", "content": "in thousands?"}]))
+
+    def test_deterministic_tool_output_is_cached_without_call_ids(self):
+        cache = self.make_cache()
+        turn = lambda call_id: [
+            {"role": "user", "content": "what is 2**10?"},
+            tool_call_message("python_code_executor", {"code": "print(2**10)"}, call_id),
+            {"role": "tool", "tool_call_id": call_id, "name": "python_code_executor", "content": "1024"},
+        ]
+        self.assertIsNotNone(cache.key("m", TOOLS, turn("call_a")))
+        self.assertEqual(cache.key("m", TOOLS, turn("call_a")), cache.key("m", TOOLS, turn("call_b")))
+
+        random_code = turn("call_a")
+        random_code[1] = tool_call_message("python_code_executor", {"code": "import random\nprint(random.random())"})
+        self.assertIsNone(cache.key("m", TOOLS, random_code))
+
+    def test_cached_tool_calls_get_fresh_ids(self):
+        cache = self.make_cache()
+        client = MagicMock(model="m")
+        client.call_llm.return_value = ChatCompletionMessage.model_validate(
+            tool_call_message("postgres_sql_run", {"sql_statements": "SELECT 1"}, "call_original"))
+        messages = [{"role": "user", "content": "run it"}]
+
+        cache.call_llm(client, list(messages), TOOLS)
+        cached = cache.call_llm(client, list(messages), TOOLS)
+
+        self.assertEqual(client.call_llm.call_count, 1)
+        self.assertEqual(cached.tool_calls[0].function.name, "postgres_sql_run")
+        self.assertNotEqual(cached.tool_calls[0].id, "call_original")
+
+    def test_stream_hit(self):
+        cache, client = self.make_cache(), FakeClient()
+        list(cache.call_llm_stream(client, [{"role": "user", "content": "hi"}], TOOLS))
+        history = [{"role": "user", "content": "hi"}]
+
+        events = list(cache.call_llm_stream(client, history, TOOLS))
+
+        self.assertEqual(events[0], ContentDelta("42 orders"))
+        self.assertIsInstance(events[1], MessageDone)
+        self.assertEqual(history[-1]["content"], "42 orders")
+        self.assertEqual(client.calls, 1)
+
+    def test_disabled(self):
+        cache = ResponseCache(REGISTRY, backend=MemoryCacheBackend(1024), enabled=False)
+        client = FakeClient()
+        cache.call_llm(client, [{"role": "user", "content": "hi"}], TOOLS)
+        cache.call_llm(client, [{"role": "user", "content": "hi"}], TOOLS)
+        self.assertEqual(client.calls, 2)
+
+
+class BackendTests:
+
+    def make_backend(self, max_bytes):
+        raise NotImplementedError
+
+    def test_ttl(self):
+        backend = self.make_backend(1024)
+        backend.set("a", b"value", ttl=0.05)
+        self.assertEqual(backend.get("a"), b"value")
+        time.sleep(0.06)
+        self.assertIsNone(backend.get("a"))
+
+    def test_lru_eviction_by_bytes(self):
+        backend = self.make_backend(25)
+        backend.set("a", b"x" * 10, ttl=60)
+        backend.set("b", b"x" * 10, ttl=60)
+        time.sleep(0.01)
+        backend.get("a")
+        backend.set("c", b"x" * 10, ttl=60)
+
+        self.assertIsNotNone(backend.get("a"))
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNotNone(backend.get("c"))
+        self.assertEqual(backend.stats(), {"entries": 2, "bytes": 20})
+
+    def test_oversized_values_are_not_stored(self):
+        backend = self.make_backend(5)
+        backend.set("a", b"x" * 10, ttl=60)
+        self.assertIsNone(backend.get("a"))
+
+
+class TestMemoryCacheBackend(BackendTests, unittest.TestCase):
+
+    def make_backend(self, max_bytes):
+        return MemoryCacheBackend(max_bytes)
+
+
+class TestSQLiteCacheBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_backend(self, max_bytes):
+        return SQLiteCacheBackend(os.path.join(self.tmp.name, "cache.db"), max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+import time
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils.sandbox_kernels import KernelManager, conversation_scope, current_conversation
+
+class TestKernelManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = KernelManager(max_kernels=2, idle_timeout=60, max_lifetime=60, timeout=2,
+                                     memory_limit_mb=64, cpu_limit_seconds=2, preload=["math"])
+
+    def tearDown(self):
+        self.manager.closeall()
+
+    def test_state_persists_per_conversation(self):
+        self.assertEqual(self.manager.execute("a", "import math\nx = math.sqrt(16)"), "")
+        self.assertEqual(self.manager.execute("a", "print(x + 1)"), "5.0\n")
+        result = self.manager.execute("b", "print(x)")
+        self.assertTrue(result.startswith("Error:"))
+        self.assertIn("NameError", result)
+
+    def test_static_checks_run_before_dispatch(self):
+        result = self.manager.execute("a", "import os")
+        self.assertEqual(result, "Error: Importing module 'os' is not allowed for security reasons")
+        self.assertEqual(self.manager.stats()["kernels"], 0)
+
+    def test_inspect_and_reset(self):
+        self.assertIsNone(self.manager.inspect("a"))
+        self.manager.execute("a", "import math\nrows = [1, 2, 3]\ndef helper():\n    pass")
+        listing = self.manager.inspect("a")
+        self.assertTrue(listing.startswith("Python session: 1 call(s)"))
+        self.assertIn("math: module math", listing)
+        self.assertIn("rows: list = [1, 2, 3]", listing)
+        self.assertIn("helper: function = <function helper", listing)
+
+        self.assertTrue(self.manager.reset("a"))
+        self.assertFalse(self.manager.reset("a"))
+        self.assertIn("NameError", self.manager.execute("a", "print(rows)"))
+
+    def test_least_recently_used_kernel_is_evicted(self):
+        for conversation in ("a", "b", "c"):
+            self.manager.execute(conversation, f"name = '{conversation}'")
+        self.assertEqual(self.manager.stats()["kernels"], 2)
+        result = self.manager.execute("a", "print('again')")
+        self.assertTrue(result.startswith("Note: The Python session of this conversation was restarted "
+                                          "because too many Python sessions were running."))
+        self.assertTrue(result.endswith("again\n"))
+        self.assertEqual(self.manager.execute("c", "print(name)"), "c\n")
+
+    def test_idle_kernel_is_evicted(self):
+        self.manager.idle_timeout = 0.2
+        self.manager.execute("a", "x = 1")
+        time.sleep(0.3)
+        self.manager.evict_expired()
+        self.assertEqual(self.manager.stats()["kernels"], 0)
+        result = self.manager.execute("a", "print(x)")
+        self.assertTrue(result.startswith("Error: Note: The Python session of this conversation was "
+                                          "restarted because it was idle for more than 0.2 seconds."))
+        self.assertIn("NameError", result.splitlines()[-1])
+
+    def test_kernel_is_evicted_after_max_lifetime(self):
+        self.manager.max_lifetime = 0.2
+        self.manager.execute("a", "x = 1")
+        time.sleep(0.3)
+        self.assertIn("maximum lifetime", self.manager.execute("a", "print(1)"))
+
+    def test_memory_limit_stops_kernel(self):
+        self.manager.execute("a", "x = 1")
+        result = self.manager.execute("a", "data = bytearray(512 * 1024 * 1024)")
+        self.assertIn("MemoryError", result)
+        self.assertTrue(result.endswith("Variables from earlier calls are gone."))
+        self.assertEqual(self.manager.stats()["kernels"], 0)
+
+    def test_timeout_stops_kernel(self):
+        result = self.manager.execute("a", "while True:\n    pass")
+        self.assertEqual(result, "Error: Code execution timed out (2 second limit). "
+                                 "Variables from earlier calls are gone.")
+        self.assertEqual(self.manager.execute("a", "print('still works')"), "still works\n")
+
+class TestConversationScope(unittest.TestCase):
+
+    def test_scope(self):
+        self.assertIsNone(current_conversation())
+        with conversation_scope(42):
+            self.assertEqual(current_conversation(), "42")
+            with conversation_scope("inner"):
+                self.assertEqual(current_conversation(), "inner")
+            self.assertEqual(current_conversation(), "42")
+        self.assertIsNone(current_conversation())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os
+import resource
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from utils.sandbox_pool import SandboxWorkerPool
+
+class TestSandboxWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SandboxWorkerPool(size=1, max_jobs_per_worker=3, timeout=2,
+                                      memory_limit_mb=64, cpu_limit_seconds=2, preload=["math"])
+
+    def tearDown(self):
+        self.pool.closeall()
+
+    def worker_pid(self):
+        worker = self.pool._acquire()
+        self.pool._release(worker)
+        return worker.pid
+
+    def test_executes_code(self):
+        self.assertEqual(self.pool.execute("print(9283742374 * 98237492384)"), "912011570760843079616\n")
+
+    def test_namespace_is_fresh_per_job(self):
+        self.pool.execute("x = 1")
+        result = self.pool.execute("print(x)")
+        self.assertTrue(result.startswith("Error:"))
+        self.assertIn("NameError", result)
+
+    def test_module_state_is_reset_between_jobs(self):
+        pid = self.worker_pid()
+        self.pool.execute("import math, textwrap\nmath.pi = 3\nmath.answer = 42\ntextwrap.dedent = None")
+        result = self.pool.execute("import math, textwrap\n"
+                                   "print(math.pi, hasattr(math, 'answer'), textwrap.dedent is None)")
+        self.assertEqual(result, "3.141592653589793 False False\n")
+        self.assertEqual(self.worker_pid(), pid)
+
+    def test_seed_does_not_leak_into_the_next_job(self):
+        code = "import random\nprint(random.random())"
+        seeded = self.pool.execute("import random\nrandom.seed(1)\nprint(random.random())")
+        self.pool.execute("import random\nrandom.seed(1)")
+        self.assertNotEqual(self.pool.execute(code), seeded)
+
+    def test_worker_is_reused_then_recycled(self):
+        pid = self.worker_pid()
+        self.pool.execute("print(1)")
+        self.pool.execute("print(2)")
+        self.assertEqual(self.worker_pid(), pid)
+        # The third job reaches max_jobs_per_worker
+        self.pool.execute("print(3)")
+        self.assertNotEqual(self.worker_pid(), pid)
+
+    def test_static_checks_run_before_dispatch(self):
+        result = self.pool.execute("import os\nprint(os.getcwd())")
+        self.assertEqual(result, "Error: Importing module 'os' is not allowed for security reasons")
+
+    def test_timeout_recycles_worker(self):
+        pid = self.worker_pid()
+        result = self.pool.execute("while True:\n    pass")
+        self.assertEqual(result, "Error: Code execution timed out (2 second limit)")
+        self.assertNotEqual(self.worker_pid(), pid)
+        self.assertEqual(self.pool.execute("print('still works')"), "still works\n")
+
+    def test_cpu_budget_is_per_job(self):
+        # Together the jobs use more CPU time than one job may
+        code = "import time\nstart = time.process_time()\nwhile time.process_time() - start < 1.2:\n    pass\nprint('done')"
+        for _ in range(3):
+            self.assertEqual(self.pool.execute(code), "done\n")
+
+    def test_cpu_hard_limit_is_left_alone(self):
+        code = "import resource\nprint(resource.getrlimit(resource.RLIMIT_CPU)[1])"
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        self.assertEqual(self.pool.execute(code), f"{hard}\n")
+        self.assertEqual(self.pool.execute(code), f"{hard}\n")
+
+    def test_memory_limit_recycles_worker(self):
+        pid = self.worker_pid()
+        result = self.pool.execute("data = bytearray(512 * 1024 * 1024)")
+        self.assertIn("MemoryError", result)
+        self.assertNotEqual(self.worker_pid(), pid)
+
+    def test_error_output(self):
+        result = self.pool.execute("raise ValueError('boom')")
+        self.assertTrue(result.startswith("Error: Traceback"))
+        self.assertIn("ValueError: boom", result)
+
+if __name__ == '__main__':
+    unittest.main()
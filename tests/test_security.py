@@ -7,7 +7,8 @@ from unittest.mock import patch, MagicMock
 # Add the src directory to the Python path to allow imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from utils.security import sanitize_input, validate_sql, sandbox_python_execution
+from utils.security import (sanitize_input, validate_sql, sandbox_python_execution, check_python_code,
+                            sql_violations, python_code_violations)
 
 class TestSecurity(unittest.TestCase):
 
@@ -37,6 +38,34 @@ class TestSecurity(unittest.TestCase):
         self.assertFalse(validate_sql("EXEC xp_cmdshell('dir')")[0])
         self.assertFalse(validate_sql("SELECT * FROM users WHERE id = 1 OR 1=1")[0]) # Simple OR injection
 
+    def test_validate_sql_word_boundaries_and_case(self):
+        self.assertTrue(validate_sql("SELECT dropped, backdrop FROM t")[0])
+        self.assertFalse(validate_sql("drop table t")[0])
+        self.assertFalse(validate_sql("x\tDrOp")[0])
+        self.assertEqual(validate_sql("DELETE FROM t -- now")[1],
+                         "SQL statement contains potentially dangerous pattern: --")
+
+    def test_sql_violations_lists_every_pattern(self):
+        self.assertEqual(sql_violations("SELECT 1"), [])
+        self.assertEqual(sql_violations("DROP TABLE t; SELECT 1 UNION SELECT 2 WHERE a OR 1=1"), [
+            "SQL statement contains potentially dangerous pattern: \\bDROP\\b",
+            "SQL statement contains potentially dangerous pattern: UNION.*SELECT",
+            "SQL statement contains potentially dangerous pattern: OR\\s+\\d+=\\d+",
+            "SQL statement contains potentially dangerous pattern: OR\\s+\\d+=\\s*\\d+",
+        ])
+
+    def test_python_code_violations_lists_every_problem(self):
+        code = "import sys\nimport os\nprint(().__class__.__mro__)\nopen('x')"
+        self.assertEqual(python_code_violations(code), [
+            "Error: Importing module 'os' is not allowed for security reasons",
+            "Error: Importing module 'sys' is not allowed for security reasons",
+            "Error: Code contains potentially dangerous pattern: open\\(",
+            "Error: Code contains potentially dangerous pattern: \\b__class__\\b",
+            "Error: Code contains potentially dangerous pattern: \\b__mro__\\b",
+        ])
+        self.assertEqual(check_python_code(code), "Error: Importing module 'os' is not allowed for security reasons")
+        self.assertIsNone(check_python_code("import osmosis\nmirror = 'mro_table'\nprint(my_class__)"))
+
     @patch('subprocess.run')
     @patch('tempfile.NamedTemporaryFile')
     def test_sandbox_python_execution_success(self, mock_tempfile, mock_subprocess_run):
@@ -0,0 +1,192 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import agent_loop
+from tools.sql_intents import SQLIntentCache, normalize_request, tool_call_message
+
+SQL = "SELECT count(*) FROM orders WHERE created_at >= CURRENT_DATE - 1"
+TABLE = "```\n| count |\n|-------|\n| 42 |\n```\n"
+
+
+def sql_call(sql=SQL, call_id="call_1"):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(
+        name="postgres_sql_run", arguments=json.dumps({"sql_statements": sql})))
+
+
+def tool_result(content=TABLE, call_id="call_1"):
+    return [{"role": "tool", "tool_call_id": call_id, "name": "postgres_sql_run", "content": content}]
+
+
+class TestSQLIntentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fingerprint = "abc"
+        self.cache = SQLIntentCache(os.path.join(self.tmp.name, "intents.db"), ttl=60,
+                                    fingerprint=lambda conn: self.fingerprint)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize_request(self):
+        self.assertEqual(normalize_request("  How many ORDERS, yesterday?? "), "how many orders yesterday")
+
+    def test_learn_and_lookup(self):
+        self.assertTrue(self.cache.learn(None, "How many orders yesterday?", [sql_call()], tool_result()))
+
+        self.assertEqual(self.cache.lookup(None, "how many orders yesterday"), SQL)
+        self.assertIsNone(self.cache.lookup(None, "how many refunds yesterday"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["learned"], stats["entries"]), (1, 1, 1, 1))
+
+    def test_schema_change_invalidates(self):
+        self.cache.learn(None, "How many orders?", [sql_call()], tool_result())
+        self.fingerprint = "def"
+        self.assertIsNone(self.cache.lookup(None, "How many orders?"))
+
+        # A process still on the old schema, sharing the file, keeps its entry
+        other = SQLIntentCache(self.cache.path, ttl=60, fingerprint=lambda conn: "abc")
+        self.assertEqual(other.lookup(None, "How many orders?"), SQL)
+
+    def test_ttl(self):
+        self.cache.ttl = 0
+        self.cache.learn(None, "How many orders?", [sql_call()], tool_result())
+        self.assertIsNone(self.cache.lookup(None, "How many orders?"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_expired_entries_of_other_fingerprints_are_dropped(self):
+        self.cache.learn(None, "How many orders?", [sql_call()], tool_result())
+        self.fingerprint = "def"
+        self.cache.learn(None, "How many orders?", [sql_call()], tool_result())
+        self.fingerprint = "ghi"
+        with patch('tools.sql_intents.time.time', return_value=time.time() + 120):
+            self.assertIsNone(self.cache.lookup(None, "How many orders?"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_only_safe_sql_is_learned(self):
+        learn = lambda tool_calls, responses=tool_result(): self.cache.learn(None, "q", tool_calls, responses)
+
+        self.assertFalse(learn([sql_call("DELETE FROM orders")]))
+        self.assertFalse(learn([sql_call("SELECT * FROM orders WHERE day = '2026-10-17'")]))
+        self.assertFalse(learn([sql_call(), sql_call(call_id="call_2")]))
+        self.assertFalse(learn([sql_call()], tool_result("SQL Error: relation does not exist")))
+        self.assertFalse(learn([SimpleNamespace(id="x", function=SimpleNamespace(
+            name="python_code_executor", arguments='{"code": "print(1)"}'))]))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_tool_call_message_formats(self):
+        with patch('utils.Config.USE_OPEN_ROUTER', True):
+            message = tool_call_message(SQL)
+            self.assertEqual(json.loads(message.tool_calls[0].function.arguments), {"sql_statements": SQL})
+            self.assertTrue(message.tool_calls[0].id)
+        with patch('utils.Config.USE_OPEN_ROUTER', False):
+            message = tool_call_message(SQL)
+            self.assertEqual(message.tool_calls[0].function.arguments, {"sql_statements": SQL})
+
+
+class SQLAssistant:
+    """Scripted LLM replies; postgres_sql_run answers with the given results in turn."""
+
+    def __init__(self, replies, results, intents):
+        self.replies = list(replies)
+        self.results = list(results)
+        self.llm_calls = 0
+        self.SQL_INTENTS = intents
+
+    def call_llm(self, conversation_history):
+        self.llm_calls += 1
+        message = self.replies.pop(0)
+        conversation_history.append({"role": "assistant", "content": message.content})
+        return message
+
+    def get_tool_response(self, conn, tool_calls):
+        return [{"role": "tool", "tool_call_id": call.id, "name": call.function.name, "content": self.results.pop(0)}
+                for call in tool_calls]
+
+    def render_tool_responses(self, tool_responses):
+        return "rendered"
+
+
+class TestAgentLoopIntents(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.intents = SQLIntentCache(os.path.join(self.tmp.name, "intents.db"), ttl=60,
+                                      fingerprint=lambda conn: "abc")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ask(self, assistant, history=None):
+        history = (history or []) + [{"role": "user", "content": "How many orders yesterday?"}]
+        events = list(agent_loop.run(assistant, None, history, render_mode="auto"))
+        return events, history
+
+    def test_second_request_skips_the_llm(self):
+        first = SQLAssistant([SimpleNamespace(content=None, tool_calls=[sql_call()])], [TABLE], self.intents)
+        self.ask(first)
+        self.assertEqual(first.llm_calls, 1)
+
+        second = SQLAssistant([], [TABLE], self.intents)
+        with patch('utils.Config.USE_OPEN_ROUTER', True):
+            events, history = self.ask(second)
+
+        self.assertEqual(second.llm_calls, 0)
+        self.assertEqual(events[-1], agent_loop.FinalEvent("rendered", 1, "rendered"))
+        self.assertEqual(history[1]["tool_calls"][0]["function"]["name"], "postgres_sql_run")
+        self.assertEqual(history[2]["tool_call_id"], history[1]["tool_calls"][0]["id"])
+
+    def test_failed_replay_falls_back_to_llm(self):
+        self.intents.learn(None, "How many orders yesterday?", [sql_call()], tool_result())
+        assistant = SQLAssistant([SimpleNamespace(content="No orders table anymore", tool_calls=None)],
+                                 ["SQL Error: relation \"orders\" does not exist"], self.intents)
+
+        with patch('utils.Config.USE_OPEN_ROUTER', True):
+            events, history = self.ask(assistant)
+
+        self.assertEqual(assistant.llm_calls, 1)
+        self.assertEqual([event.type for event in events], ["final"])
+        self.assertEqual([message["role"] for message in history], ["user", "assistant"])
+        self.assertEqual(self.intents.stats()["entries"], 0)
+
+    def test_failed_replay_keeps_other_fingerprints(self):
+        other = SQLIntentCache(self.intents.path, ttl=60, fingerprint=lambda conn: "def")
+        other.learn(None, "How many orders yesterday?", [sql_call()], tool_result())
+        self.intents.learn(None, "How many orders yesterday?", [sql_call()], tool_result())
+        assistant = SQLAssistant([SimpleNamespace(content="No orders table anymore", tool_calls=None)],
+                                 ["SQL Error: relation \"orders\" does not exist"], self.intents)
+
+        with patch('utils.Config.USE_OPEN_ROUTER', True):
+            self.ask(assistant)
+
+        self.assertIsNone(self.intents.lookup(None, "How many orders yesterday?"))
+        self.assertEqual(other.lookup(None, "How many orders yesterday?"), SQL)
+
+    def test_follow_up_requests_are_not_learned(self):
+        assistant = SQLAssistant([SimpleNamespace(content=None, tool_calls=[sql_call()])], [TABLE], self.intents)
+        earlier = [{"role": "user", "content": "Let's talk about last week"}, {"role": "assistant", "content": "Sure"}]
+        self.ask(assistant, earlier)
+        self.assertEqual(self.intents.stats()["learned"], 0)
+
+
+    def test_follow_up_requests_are_not_replayed(self):
+        self.intents.learn(None, "How many orders yesterday?", [sql_call()], tool_result())
+        assistant = SQLAssistant([SimpleNamespace(content="Last week there were 12", tool_calls=None)], [],
+                                 self.intents)
+        earlier = [{"role": "user", "content": "Let's talk about last week"}, {"role": "assistant", "content": "Sure"}]
+        events, _ = self.ask(assistant, earlier)
+        self.assertEqual(assistant.llm_calls, 1)
+        self.assertEqual(events[-1].content, "Last week there were 12")
+        self.assertEqual(self.intents.stats()["hits"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from tools import sql_lexer
+from tools.sql_lexer import split_statements
+
+class TestSqlLexer(unittest.TestCase):
+
+    def texts(self, sql):
+        return [statement.text for statement in split_statements(sql)]
+
+    def test_splits_on_semicolons(self):
+        self.assertEqual(self.texts("SELECT 1; SELECT 2;"), ["SELECT 1", "SELECT 2"])
+        self.assertEqual(self.texts("  SELECT 1  ;  ;"), ["SELECT 1"])
+        self.assertEqual(self.texts(""), [])
+
+    def test_semicolons_in_literals_and_identifiers(self):
+        self.assertEqual(self.texts("SELECT ';' AS \"a;b\"; SELECT 'it''s; fine'"),
+                         ["SELECT ';' AS \"a;b\"", "SELECT 'it''s; fine'"])
+        self.assertEqual(self.texts("INSERT INTO t VALUES (E'it\\'s;'); SELECT 1"),
+                         ["INSERT INTO t VALUES (E'it\\'s;')", "SELECT 1"])
+
+    def test_dollar_quoted_bodies(self):
+        sql = ("CREATE FUNCTION f() RETURNS int AS $body$ BEGIN; RETURN $$;$$; END; $body$ LANGUAGE plpgsql;"
+               " SELECT f(), $1")
+        statements = split_statements(sql)
+        self.assertEqual([statement.kind for statement in statements], [sql_lexer.DDL, sql_lexer.SELECT])
+        self.assertTrue(statements[0].text.endswith("LANGUAGE plpgsql"))
+
+    def test_comments(self):
+        sql = "/* a; /* nested; */ b; */ SELECT 1 -- x; y\n; -- just a comment;\n"
+        self.assertEqual(self.texts(sql), ["/* a; /* nested; */ b; */ SELECT 1 -- x; y"])
+
+    def test_unterminated_quote_runs_to_end(self):
+        self.assertEqual(self.texts("SELECT 'a; SELECT 2"), ["SELECT 'a; SELECT 2"])
+
+    def test_classification(self):
+        kinds = {
+            "SELECT * FROM t": sql_lexer.SELECT,
+            "(SELECT 1) UNION (SELECT 2)": sql_lexer.SELECT,
+            "WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d": sql_lexer.DML,
+            "UPDATE t SET a = 1": sql_lexer.DML,
+            "alter table t add column b int": sql_lexer.DDL,
+            "SELECT * INTO t2 FROM t": sql_lexer.DDL,
+            "SET search_path TO public": sql_lexer.OTHER,
+        }
+        for sql, kind in kinds.items():
+            self.assertEqual(split_statements(sql)[0].kind, kind, sql)
+
+    def test_read_only_ignores_literals(self):
+        self.assertTrue(split_statements("SELECT * FROM t WHERE action = 'drop' -- delete\n")[0].read_only)
+        self.assertFalse(split_statements("SELECT * FROM t FOR UPDATE")[0].read_only)
+        self.assertFalse(split_statements("EXPLAIN ANALYZE DELETE FROM t")[0].read_only)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import sys
+import os
+import json
+import asyncio
+from unittest.mock import patch
+
+import httpx
+
+# Add the src directory to the Python path to allow imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+# The OpenAI client refuses to initialise without an API key
+with patch('utils.Config.OPENROUTER_API_KEY', 'test-key'):
+    import LLM_client_openrouter
+from LLM_stream import ContentDelta, ToolCallDelta, UsageDelta, MessageDone
+from utils.sse import SSEDecoder, ServerSentEvent
+
+def decode_all(chunks):
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    final = decoder.flush()
+    if final:
+        events.append(final)
+    return events
+
+class TestSSEDecoder(unittest.TestCase):
+
+    def test_single_event(self):
+        self.assertEqual(decode_all(["data: hello\n\n"]), [ServerSentEvent("message", "hello", None)])
+
+    def test_event_split_across_chunks(self):
+        stream = "event: token\ndata: {\"a\": 1}\n\ndata: second\n\n"
+        for size in (1, 2, 3, 7):
+            chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+            self.assertEqual(decode_all(chunks), [
+                ServerSentEvent("token", '{"a": 1}', None),
+                ServerSentEvent("message", "second", None),
+            ])
+
+    def test_multi_line_data_and_comments(self):
+        events = decode_all([": keep-alive\n\n", "data: line 1\ndata: line 2\nid: 7\n\n"])
+        self.assertEqual(events, [ServerSentEvent("message", "line 1\nline 2", "7")])
+
+    def test_crlf_split_between_chunks(self):
+        events = decode_all(["data: a\r", "\ndata: b\r\n\r\n"])
+        self.assertEqual(events, [ServerSentEvent("message", "a\nb", None)])
+
+    def test_utf8_bytes_split_mid_character(self):
+        data = "data: héllo\n\n".encode("utf-8")
+        split = data.index(b"\xc3") + 1
+        self.assertEqual(decode_all([data[:split], data[split:]]), [ServerSentEvent("message", "héllo", None)])
+
+    def test_unterminated_final_event_is_flushed(self):
+        self.assertEqual(decode_all(["data: tail"]), [ServerSentEvent("message", "tail", None)])
+
+class TestOpenRouterStream(unittest.TestCase):
+
+    def body_chunks(self, payloads, done=True):
+        body = "".join(f"data: {json.dumps(p)}\n\n" for p in payloads)
+        if not done:
+            # Closed without [DONE] and without the blank line ending the last event
+            return [body.rstrip("\n").encode()]
+        body += "data: [DONE]\n\n"
+        # Arbitrary chunk boundaries, plus data after [DONE] that must be ignored
+        body += "data: {\"choices\": [{\"delta\": {\"content\": \"ignored\"}}]}\n\n"
+        return [body[i:i + 5].encode() for i in range(0, len(body), 5)]
+
+    def mock_http(self, payloads, done=True):
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            return httpx.Response(200, content=iter(self.body_chunks(payloads, done)))
+
+        return httpx.Client(transport=httpx.MockTransport(handler))
+
+    def mock_async_http(self, payloads, done=True):
+        async def body():
+            for chunk in self.body_chunks(payloads, done):
+                yield chunk
+
+        def handler(request):
+            return httpx.Response(200, content=body())
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    DELTA_PAYLOADS = [
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": [{"delta": {"content": "lo"}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "call_1", "function": {"name": "python_code_executor", "arguments": "{\"co"}}]}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": "de\": \"1\"}"}}]}}]},
+        {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}},
+    ]
+
+    EXPECTED_DELTAS = [
+        ContentDelta("Hel"),
+        ContentDelta("lo"),
+        ToolCallDelta(0, "call_1", "python_code_executor", "{\"co"),
+        ToolCallDelta(0, None, "", "de\": \"1\"}"),
+        UsageDelta(10, 5, 15),
+    ]
+
+    def test_stream_deltas_are_typed(self):
+        with patch('LLM_client_openrouter._http', self.mock_http(self.DELTA_PAYLOADS)):
+            deltas = list(LLM_client_openrouter.stream_deltas([{"role": "user", "content": "hi"}]))
+
+        self.assertEqual(deltas, self.EXPECTED_DELTAS)
+        self.assertEqual(self.requests[0].url, "https://openrouter.ai/api/v1/chat/completions")
+        self.assertTrue(json.loads(self.requests[0].content)["stream"])
+
+    def test_final_event_without_done_is_kept(self):
+        with patch('LLM_client_openrouter._http', self.mock_http(self.DELTA_PAYLOADS, done=False)):
+            deltas = list(LLM_client_openrouter.stream_deltas([{"role": "user", "content": "hi"}]))
+        self.assertEqual(deltas, self.EXPECTED_DELTAS)
+
+        async def collect():
+            with patch('LLM_client_openrouter._async_client',
+                       return_value=(None, self.mock_async_http(self.DELTA_PAYLOADS, done=False))):
+                return [delta async for delta in LLM_client_openrouter.astream_deltas([])]
+
+        self.assertEqual(asyncio.run(collect()), self.EXPECTED_DELTAS)
+
+    def test_call_llm_stream_assembles_message(self):
+        http = self.mock_http([
+            {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "call_1", "function": {"name": "postgres_sql_run", "arguments": ""}}]}}]},
+            {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": "{\"sql_statements\": \"SELECT 1\"}"}}]}}]},
+        ])
+        history = [{"role": "user", "content": "hi"}]
+
+        with patch('LLM_client_openrouter._http', http):
+            events = list(LLM_client_openrouter.call_llm_stream(history))
+
+        self.assertIsInstance(events[-1], MessageDone)
+        message = events[-1].message
+        self.assertIsNone(message.content)
+        self.assertEqual(message.tool_calls[0].id, "call_1")
+        self.assertEqual(message.tool_calls[0].function.name, "postgres_sql_run")
+        self.assertEqual(json.loads(message.tool_calls[0].function.arguments), {"sql_statements": "SELECT 1"})
+        self.assertEqual(history[-1]["role"], "assistant")
+
+    def test_async_stream_matches_sync(self):
+        history = [{"role": "user", "content": "hi"}]
+
+        async def collect():
+            with patch('LLM_client_openrouter._async_client',
+                       return_value=(None, self.mock_async_http(self.DELTA_PAYLOADS))):
+                return [event async for event in LLM_client_openrouter.acall_llm_stream(history)]
+
+        events = asyncio.run(collect())
+
+        self.assertEqual(events[:-1], self.EXPECTED_DELTAS)
+        self.assertEqual(events[-1].message.content, "Hello")
+        self.assertEqual(history[-1]["content"], "Hello")
+
+if __name__ == '__main__':
+    unittest.main()